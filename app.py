@@ -1,39 +1,189 @@
+import time
+
+_import_started = time.perf_counter()
+
 import os
+import json
+import gzip
 import uuid
+import threading
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from functools import lru_cache
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g, Response
 from werkzeug.utils import secure_filename
-import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import seaborn as sns
 import traceback
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-import numpy as np
+from jobs import JobStore, JobQueue, QueueFull
+from cache import ResultCache, cache_key, file_digest
+from metrics import MetricsStore, stage, tracing
+from artifacts import ArtifactStore, ArtifactSweeper
+from upload import (CsvUploadSink, StreamingUploadRequest, UploadRejected, columnar_lock_path, columnar_path,
+                    meta_path, pandas_read_kwargs, stored_name, upload_digest)
+from lazy import deferred, drain_import_times, lazy_import, lazy_module, module_available, warm
+
+# The analytical stack is imported on first use (see lazy.py): web workers boot with Flask and
+# SQLite only, and the analysis workers load it all before their first job (warm_worker)
+pd = lazy_module("pandas")
+np = lazy_module("numpy")
+KMeans = lazy_import("sklearn.cluster", "KMeans")
+IsolationForest = lazy_import("sklearn.ensemble", "IsolationForest")
+PCA = lazy_import("sklearn.decomposition", "PCA")
+StandardScaler = lazy_import("sklearn.preprocessing", "StandardScaler")
+SimpleImputer = lazy_import("sklearn.impute", "SimpleImputer")
+datetimes = lazy_module("datetimes")
+profile_chunks, profile_frame = lazy_import("profiler", "profile_chunks", "profile_frame")
+fit_scalable, score_bundle, standardize_float32 = lazy_import("ml", "fit_scalable", "score_bundle",
+                                                              "standardize_float32")
+ModelRegistry, schema_key = lazy_import("registry", "ModelRegistry", "schema_key")
+DatasetStore = lazy_import("datasets", "DatasetStore")
+DuplicateCounter, clean_frame = lazy_import("cleaning", "DuplicateCounter", "clean_frame")
+default_dtype_bytes, optimize_dtypes, read_csv_compact = lazy_import("downcast", "default_dtype_bytes",
+                                                                     "optimize_dtypes", "read_csv_compact")
+SchemaInference, select_features = lazy_import("schema", "SchemaInference", "select_features")
+correlate, correlations_from_matrix = lazy_import("correlation", "correlate", "correlations_from_matrix")
+(PlotTask, render_plots, chart_spec, histogram_aggregate, box_aggregate, segmentation_aggregate, fraud_aggregate,
+ warm_up_plots) = lazy_import("plots", "PlotTask", "render_plots", "chart_spec", "histogram_aggregate",
+                              "box_aggregate", "segmentation_aggregate", "fraud_aggregate", "warm_up")
+build_explorer, iter_json, open_explorer = lazy_import("explorer", "build_explorer", "iter_json", "open_explorer")
+ensure_columnar, ingest_upload, iter_columnar, read_columnar = lazy_import("ingest", "ensure_columnar", "ingest_upload",
+                                                                          "iter_columnar", "read_columnar")
+# Same test as ingest.HAS_PYARROW, without importing pyarrow
+HAS_PYARROW = module_available("pyarrow")
 
 # --- Configuration ---
 UPLOAD_FOLDER = "uploads"
 PLOTS_FOLDER = "static/plots"
-ALLOWED_EXTENSIONS = {"csv"}
+JOBS_FOLDER = "jobs"
+CACHE_FOLDER = "cache"
+EXPLORER_FOLDER = os.path.join(CACHE_FOLDER, "explorer")
+MODELS_FOLDER = "models"
+DATASETS_FOLDER = "datasets"
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_MB", "512")) * 1024 * 1024
+# Row explorer files of cached results have their own limit: one large upload's file can exceed CACHE_MAX_MB
+EXPLORER_MAX_BYTES = int(os.environ.get("EXPLORER_MAX_MB", "4096")) * 1024 * 1024
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+# Fork the analysis workers when a web process starts and load the analytical stack in them
+# ahead of the first job; WARM_WORKERS=0 starts them on the first job instead
+WARM_WORKERS = os.environ.get("WARM_WORKERS", "1") == "1"
+# Admission control: queued + running jobs may reserve at most this much estimated memory.
+# A job is estimated at ANALYSIS_MEMORY_FACTOR x its CSV size plus ANALYSIS_BASE_MEMORY_MB;
+# beyond the budget (or MAX_ACTIVE_PER_SESSION jobs per session) requests get a Retry-After
+ANALYSIS_MEMORY_BUDGET = int(os.environ.get("ANALYSIS_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+ANALYSIS_MEMORY_FACTOR = float(os.environ.get("ANALYSIS_MEMORY_FACTOR", "4"))
+ANALYSIS_BASE_MEMORY = int(os.environ.get("ANALYSIS_BASE_MEMORY_MB", "64")) * 1024 * 1024
+MAX_ACTIVE_PER_SESSION = int(os.environ.get("MAX_ACTIVE_PER_SESSION", "2"))
+# Background ingest streams the CSV (see ingest.py), so it reserves a fixed amount instead
+INGEST_MEMORY = int(os.environ.get("INGEST_MEMORY_MB", "256")) * 1024 * 1024
+# Uploads, their Parquet copies and plots expire this long after their last use, finished
+# jobs and their results this long after they finish; each session's files are capped at
+# SESSION_QUOTA_MB (oldest uploads go first)
+ARTIFACT_TTL = int(os.environ.get("ARTIFACT_TTL_SECONDS", "1800"))
+SESSION_QUOTA = int(os.environ.get("SESSION_QUOTA_MB", "1024")) * 1024 * 1024
+# "full" fits the exact models on the plot sample; "scalable" fits chunked/parallel models on
+# every row; "auto" switches to scalable once the cleaned data exceeds ML_FULL_MAX_ROWS
+ML_ENGINE = os.environ.get("ML_ENGINE", "auto")
+ML_FULL_MAX_ROWS = int(os.environ.get("ML_FULL_MAX_ROWS", "100000"))
+# "png" renders charts on the server; "json" sends compact chart specs drawn in the browser
+PLOT_OUTPUT = os.environ.get("PLOT_OUTPUT", "png")
+# Load-time dtype optimizer: "pyarrow" stores high-cardinality text as Arrow strings;
+# FLOAT_DOWNCAST="float32" also narrows floats that do not round-trip exactly
+STRING_DTYPE = os.environ.get("STRING_DTYPE", "")
+FLOAT_DOWNCAST = os.environ.get("FLOAT_DOWNCAST", "lossless")
+# Null handling in the cleaning stage: "drop" rows with any null, or "impute" medians / modes
+CLEANING_POLICY = os.environ.get("CLEANING_POLICY", "drop")
+# Extra calendar features for datetime columns besides year/month/day: "weekday", "hour"
+DATETIME_FEATURES = tuple(p for p in os.environ.get("DATETIME_FEATURES", "").split(",") if p in ("weekday", "hour"))
+# "pearson" or "spearman" (rank) correlations for the summary and the heatmap
+CORRELATION_METHOD = os.environ.get("CORRELATION_METHOD", "pearson")
+# Show the per-stage timing panel on every results page (otherwise only with ?trace=1)
+SHOW_TRACE = os.environ.get("SHOW_TRACE", "0") == "1"
+# Compressed exports (.csv.gz / .gz / .zip) are decompressed while they stream in
+ALLOWED_EXTENSIONS = {"csv", "gz", "zip"}
 SECRET_KEY = "change-this-to-a-random-secret-key"  # change before deployment
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PLOTS_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
+# Validate, hash and store CSV uploads chunk by chunk as the request body arrives
+app.request_class = StreamingUploadRequest
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["PLOTS_FOLDER"] = PLOTS_FOLDER
+app.config["JOBS_FOLDER"] = JOBS_FOLDER
+app.config["CACHE_FOLDER"] = CACHE_FOLDER
+app.config["MODELS_FOLDER"] = MODELS_FOLDER
+app.config["DATASETS_FOLDER"] = DATASETS_FOLDER
 app.secret_key = SECRET_KEY
 
 # Allow uploads up to 500 MB
 app.config["MAX_CONTENT_LENGTH"] = 500 * 1024 * 1024  # 500 MB
+# Limit on the decompressed size of .gz / .zip uploads
+app.config["MAX_UNCOMPRESSED_LENGTH"] = int(os.environ.get("MAX_UNCOMPRESSED_MB", "2048")) * 1024 * 1024
+
+# Parameters that change analysis output; part of the result cache key
+ANALYSIS_PARAMS = {
+    "pipeline_version": 9,
+    "sample_rows": 100000,
+    "plot_output": PLOT_OUTPUT,
+    "ml_engine": ML_ENGINE,
+    "ml_full_max_rows": ML_FULL_MAX_ROWS,
+    "datetime_features": DATETIME_FEATURES,
+    "string_dtype": STRING_DTYPE,
+    "float_downcast": FLOAT_DOWNCAST,
+    "cleaning_policy": CLEANING_POLICY,
+    "correlation_method": CORRELATION_METHOD,
+}
+
+
+def warm_worker():
+    """
+    Analysis worker initializer: import the deferred analytical stack and draw a throwaway
+    chart (font cache) before the first job arrives, and record how long it took.
+    """
+    # Timings inherited from the web process are reported there
+    drain_import_times()
+    started = time.perf_counter()
+    try:
+        warm()
+        warm_up_plots()
+    except Exception:
+        app.logger.exception("Failed to preload the analysis worker")
+        return
+    observations = [("startup_import_seconds", {"module": name, "process": "worker"}, seconds)
+                    for name, seconds in drain_import_times()]
+    observations.append(("startup_worker_warm_seconds", {}, time.perf_counter() - started))
+    try:
+        metrics_store.observe_many(observations)
+    except Exception:
+        app.logger.exception("Failed to record worker startup metrics")
+
+
+# Finished analyses keyed by file content + ANALYSIS_PARAMS (size-bounded LRU)
+result_cache = ResultCache(CACHE_FOLDER, max_bytes=CACHE_MAX_BYTES, max_bulk_bytes=EXPLORER_MAX_BYTES)
+
+# Fitted segmentation / anomaly pipelines, keyed by feature schema
+model_registry = deferred(lambda: ModelRegistry(MODELS_FOLDER), "model_registry")
+
+# ML column roles (IDs, constants, amounts...), inferred once per column layout
+schema_inference = deferred(lambda: SchemaInference(os.path.join(MODELS_FOLDER, "schemas")), "schema_inference")
+
+# Growing datasets updated batch by batch from mergeable aggregates
+dataset_store = deferred(lambda: DatasetStore(DATASETS_FOLDER, sample_size=ANALYSIS_PARAMS["sample_rows"]),
+                         "dataset_store")
 
-sns.set(style="whitegrid")
+# Background analysis jobs (SQLite index + local process pool, no broker)
+job_store = JobStore(JOBS_FOLDER)
+job_queue = JobQueue(job_store, max_workers=ANALYSIS_WORKERS, memory_budget=ANALYSIS_MEMORY_BUDGET,
+                     max_per_owner=MAX_ACTIVE_PER_SESSION, initializer=warm_worker)
+
+# Expiry index of uploads and derived files, swept in the background in expiry order
+# (with finished jobs and their pickled results)
+artifact_store = ArtifactStore(os.path.join(JOBS_FOLDER, "artifacts.db"), ttl=ARTIFACT_TTL)
+artifact_sweeper = ArtifactSweeper(artifact_store, is_pinned=result_cache.pinned,
+                                   adopt_folders=(UPLOAD_FOLDER, PLOTS_FOLDER),
+                                   extra_sweeps=(lambda: job_store.expire(ARTIFACT_TTL),))
+
+# Stage timings and request latencies as Prometheus histograms (GET /metrics)
+metrics_store = MetricsStore(os.path.join(JOBS_FOLDER, "metrics.db"))
 
 
 def allowed_file(filename):
@@ -47,72 +197,126 @@ def unique_path(folder, name):
     return os.path.join(folder, uniq)
 
 
-def convert_datetime_columns(df):
-    """Convert datetime columns to year, month, day columns."""
-    df_copy = df.copy()
-    for col in df_copy.columns:
-        if pd.api.types.is_datetime64_any_dtype(df_copy[col]):
-            try:
-                df_copy[f"{col}_year"] = df_copy[col].dt.year
-                df_copy[f"{col}_month"] = df_copy[col].dt.month
-                df_copy[f"{col}_day"] = df_copy[col].dt.day
-                df_copy = df_copy.drop(columns=[col])
-                app.logger.info(f"Converted datetime column '{col}' to year/month/day")
-            except Exception as e:
-                app.logger.warning(f"Failed to convert datetime column '{col}': {e}")
-    return df_copy
+def convert_datetime_columns(df, formats=None):
+    """
+    Replace datetime columns, including text columns holding dates, by compact
+    year/month/day (plus DATETIME_FEATURES extras) columns; see datetimes.py.
+    Returns (frame, {column: format}); pass ``formats`` back in to parse more of the
+    same data with the formats detected the first time.
+    """
+    parts = datetimes.DEFAULT_PARTS + DATETIME_FEATURES
+    df, converted = datetimes.expand_datetime_features(df, parts=parts, formats=formats)
+    if formats is None:
+        for col, fmt in converted.items():
+            app.logger.info("Converted datetime column '%s'%s to %s", col, f" (format {fmt})" if fmt else "",
+                            "/".join(parts))
+    return df, converted
+
+
+# Label columns perform_fintech_analysis adds to the analyzed frame
+LABEL_COLUMNS = ("Segment", "Is_Anomaly")
+# Per-row ML outputs: they only feed the charts, so stored results leave them out
+ROW_RESULTS = ("segments", "anomalies", "pca_data")
+
+
+def stored_ml_results(ml_results):
+    """``ml_results`` without the per-row arrays, which grow with rows and the page never reads."""
+    return {key: value for key, value in ml_results.items() if key not in ROW_RESULTS}
 
 
 def detect_financial_columns(df):
-    """Heuristic to identify likely financial columns."""
-    numeric_cols = df.select_dtypes(include="number").columns.tolist()
-    financial_keywords = ["amount", "balance", "price", "cost", "revenue", "expense", "profit", "salary", "income", "transaction"]
-    
-    likely_financial = []
-    for col in numeric_cols:
-        if any(keyword in col.lower() for keyword in financial_keywords):
-            likely_financial.append(col)
-    
-    # If no explicit matches, just use all numeric columns if they exist
-    return likely_financial if likely_financial else numeric_cols
+    """
+    ML feature columns: amount-like columns, else the other numeric ones, never IDs or
+    constants. Roles come from names plus sampled value statistics, cached per layout.
+    """
+    return schema_inference.features(df)
 
 
-def perform_fintech_analysis(df):
+def perform_fintech_analysis(df, engine="full", registry=None, model=None):
     """
     Performs K-Means Clustering for segmentation and Isolation Forest for fraud/anomaly detection.
     Returns a dictionary with results.
+    engine="scalable" uses the chunked, parallel float32 models from ml.py, which keep
+    time linear in rows so the whole dataset can be analyzed instead of a sample.
+    With a ModelRegistry, uploads whose feature schema already has a fitted pipeline are
+    only scored (no refit); newly fitted pipelines are saved as the next version.
+    ``model`` (a ``results["model"]`` record) pins scoring to that exact registry version and
+    its features, whatever is active now; LookupError if it is no longer in the registry.
     """
     results = {
         "segments": None,
         "anomalies": None,
         "pca_data": None,
         "segment_profiles": None,
-        "fraud_count": 0
+        "fraud_count": 0,
+        "model": None
     }
+
+    if registry is not None and model is not None:
+        key, version = model["schema_key"], model["version"]
+        bundle = registry.load(key, version)
+        if bundle is None:
+            raise LookupError(f"Model {key} v{version} is no longer in the registry")
+        results["features"] = bundle["features"]
+        return _score_fintech_analysis(df, bundle["features"], bundle, results, key, version)
     
     # 1. Select Features
-    features = detect_financial_columns(df)
+    with stage("ml.schema", rows=len(df)):
+        roles = schema_inference.roles(df)
+    features = select_features(roles)
+    results["features"] = features
+    results["skipped_columns"] = {col: role for col, role in roles.items() if role in ("id", "constant")}
     if len(features) < 1:
         return results
 
+    key = schema_key(df, features) if registry is not None else None
+    if registry is not None and not registry.refit_requested(key):
+        bundle = registry.load(key)
+        if bundle is not None and bundle["features"] == features:
+            return _score_fintech_analysis(df, features, bundle, results, key, registry.active_version(key))
+
+    if engine == "scalable":
+        results, bundle = _scalable_fintech_analysis(df, features, results)
+    else:
+        results, bundle = _full_fintech_analysis(df, features, results)
+
+    if registry is not None and bundle is not None:
+        try:
+            version = registry.save(key, bundle, {"engine": engine, "rows": len(df), "features": features})
+            registry.clear_refit(key)
+            results["model"] = {"schema_key": key, "version": version, "mode": "fitted"}
+        except Exception:
+            app.logger.exception("Failed to save fitted models for schema %s", key)
+    return results
+
+
+def _full_fintech_analysis(df, features, results):
+    """Exact models on the (sampled) frame; returns (results, bundle-or-None)."""
     X = df[features].copy()
     
     # 2. Preprocessing (Impute & Scale)
     try:
-        imputer = SimpleImputer(strategy="mean")
-        X_imputed = imputer.fit_transform(X)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_imputed)
+        with stage("ml.preprocess", rows=len(X)):
+            imputer = SimpleImputer(strategy="mean")
+            X_imputed = imputer.fit_transform(X)
+            scaler = StandardScaler()
+            X_scaled = scaler.fit_transform(X_imputed)
     except Exception as e:
         app.logger.error(f"Preprocessing failed: {e}")
-        return results
+        return results, None
+
+    # Imputing with the mean then standardizing == standardize_float32 with these stats
+    bundle = {"features": features, "means": imputer.statistics_, "scales": scaler.scale_,
+              "kmeans": None, "iso": None, "pca": None}
 
     # 3. Clustering (Segmentation) - Default to 3 segments (faster than 4)
     try:
         kmeans = KMeans(n_clusters=3, random_state=42, n_init=5)  # Reduced from n_init=10 to 5
-        clusters = kmeans.fit_predict(X_scaled)
+        with stage("ml.kmeans", rows=len(X_scaled), mode="fit"):
+            clusters = kmeans.fit_predict(X_scaled)
         df["Segment"] = clusters
         results["segments"] = clusters
+        bundle["kmeans"] = kmeans
         
         # Calculate Segment Profiles (Mean values of features)
         profiles = df.groupby("Segment")[features].mean().reset_index()
@@ -123,11 +327,13 @@ def perform_fintech_analysis(df):
     # 4. Anomaly Detection (Fraud Risk) - Contamination 1%
     try:
         iso = IsolationForest(contamination=0.01, random_state=42)
-        anomalies = iso.fit_predict(X_scaled)
+        with stage("ml.isolation_forest", rows=len(X_scaled), mode="fit"):
+            anomalies = iso.fit_predict(X_scaled)
         # IsolationForest returns -1 for anomalies, 1 for normal. Map to Boolean or Label.
         df["Is_Anomaly"] = anomalies == -1
         results["anomalies"] = df["Is_Anomaly"].values
         results["fraud_count"] = int(df["Is_Anomaly"].sum())
+        bundle["iso"] = iso
     except Exception as e:
         app.logger.error(f"Anomaly Detection failed: {e}")
 
@@ -135,66 +341,155 @@ def perform_fintech_analysis(df):
     try:
         if X_scaled.shape[1] >= 2:
             pca = PCA(n_components=2)
-            coords = pca.fit_transform(X_scaled)
+            with stage("ml.pca", rows=len(X_scaled), mode="fit"):
+                coords = pca.fit_transform(X_scaled)
             results["pca_data"] = coords
+            bundle["pca"] = pca
     except Exception as e:
         app.logger.error(f"PCA failed: {e}")
 
+    complete = bundle["kmeans"] is not None and bundle["iso"] is not None
+    return results, bundle if complete else None
+
+
+def _scalable_fintech_analysis(df, features, results):
+    """Scalable-engine models on every row; returns (results, bundle-or-None)."""
+    try:
+        with stage("ml.preprocess", rows=len(df)):
+            X_scaled, means, scales = standardize_float32(df[features].to_numpy(dtype=np.float32, na_value=np.nan))
+    except Exception as e:
+        app.logger.error(f"Preprocessing failed: {e}")
+        return results, None
+
+    fitted = fit_scalable(X_scaled, n_clusters=3, contamination=0.01)
+
+    if fitted["kmeans"] is not None:
+        clusters = fitted["kmeans"][1]
+        df["Segment"] = clusters
+        results["segments"] = clusters
+        profiles = df.groupby("Segment")[features].mean().reset_index()
+        results["segment_profiles"] = profiles.to_dict(orient="records")
+
+    if fitted["iso"] is not None:
+        df["Is_Anomaly"] = fitted["iso"][1]
+        results["anomalies"] = df["Is_Anomaly"].values
+        results["fraud_count"] = int(df["Is_Anomaly"].sum())
+
+    if fitted["pca"] is not None and fitted["pca"][1] is not None:
+        results["pca_data"] = fitted["pca"][1]
+
+    if fitted["kmeans"] is None or fitted["iso"] is None:
+        return results, None
+    bundle = {"features": features, "means": means, "scales": scales,
+              "kmeans": fitted["kmeans"][0], "iso": fitted["iso"][0],
+              "pca": fitted["pca"][0] if fitted["pca"] is not None else None}
+    return results, bundle
+
+
+def _score_fintech_analysis(df, features, bundle, results, key, version):
+    """Score-only path: apply a registry pipeline to every row in vectorized batches."""
+    try:
+        with stage("ml.preprocess", rows=len(df)):
+            X_scaled, _, _ = standardize_float32(df[features].to_numpy(dtype=np.float32, na_value=np.nan),
+                                                 means=bundle["means"], scales=bundle["scales"])
+        segments, anomalies, coords = score_bundle(bundle, X_scaled)
+    except Exception as e:
+        app.logger.error(f"Scoring with saved models failed: {e}")
+        return results
+
+    df["Segment"] = segments
+    results["segments"] = segments
+    profiles = df.groupby("Segment")[features].mean().reset_index()
+    results["segment_profiles"] = profiles.to_dict(orient="records")
+
+    df["Is_Anomaly"] = anomalies
+    results["anomalies"] = df["Is_Anomaly"].values
+    results["fraud_count"] = int(df["Is_Anomaly"].sum())
+
+    if coords is not None:
+        results["pca_data"] = coords
+    results["model"] = {"schema_key": key, "version": version, "mode": "scored"}
     return results
 
 
-def generate_plots(df, prefix, ml_results=None):
-    """Generates plots (from df) and returns list of web paths like '/static/plots/xxx.png'."""
-    plot_files = []
+def compute_correlations(df, profile=None):
+    """
+    Top correlated pairs and a clustered heatmap (see correlation.py), from a streaming
+    profile's whole-file Pearson sums when it tracks them, else from the rows in df.
+    """
+    matrix = profile.correlation() if profile is not None and CORRELATION_METHOD == "pearson" else None
+    if matrix is not None:
+        return correlations_from_matrix(matrix)
+    return correlate(df, method=CORRELATION_METHOD)
+
+
+def generate_plots(df, prefix, ml_results=None, profile=None, output="png", correlations=None):
+    """
+    Generates plots (from df) and returns list of web paths like '/static/plots/xxx.png'.
+    When a streaming DatasetProfile is given, histograms and boxplots are drawn from its
+    whole-file aggregates instead of the rows in df.
+    Each chart is an independent render task that gets only the pre-aggregated arrays it
+    needs (bin counts, box statistics, downsampled or density-gridded points), so drawing
+    cost depends on the number of bins rather than rows; the tasks run in parallel across
+    a bounded process pool, of which each analysis worker gets its share (see plots.py).
+    With output="json" nothing is rasterized or written: a list of compact chart specs is
+    returned instead, for the browser to draw (see static/charts.js).
+    ``correlations`` (from compute_correlations) is reused for the heatmap when given.
+    """
+    with stage("plots.aggregate", rows=len(df)):
+        tasks = build_plot_tasks(df, prefix, ml_results=ml_results, profile=profile, correlations=correlations)
+    if output == "json":
+        return [chart_spec(t) for t in tasks]
+    return [f"/static/plots/{os.path.basename(p)}" for p in render_plots(tasks)]
+
+
+def build_plot_tasks(df, prefix, ml_results=None, profile=None, correlations=None):
+    """Prepare one PlotTask per chart from df (and an optional streaming profile)."""
+    tasks = []
     numeric = df.select_dtypes(include="number").columns.tolist()
     categorical = df.select_dtypes(include=["object", "category", "bool"]).columns.tolist()
 
+    def add(kind, name, title, figsize, **data):
+        fname = f"{prefix}_{name}.png".replace(" ", "_")
+        path = os.path.join(app.config["PLOTS_FOLDER"], fname)
+        tasks.append(PlotTask(kind, path, title, figsize, **data))
+
     # Histograms (up to 3) - Reduced from 6 for speed
     for col in numeric[:3]:
         try:
-            plt.figure(figsize=(6, 4))
-            sns.histplot(df[col].dropna(), kde=True, bins=30)
-            plt.title(f"Histogram: {col}")
-            fname = f"{prefix}_hist_{col}.png".replace(" ", "_")
-            path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-            plt.tight_layout()
-            plt.savefig(path, dpi=80)  # Reduced DPI for speed
-            plt.close()
-            plot_files.append(f"/static/plots/{fname}")
+            if profile is not None and col in profile.columns:
+                counts, edges = profile.columns[col].histogram.histogram()
+                add("hist", f"hist_{col}", f"Histogram: {col}", (6, 4), counts=counts, edges=edges, column=col)
+            else:
+                add("hist", f"hist_{col}", f"Histogram: {col}", (6, 4), column=col,
+                    **histogram_aggregate(df[col].dropna()))
         except Exception:
             app.logger.exception("Failed to create histogram for %s", col)
 
     # Boxplots (up to 2) - Reduced from 3
     for col in numeric[:2]:
         try:
-            plt.figure(figsize=(6, 3))
-            sns.boxplot(x=df[col].dropna())
-            plt.title(f"Boxplot: {col}")
-            fname = f"{prefix}_box_{col}.png".replace(" ", "_")
-            path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-            plt.tight_layout()
-            plt.savefig(path, dpi=80)
-            plt.close()
-            plot_files.append(f"/static/plots/{fname}")
+            stats = profile.columns[col].box_stats() if profile is not None and col in profile.columns else None
+            if stats is None:
+                stats = box_aggregate(df[col].dropna(), label=col)
+            add("box", f"box_{col}", f"Boxplot: {col}", (6, 3), stats=stats, column=col)
         except Exception:
             app.logger.exception("Failed to create boxplot for %s", col)
 
+    def category_counts(col):
+        # Whole-file (or whole-dataset) counts from the profile when one is available
+        if profile is not None and col in profile.columns and not profile.columns[col].is_numeric:
+            return profile.category_counts(col)
+        return df[col].astype(object).fillna("<<Missing>>").value_counts()
+
     # Pie charts for categorical top counts (up to 2) - Reduced from 3
     for col in categorical[:2]:
         try:
-            counts = df[col].fillna("<<Missing>>").value_counts().nlargest(6)
+            counts = category_counts(col).nlargest(6)
             if counts.sum() == 0:
                 continue
-            plt.figure(figsize=(5, 5))
-            counts.plot.pie(autopct="%1.1f%%", startangle=90)
-            plt.ylabel("")
-            plt.title(f"Distribution: {col}")
-            fname = f"{prefix}_pie_{col}.png".replace(" ", "_")
-            path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-            plt.tight_layout()
-            plt.savefig(path, dpi=80)
-            plt.close()
-            plot_files.append(f"/static/plots/{fname}")
+            add("pie", f"pie_{col}", f"Distribution: {col}", (5, 5),
+                labels=counts.index.tolist(), values=counts.values)
         except Exception:
             app.logger.exception("Failed to create pie chart for %s", col)
 
@@ -202,106 +497,52 @@ def generate_plots(df, prefix, ml_results=None):
     if categorical:
         col = categorical[0]
         try:
-            counts = df[col].fillna("<<Missing>>").value_counts().nlargest(10)
-            plt.figure(figsize=(8, 4))
-            sns.barplot(x=counts.values, y=counts.index)
-            plt.title(f"Top categories: {col}")
-            fname = f"{prefix}_bar_{col}.png".replace(" ", "_")
-            path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-            plt.tight_layout()
-            plt.savefig(path, dpi=80)
-            plt.close()
-            plot_files.append(f"/static/plots/{fname}")
+            counts = category_counts(col).nlargest(10)
+            add("bar", f"bar_{col}", f"Top categories: {col}", (8, 4),
+                labels=counts.index.tolist(), values=counts.values)
         except Exception:
             app.logger.exception("Failed to create bar chart for %s", col)
 
-    # Correlation heatmap for numeric features (if >=2)
+    # Correlation heatmap of the most correlated numeric columns, clustered (if >=2)
     if len(numeric) >= 2:
         try:
-            corr = df[numeric].corr()
-            plt.figure(figsize=(8, 6))
-            sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", vmin=-1, vmax=1)
-            plt.title("Correlation heatmap")
-            fname = f"{prefix}_corr.png".replace(" ", "_")
-            path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-            plt.tight_layout()
-            plt.savefig(path, dpi=80)
-            plt.close()
-            plot_files.append(f"/static/plots/{fname}")
+            if correlations is None:
+                correlations = compute_correlations(df, profile)
+            if correlations is not None:
+                heatmap = correlations["heatmap"]
+                title = "Correlation heatmap"
+                if correlations["reduced"]:
+                    title += f" ({len(heatmap)} of {correlations['columns']} columns)"
+                add("corr", "corr", title, (8, 6), corr=heatmap)
         except Exception:
             app.logger.exception("Failed to create correlation heatmap")
 
     # --- Fintech ML Plots ---
     if ml_results and ml_results.get("pca_data") is not None:
         pca_data = ml_results["pca_data"]
-        
+
         # 1. Segmentation Plot
-        try:
-            plt.figure(figsize=(8, 6))
-            segments = ml_results.get("segments")
-            if segments is not None:
-                sns.scatterplot(x=pca_data[:, 0], y=pca_data[:, 1], hue=segments, palette="viridis", s=60)
-                plt.title("Customer Segmentation (PCA projection)")
-                plt.xlabel("Principal Component 1")
-                plt.ylabel("Principal Component 2")
-                fname = f"{prefix}_segmentation.png".replace(" ", "_")
-                path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-                plt.tight_layout()
-                plt.savefig(path, dpi=80)
-                plt.close()
-                plot_files.append(f"/static/plots/{fname}")
-        except Exception:
-            app.logger.exception("Failed to create segmentation plot")
+        if ml_results.get("segments") is not None:
+            add("segmentation", "segmentation", "Customer Segmentation (PCA projection)", (8, 6),
+                **segmentation_aggregate(pca_data, ml_results["segments"]))
 
         # 2. Fraud/Anomaly Plot
-        try:
-            plt.figure(figsize=(8, 6))
-            anomalies = ml_results.get("anomalies")
-            if anomalies is not None:
-                # Color code: Blue (Normal), Red (High Risk)
-                colors = ["red" if x else "blue" for x in anomalies]
-                plt.scatter(pca_data[:, 0], pca_data[:, 1], c=colors, s=60, alpha=0.6)
-                # Create a custom legend
-                from matplotlib.lines import Line2D
-                legend_elements = [Line2D([0], [0], marker='o', color='w', label='Normal', markerfacecolor='blue', markersize=10),
-                                   Line2D([0], [0], marker='o', color='w', label='Potential Fraud', markerfacecolor='red', markersize=10)]
-                plt.legend(handles=legend_elements)
-                
-                plt.title("Fraud Risk Visualizer (PCA projection)")
-                plt.xlabel("Principal Component 1")
-                plt.ylabel("Principal Component 2")
-                fname = f"{prefix}_fraud.png".replace(" ", "_")
-                path = os.path.join(app.config["PLOTS_FOLDER"], fname)
-                plt.tight_layout()
-                plt.savefig(path, dpi=80)
-                plt.close()
-                plot_files.append(f"/static/plots/{fname}")
-        except Exception:
-            app.logger.exception("Failed to create fraud plot")
+        if ml_results.get("anomalies") is not None:
+            add("fraud", "fraud", "Fraud Risk Visualizer (PCA projection)", (8, 6),
+                **fraud_aggregate(pca_data, ml_results["anomalies"]))
 
-    return plot_files
+    return tasks
 
 
 def dataset_summary(df):
-    """Return a DataFrame summarizing columns (dtype, non-null count, unique, mean/std if numeric)."""
-    rows = []
-    for col in df.columns:
-        try:
-            dtype = str(df[col].dtype)
-            non_null = int(df[col].notna().sum())
-            unique = int(df[col].nunique(dropna=True))
-            sample = str(df[col].dropna().iloc[0]) if non_null > 0 else ""
-            info = {"column": col, "dtype": dtype, "non_null_count": non_null, "unique_values": unique, "sample_value": sample}
-            if pd.api.types.is_numeric_dtype(df[col]):
-                info["mean"] = float(df[col].mean(skipna=True)) if non_null else None
-                info["std"] = float(df[col].std(skipna=True)) if non_null else None
-            else:
-                info["mean"] = None
-                info["std"] = None
-            rows.append(info)
-        except Exception:
-            app.logger.exception("Error summarizing column %s", col)
-    return pd.DataFrame(rows)
+    """
+    Return a DataFrame summarizing columns (dtype, non-null count, unique, mean/std if numeric).
+    Accepts a DataFrame, a FrameProfile from ``profile_frame`` (pass one in to share it with
+    ``generate_dataset_explanation``) or a streaming DatasetProfile covering the whole file.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = profile_frame(df)
+    return df.summary_frame()
 
 
 def generate_dataset_explanation(df, filename, summary_source="full file"):
@@ -339,33 +580,6 @@ def generate_dataset_explanation(df, filename, summary_source="full file"):
     return explanation
 
 
-def cleanup_old_files(max_age_seconds=1800):
-    """Delete files in uploads and static/plots folders older than max_age_seconds (default 30 mins)."""
-    import time
-    
-    folders = [app.config["UPLOAD_FOLDER"], app.config["PLOTS_FOLDER"]]
-    now = time.time()
-    
-    for folder in folders:
-        if not os.path.exists(folder):
-            continue
-            
-        for filename in os.listdir(folder):
-            file_path = os.path.join(folder, filename)
-            try:
-                # Skip if it's a directory or the .gitkeep file
-                if not os.path.isfile(file_path) or filename.startswith("."):
-                    continue
-                    
-                # Check file age
-                file_age = now - os.path.getmtime(file_path)
-                if file_age > max_age_seconds:
-                    os.remove(file_path)
-                    # app.logger.info(f"Deleted old file: {filename}")
-            except Exception as e:
-                app.logger.warning(f"Error deleting file {filename}: {e}")
-
-
 def generate_chart_explanations():
     """Generate simple explanations for basic chart types."""
     explanations = {
@@ -393,21 +607,28 @@ def generate_chart_explanations():
     return explanations
 
 
-def generate_dataset_explanation(df, filename, summary_source):
-    """Generate comprehensive dataset explanation for the template."""
-    import sys
-    
-    # Calculate duplicate rows (before cleaning)
-    # Since we already cleaned the data, we'll use 0 for now or could track it earlier
-    duplicate_rows = 0
+def generate_dataset_explanation(df, filename, summary_source, memory=None, cleaning=None):
+    """
+    Generate comprehensive dataset explanation for the template.
+    ``df`` may also be a FrameProfile, or a streaming DatasetProfile whose counts cover the whole file.
+    ``memory`` is the load-time dtype optimizer report; with it the memory figures describe the
+    loaded frame before and after optimization. ``cleaning`` is the cleaning stage report, the
+    source of the duplicate and null-row counts.
+    """
+
+    if isinstance(df, pd.DataFrame):
+        df = profile_frame(df)
+    numeric_cols = df.numeric_columns
+    categorical_cols = df.categorical_columns
+    total_cells = df.rows * len(df.columns)
+    non_null_cells = total_cells - df.missing_cells
+    memory_bytes = df.memory_bytes
     
-    # Get numeric and categorical columns
-    numeric_cols = df.select_dtypes(include='number').columns.tolist()
-    categorical_cols = df.select_dtypes(include=['object', 'category', 'bool']).columns.tolist()
+    # Duplicate and incomplete rows as counted by the cleaning stage (before cleaning)
+    cleaning = cleaning or {}
+    duplicate_rows = cleaning.get("duplicate_rows", 0)
     
     # Calculate data completeness
-    total_cells = df.shape[0] * df.shape[1]
-    non_null_cells = df.notna().sum().sum()
     completeness_percent = round((non_null_cells / total_cells * 100) if total_cells > 0 else 0, 1)
     
     # Determine quality status
@@ -421,7 +642,12 @@ def generate_dataset_explanation(df, filename, summary_source):
         quality_status = "Poor"
     
     # Calculate memory usage in MB
-    memory_bytes = df.memory_usage(deep=True).sum()
+    memory_before_mb = memory_saved_percent = None
+    if memory:
+        memory_bytes = memory["after_bytes"]
+        memory_before_mb = round(memory["before_bytes"] / (1024 * 1024), 2)
+        if memory["before_bytes"]:
+            memory_saved_percent = round((1 - memory_bytes / memory["before_bytes"]) * 100, 1)
     memory_mb = round(memory_bytes / (1024 * 1024), 2)
     
     explanation = {
@@ -432,42 +658,116 @@ def generate_dataset_explanation(df, filename, summary_source):
         "filename": filename,
         "summary_source": summary_source,
         "memory_mb": memory_mb,
+        "memory_before_mb": memory_before_mb,
+        "memory_saved_percent": memory_saved_percent,
         "numeric_cols": len(numeric_cols),
         "categorical_cols": len(categorical_cols),
         "numeric_columns": numeric_cols,
         "categorical_columns": categorical_cols,
-        "duplicate_rows": duplicate_rows
+        "duplicate_rows": duplicate_rows,
+        "null_rows": cleaning.get("null_rows", 0),
+        "cleaning_policy": cleaning.get("policy"),
+        "imputed_columns": sorted(cleaning.get("imputed", {})),
     }
     
     return explanation
 
 
+def estimate_job_memory(path=None):
+    """Estimated peak memory (bytes) of a job over the (decompressed) CSV at ``path``."""
+    size = os.path.getsize(path) if path and os.path.exists(path) else 0
+    return ANALYSIS_BASE_MEMORY + int(ANALYSIS_MEMORY_FACTOR * size)
+
+
+def session_owner():
+    """A random per-session id that admission control counts active jobs against."""
+    if "owner" not in session:
+        session["owner"] = uuid.uuid4().hex
+    return session["owner"]
+
+
+def track_upload(path):
+    """
+    Index a saved upload with its sidecar and (future) Parquet copy and lock under the session,
+    then apply the session's storage quota.
+    """
+    basename, owner = os.path.basename(path), session_owner()
+    artifact_store.register(path, basename, "upload", owner=owner)
+    artifact_store.register(meta_path(path), basename, "meta", owner=owner)
+    artifact_store.register(columnar_path(path), basename, "columnar", owner=owner)
+    artifact_store.register(columnar_lock_path(path), basename, "lock", owner=owner)
+    artifact_store.enforce_quota(owner, SESSION_QUOTA, keep=basename)
+
+
+def ingest_and_track(csv_path, progress=None):
+    """ingest_upload, then record the Parquet copy's size against the upload's owner."""
+    out = ingest_upload(csv_path, progress=progress)
+    if out:
+        artifact_store.register(out, os.path.basename(csv_path), "columnar")
+    return out
+
+
+def save_upload(file):
+    """
+    Move an uploaded CSV into UPLOAD_FOLDER under a unique name; returns (path, meta).
+    ``meta`` is the sniffed format of a streamed upload (None for a plain file part).
+    Raises UploadRejected when the finished stream turns out not to be a usable CSV.
+    """
+    filename = secure_filename(stored_name(file.filename))
+    path = unique_path(app.config["UPLOAD_FOLDER"], filename)
+    if isinstance(file.stream, CsvUploadSink):
+        return path, file.stream.finish(path)
+    file.save(path)
+    return path, None
+
+
 # --- Routes ---
 @app.route("/", methods=["GET", "POST"])
 def upload_file():
     message = None
     uploaded_filename = session.get("uploaded_filename", None)
     if request.method == "POST":
-        action = request.form.get("action")
+        try:
+            # Parsing the form streams the file into its sink, which rejects non-CSV data early
+            action = request.form.get("action")
+            files = request.files
+        except UploadRejected as e:
+            app.logger.info("Rejected upload: %s", e.description)
+            flash(e.description)
+            return redirect(request.url)
         if action == "upload":
-            if "file" not in request.files:
+            if "file" not in files:
                 flash("No file part")
                 return redirect(request.url)
-            file = request.files["file"]
+            file = files["file"]
             if file.filename == "":
                 flash("No selected file")
                 return redirect(request.url)
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                path = unique_path(app.config["UPLOAD_FOLDER"], filename)
-                file.save(path)
+                try:
+                    path, meta = save_upload(file)
+                except UploadRejected as e:
+                    flash(e.description)
+                    return redirect(request.url)
                 basename = os.path.basename(path)
+                track_upload(path)
                 session["uploaded_filename"] = basename  # store only basename
                 size_mb = os.path.getsize(path) / (1024 * 1024)
                 message = f"Uploaded {basename} ({size_mb:.2f} MB)"
+                if meta:
+                    message = f"Uploaded {basename} ({size_mb:.2f} MB, {meta['rows']:,} rows)"
+                    if meta["compression"] != "none":
+                        message += f" from a {meta['uploaded_bytes'] / (1024 * 1024):.2f} MB {meta['compression']} file"
                 app.logger.info("Saved upload to %s (%.2f MB)", path, size_mb)
+                if HAS_PYARROW:
+                    # Convert to the typed columnar format in the background, once per upload;
+                    # when the queue is full the analysis reads the CSV instead
+                    try:
+                        job_queue.submit(basename, ingest_and_track, path, cost=INGEST_MEMORY)
+                    except QueueFull:
+                        app.logger.info("Skipped background ingest of %s: job queue is full", basename)
             else:
-                flash("Allowed file types: csv")
+                flash("Allowed file types: csv, csv.gz, zip")
                 return redirect(request.url)
         elif action == "analyze":
             if not uploaded_filename:
@@ -477,104 +777,673 @@ def upload_file():
     return render_template("upload.html", message=message, uploaded_filename=uploaded_filename)
 
 
-@app.route("/results")
-def results():
-    uploaded_basename = session.get("uploaded_filename", None)
-    if not uploaded_basename:
-        flash("No file available for analysis. Please upload a CSV first.")
-        return redirect(url_for("upload_file"))
+def traced(name, fn, *args):
+    """
+    Run ``fn(*args)`` under a new stage trace and return its template context with the
+    spans attached as ``trace``; the spans also feed the /metrics histograms.
+    """
+    with tracing() as trace:
+        with stage(name):
+            context = fn(*args)
+    context = dict(context, trace=trace.as_list())
+    try:
+        metrics_store.observe_trace(trace)
+    except Exception:
+        app.logger.exception("Failed to record stage metrics")
+    return context
 
-    full_path = os.path.join(app.config["UPLOAD_FOLDER"], uploaded_basename)
-    if not os.path.exists(full_path):
-        flash("Uploaded file missing on server. Please re-upload.")
-        session.pop("uploaded_filename", None)
-        return redirect(url_for("upload_file"))
-    
-    # Clean up old files to keep storage usage low
-    cleanup_old_files()
 
+def run_analysis(full_path, uploaded_basename, progress=None):
+    """
+    Runs the full analysis pipeline for an uploaded CSV and returns the template context.
+    Called from a background job; ``progress(stage)`` is invoked as each stage starts.
+    Results are cached by file content, so re-uploads of the same file skip parsing entirely.
+    """
+    return traced("analysis", _cached_analysis, full_path, uploaded_basename, progress)
+
+
+def analysis_cache_key(full_path):
+    """Result cache key of an upload: its content hash plus everything that changes the output."""
+    # Refitting or activating a model version changes results, so it is part of the key
+    params = dict(ANALYSIS_PARAMS, model_generation=model_registry.generation())
+    # The hash computed while the upload streamed in saves a full re-read of the file
+    return cache_key(upload_digest(full_path) or file_digest(full_path), params)
+
+
+def _cached_analysis(full_path, uploaded_basename, progress):
+    progress = progress or (lambda stage: None)
+
+    with stage("cache_lookup") as span:
+        key = analysis_cache_key(full_path)
+        cached = result_cache.get(key)
+        span.labels["result"] = "hit" if cached is not None else "miss"
+    if cached is not None:
+        app.logger.info("Cache hit for %s (key %s)", uploaded_basename, key[:12])
+        cached["filename"] = uploaded_basename
+        cached["dataset_explanation"]["filename"] = uploaded_basename
+        return cached
+
+    explorer_path = os.path.join(EXPLORER_FOLDER, f"{key}.arrow")
+    context = _analyze(full_path, uploaded_basename, progress, explorer_path)
+    plot_paths = [os.path.join(app.config["PLOTS_FOLDER"], os.path.basename(p)) for p in context["plots"]]
+    artifact_store.register_many(plot_paths, uploaded_basename, "plot")
+    explorer_paths = []
+    if context["explorer"]:
+        artifact_store.register(explorer_path, uploaded_basename, "explorer")
+        explorer_paths.append(explorer_path)
+    try:
+        result_cache.put(key, context, plot_paths, bulk_files=explorer_paths)
+    except Exception:
+        app.logger.exception("Failed to cache analysis result for %s", uploaded_basename)
+    return context
+
+
+def _analyze(full_path, uploaded_basename, progress, explorer_path=None):
+    """
+    The uncached analysis pipeline behind run_analysis(). With ``explorer_path`` the analyzed
+    rows and their ML labels are also written there for the row explorer.
+    """
     file_size_mb = os.path.getsize(full_path) / (1024 * 1024)
     app.logger.info("Preparing analysis for %s (%.2f MB)", full_path, file_size_mb)
 
-    # Try reading the full file, fallback to sample if memory fails or other errors
+    # Try reading the full file, fallback to sample if memory fails or other errors.
+    # The typed columnar copy (built once after upload) is much cheaper to read than the CSV.
+    progress("read")
     df = None
     loaded_full = False
+    load_memory = None
+    notice = None
+    parquet_path = None
+    if HAS_PYARROW:
+        try:
+            with stage("columnar"):
+                parquet_path = ensure_columnar(full_path)
+            artifact_store.register(parquet_path, uploaded_basename, "columnar")
+        except Exception as e:
+            app.logger.warning("Columnar conversion failed for %s (%s); reading CSV instead", full_path, e)
     try:
-        df = pd.read_csv(full_path, low_memory=False, parse_dates=True)
+        # Compact dtypes (categories, narrow ints / floats) let much larger files fit in memory
+        with stage("read", source="parquet" if parquet_path else "csv") as span:
+            if parquet_path:
+                df, load_memory = optimize_dtypes(read_columnar(parquet_path), strings=STRING_DTYPE,
+                                                  floats=FLOAT_DOWNCAST)
+                # Part of the narrowing already happened at ingest; compare with plain read_csv dtypes
+                load_memory["before_bytes"] = default_dtype_bytes(df)
+            else:
+                df, load_memory = read_csv_compact(full_path, strings=STRING_DTYPE, floats=FLOAT_DOWNCAST,
+                                                   **pandas_read_kwargs(full_path))
+            span.rows = len(df)
         loaded_full = True
-        app.logger.info("Loaded full CSV with shape %s", df.shape)
+        app.logger.info("Loaded full dataset with shape %s (%.1f MB, %.1f MB at default dtypes)", df.shape,
+                        load_memory["after_bytes"] / (1024 * 1024), load_memory["before_bytes"] / (1024 * 1024))
     except MemoryError:
         app.logger.exception("MemoryError while reading full CSV - will try sample")
     except Exception as e:
         app.logger.warning("Could not read full CSV (%s). Will attempt to read sample. Trace: %s", e, traceback.format_exc())
 
+    # Fallback: one bounded-memory streaming pass gives exact statistics for the whole
+    # file plus a uniform reservoir sample for the ML and plot stages
+    profile = None
+    file_counts = None
     if not loaded_full:
         try:
-            chunks = pd.read_csv(full_path, chunksize=100000, parse_dates=True)
-            df_sample = next(chunks)
-            df = df_sample
-            flash("Full file could not be loaded into memory. Analysis performed on a 100k-row sample.")
-            app.logger.info("Loaded sample from CSV with shape %s", df.shape)
+            with stage("profile", source="parquet" if parquet_path else "csv") as span:
+                chunk_rows = ANALYSIS_PARAMS["sample_rows"]
+                if parquet_path:
+                    chunks = iter_columnar(parquet_path, batch_size=chunk_rows)
+                else:
+                    chunks = pd.read_csv(full_path, chunksize=chunk_rows, **pandas_read_kwargs(full_path))
+                # Duplicate and null-row counts for the whole file, row hashes spilled to disk if needed
+                counter = DuplicateCounter(spill_dir=app.config["JOBS_FOLDER"])
+                try:
+                    # Whole-file Pearson sums for compute_correlations (rank correlations need the rows)
+                    profile = profile_chunks(counter.observe(chunks), sample_size=chunk_rows,
+                                             track_correlation=CORRELATION_METHOD == "pearson")
+                    file_counts = counter.result()
+                finally:
+                    counter.close()
+                span.rows = profile.rows
+            df = profile.sample
+            notice = (f"Full file could not be loaded into memory. Statistics cover all {profile.rows:,} rows; "
+                      f"charts and ML use a {len(df):,}-row uniform sample.")
+            app.logger.info("Profiled %d rows in a streaming pass; sample shape %s", profile.rows, df.shape)
         except Exception as e:
-            app.logger.exception("Failed to read sample from CSV: %s", e)
-            flash(f"Failed to read file for analysis: {e}")
-            return redirect(url_for("upload_file"))
-    
+            app.logger.exception("Failed to profile CSV: %s", e)
+            raise RuntimeError(f"Failed to read file for analysis: {e}") from e
+
     # --- Convert datetime columns to year/month/day ---
-    df = convert_datetime_columns(df)
+    progress("clean")
+    with stage("convert_datetime", rows=len(df)):
+        df, _ = convert_datetime_columns(df)
 
-    # --- CLEANING STEP: remove nulls and duplicates ---
+    # --- CLEANING STEP: remove duplicates, then drop or impute nulls (CLEANING_POLICY) ---
     before_shape = df.shape
-    df = df.dropna().drop_duplicates()
-    after_shape = df.shape
-    app.logger.info("Cleaned dataset: from %s to %s (removed nulls & duplicates)", before_shape, after_shape)
+    with stage("clean", rows=len(df), policy=CLEANING_POLICY):
+        df, cleaning = clean_frame(df, CLEANING_POLICY)
+    app.logger.info("Cleaned dataset: from %s to %s (%d duplicate rows, %d rows with nulls, policy %s)",
+                    before_shape, df.shape, cleaning["duplicate_rows"], cleaning["null_rows"], CLEANING_POLICY)
+    if file_counts is not None:
+        # The sample's counts say little about the file; report the streaming pass's exact ones
+        cleaning.update(duplicate_rows=file_counts["duplicate_rows"], null_rows=file_counts["null_rows"])
 
     # Use df for summary
-    summary_source = "full file" if loaded_full else "sample"
-    summary_df = dataset_summary(df)
+    progress("summarize")
+    summary_source = "full file" if loaded_full else "streaming profile"
+    # One fused profiling pass feeds both the summary table and the dataset explanation
+    with stage("summary", rows=len(df)):
+        column_profile = profile if profile is not None else profile_frame(df)
+        summary_df = dataset_summary(column_profile)
 
     # Rows / cols
-    rows, cols = df.shape
+    rows, cols = profile.shape if profile is not None else df.shape
 
     # Prepare sample_for_plots: if dataset too big, sample up to 100k rows
     try:
-        if len(df) > 100000:
-            sample_for_plots = df.sample(n=100000, random_state=42)
+        if len(df) > ANALYSIS_PARAMS["sample_rows"]:
+            sample_for_plots = df.sample(n=ANALYSIS_PARAMS["sample_rows"], random_state=42)
         else:
             sample_for_plots = df
     except Exception:
-        sample_for_plots = df.head(100000)
+        sample_for_plots = df.head(ANALYSIS_PARAMS["sample_rows"])
+
+    # Computed once for the summary's top pairs and the heatmap (before ML adds label columns)
+    correlations = None
+    with stage("correlation", rows=len(sample_for_plots), method=CORRELATION_METHOD):
+        try:
+            correlations = compute_correlations(sample_for_plots, profile)
+        except Exception:
+            app.logger.exception("Failed to compute correlations")
 
     # Render head (sample)
     head_html = sample_for_plots.head(10).to_html(classes="table-sample", index=False, escape=False)
     summary_html = summary_df.to_html(classes="invisible-border-table", index=False, float_format="%.3f", na_rep="")
 
-    # Run Fintech ML Analysis
-    ml_results = perform_fintech_analysis(sample_for_plots)
+    # Run Fintech ML Analysis (on every row with the scalable engine, else on the plot sample)
+    progress("ml")
+    engine = ML_ENGINE
+    if engine == "auto":
+        engine = "scalable" if len(df) > ML_FULL_MAX_ROWS else "full"
+    ml_frame = df if engine == "scalable" else sample_for_plots
+    with stage("ml", rows=len(ml_frame), engine=engine):
+        ml_results = perform_fintech_analysis(ml_frame, engine=engine, registry=model_registry)
+
+    # Every analyzed row with its labels, memory-mapped by the paginated rows API
+    explorer = None
+    if explorer_path and HAS_PYARROW:
+        with stage("explorer", rows=len(df)):
+            try:
+                explorer = build_explorer(labeled_frame(df, ml_frame), explorer_path,
+                                          index_columns=ml_results["features"] + list(LABEL_COLUMNS),
+                                          sample=not loaded_full)
+            except Exception:
+                app.logger.exception("Failed to build the row explorer for %s", uploaded_basename)
 
     # Generate plots
+    progress("plots")
     prefix = os.path.splitext(uploaded_basename)[0]
-    try:
-        plots = generate_plots(sample_for_plots, prefix, ml_results=ml_results)
-    except Exception:
-        app.logger.exception("Failed to generate plots")
-        plots = []
+    with stage("plots", rows=len(sample_for_plots)):
+        plots, chart_specs = render_charts(sample_for_plots, prefix, ml_results, profile, correlations)
 
     # Generate explanations
-    dataset_explanation = generate_dataset_explanation(df, uploaded_basename, summary_source)
+    dataset_explanation = generate_dataset_explanation(column_profile, uploaded_basename, summary_source,
+                                                       memory=load_memory, cleaning=cleaning)
     chart_explanations = generate_chart_explanations()
 
-    return render_template("results.html",
-                           filename=uploaded_basename,
-                           rows=rows,
-                           cols=cols,
-                           head=head_html,
-                           summary_html=summary_html,
-                           plots=plots,
-                           summary_source=summary_source,
-                           ml_results=ml_results,
-                           dataset_explanation=dataset_explanation,
-                           chart_explanations=chart_explanations)
+    return dict(filename=uploaded_basename,
+                rows=rows,
+                cols=cols,
+                head=head_html,
+                summary_html=summary_html,
+                plots=plots,
+                chart_specs=chart_specs,
+                summary_source=summary_source,
+                ml_results=stored_ml_results(ml_results),
+                dataset_explanation=dataset_explanation,
+                correlations=correlations,
+                explorer=explorer,
+                chart_explanations=chart_explanations,
+                notice=notice)
+
+
+def labeled_frame(df, ml_frame):
+    """``df`` with the ML labels of ``ml_frame`` (``df`` itself or a sample of it); unscored rows get nulls."""
+    labels = [col for col in LABEL_COLUMNS if col in ml_frame.columns]
+    if ml_frame is df or not labels:
+        return df
+    scored = ml_frame[labels].reindex(df.index)
+    return df.assign(**{col: scored[col].astype("Int64" if col == "Segment" else "boolean") for col in labels})
+
+
+def render_charts(df, prefix, ml_results, profile=None, correlations=None):
+    """Return (plot paths, chart specs): JSON specs when PLOT_OUTPUT=json, else PNGs (also the fallback)."""
+    plots, chart_specs = [], None
+    if ANALYSIS_PARAMS["plot_output"] == "json":
+        try:
+            chart_specs = generate_plots(df, prefix, ml_results=ml_results, profile=profile, output="json",
+                                         correlations=correlations)
+        except Exception:
+            app.logger.exception("Failed to build chart specs; falling back to PNG plots")
+    if chart_specs is None:
+        try:
+            plots = generate_plots(df, prefix, ml_results=ml_results, profile=profile, correlations=correlations)
+        except Exception:
+            app.logger.exception("Failed to generate plots")
+            plots = []
+    return plots, chart_specs
+
+
+def append_batch(dataset_id, full_path, uploaded_basename, progress=None):
+    """
+    Fold one uploaded CSV batch into a dataset and return the results template context.
+    Only the new rows are read, profiled and scored with the dataset's registered models;
+    the page is built from the merged aggregates, so cost follows the batch size.
+    Called from a background job.
+    """
+    return traced("dataset_append", _append_batch, dataset_id, full_path, uploaded_basename, progress)
+
+
+def _append_batch(dataset_id, full_path, uploaded_basename, progress):
+    progress = progress or (lambda stage: None)
+    chunk_rows = ANALYSIS_PARAMS["sample_rows"]
+    with dataset_store.updating(dataset_id) as state:
+        progress("read")
+        if HAS_PYARROW:
+            chunks = iter_columnar(ensure_columnar(full_path), batch_size=chunk_rows)
+        else:
+            chunks = pd.read_csv(full_path, chunksize=chunk_rows, low_memory=False, **pandas_read_kwargs(full_path))
+        batch_rows = 0
+        for chunk in chunks:
+            progress("clean")
+            with stage("convert_datetime", rows=len(chunk)):
+                # Later chunks and batches reuse the first chunk's date formats
+                chunk, date_formats = convert_datetime_columns(chunk, formats=state.date_formats)
+                chunk = state.align(chunk, date_formats)
+            progress("summarize")
+            with stage("summary", rows=len(chunk)):
+                state.profile.update(chunk)
+            progress("ml")
+            # The first chunk scores with (or fits) the active model for its schema; every later
+            # chunk uses that same version, so the aggregates never mix labels from two models
+            engine = "scalable" if len(chunk) > ML_FULL_MAX_ROWS else "full"
+            with stage("ml", rows=len(chunk), engine=engine):
+                ml_results = perform_fintech_analysis(chunk, engine=engine, registry=model_registry,
+                                                      model=state.model)
+                state.add_scores(chunk, ml_results, ml_results["features"])
+            batch_rows += len(chunk)
+        state.batches.append({"upload": uploaded_basename, "rows": batch_rows, "appended": time.time()})
+        app.logger.info("Appended %d rows from %s to dataset %s (%d rows total)",
+                        batch_rows, uploaded_basename, dataset_id, state.rows)
+        progress("plots")
+        return _dataset_context(dataset_id, state)
+
+
+def dataset_results(dataset_id, progress=None):
+    """Results template context for a dataset's current aggregates (no new batch)."""
+    if progress:
+        progress("plots")
+    return traced("dataset_results", lambda: _dataset_context(dataset_id, dataset_store.load(dataset_id)))
+
+
+def _dataset_context(dataset_id, state):
+    df = state.chart_frame()
+    profile = state.profile
+    ml_results = state.ml_results()
+    summary_html = dataset_summary(profile).to_html(classes="invisible-border-table", index=False,
+                                                    float_format="%.3f", na_rep="")
+    head_html = df.head(10).to_html(classes="table-sample", index=False, escape=False)
+    correlations = None
+    with stage("correlation", rows=profile.rows, method=CORRELATION_METHOD):
+        try:
+            correlations = compute_correlations(df, profile)
+        except Exception:
+            app.logger.exception("Failed to compute correlations for dataset %s", dataset_id)
+    with stage("plots", rows=len(df)):
+        plots, chart_specs = render_charts(df, f"dataset_{dataset_id[:12]}_{len(state.batches)}", ml_results, profile,
+                                           correlations)
+    artifact_store.register_many([os.path.join(app.config["PLOTS_FOLDER"], os.path.basename(p)) for p in plots],
+                                 f"dataset:{dataset_id}", "plot")
+    rows, cols = profile.shape
+    notice = f"Dataset \"{state.name}\": {len(state.batches)} batch(es), {rows:,} rows in total."
+    if state.batches:
+        last = state.batches[-1]
+        notice += (f" The latest batch ({last['upload']}) added {last['rows']:,} rows; charts and ML labels "
+                   f"use a {len(df):,}-row sample of all batches.")
+    return dict(filename=state.name,
+                rows=rows,
+                cols=cols,
+                head=head_html,
+                summary_html=summary_html,
+                plots=plots,
+                chart_specs=chart_specs,
+                summary_source="all batches",
+                ml_results=stored_ml_results(ml_results),
+                dataset_explanation=generate_dataset_explanation(profile, state.name, "all batches"),
+                correlations=correlations,
+                chart_explanations=generate_chart_explanations(),
+                notice=notice)
+
+
+def _session_upload_path():
+    """Return (basename, full_path) for the session's upload, or (None, None) if it is gone."""
+    uploaded_basename = session.get("uploaded_filename", None)
+    if not uploaded_basename:
+        return None, None
+    full_path = os.path.join(app.config["UPLOAD_FOLDER"], uploaded_basename)
+    if not os.path.exists(full_path):
+        session.pop("uploaded_filename", None)
+        return uploaded_basename, None
+    return uploaded_basename, full_path
+
+
+def submit_analysis(uploaded_basename, full_path):
+    """
+    Queue a background analysis job for an upload and remember it in the session.
+    Raises QueueFull when the job does not fit the memory budget or the session's share.
+    """
+    # The upload is in use again: keep it (and its derived files) past the original expiry
+    artifact_store.touch(uploaded_basename)
+    job_id = job_queue.submit(uploaded_basename, run_analysis, full_path, uploaded_basename,
+                              cost=estimate_job_memory(full_path), owner=session_owner())
+    session["job_id"] = job_id
+    app.logger.info("Queued analysis job %s for %s", job_id, uploaded_basename)
+    return job_id
+
+
+@app.route("/results")
+def results():
+    uploaded_basename, full_path = _session_upload_path()
+    if not uploaded_basename:
+        flash("No file available for analysis. Please upload a CSV first.")
+        return redirect(url_for("upload_file"))
+    if not full_path:
+        flash("Uploaded file missing on server. Please re-upload.")
+        return redirect(url_for("upload_file"))
+
+    # Reuse the session's job if it is for the same upload and has not failed
+    job = job_store.get(session.get("job_id"))
+    if job and job["upload"] == uploaded_basename and job["status"] != "failed":
+        job_id = job["id"]
+    else:
+        job_id = submit_analysis(uploaded_basename, full_path)
+    return redirect(url_for("job_results", job_id=job_id))
+
+
+@app.route("/results/<job_id>")
+def job_results(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        flash("Analysis job not found. Please analyze the file again.")
+        return redirect(url_for("upload_file"))
+    if status["status"] == "failed":
+        flash(status["error"] or "Analysis failed.")
+        return redirect(url_for("upload_file"))
+    if status["status"] != "done":
+        return render_template("processing.html", job=status)
+
+    context = job_store.load_result(job_id)
+    if context is None:
+        flash("Analysis output is no longer available. Please analyze the file again.")
+        return redirect(url_for("upload_file"))
+    show_trace = SHOW_TRACE or request.args.get("trace") == "1"
+    return render_template("results.html", job_id=job_id, show_trace=show_trace, **context)
+
+
+@app.route("/results/<job_id>/charts.json")
+def job_charts(job_id):
+    """Chart specs for a finished job, gzip-compressed when the client accepts it."""
+    context = job_store.load_result(job_id)
+    if context is None or context.get("chart_specs") is None:
+        return jsonify({"error": "No chart specs for this job."}), 404
+    body = json.dumps({"charts": context["chart_specs"]}, separators=(",", ":")).encode("utf-8")
+    response = app.response_class(body, mimetype="application/json")
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "private, max-age=3600"
+    return response
+
+
+@lru_cache(maxsize=256)
+def _job_explorer(job_id):
+    """Explorer file of a finished job (results never change once written); LookupError without one."""
+    context = job_store.load_result(job_id)
+    if not context or not context.get("explorer"):
+        # Raised rather than returned: lru_cache does not keep exceptions, so the next request looks again
+        raise LookupError(job_id)
+    # Named by the analysis cache key, like the entry that pins it
+    return os.path.join(EXPLORER_FOLDER, os.path.basename(context["explorer"]["path"]))
+
+
+@app.route("/results/<job_id>/rows")
+def job_rows(job_id):
+    """
+    One page of a finished job's analyzed rows, streamed as compact JSON:
+    ?columns=a,b&sort=col&order=desc&anomalies=1&segment=2&offset=0&limit=100
+    """
+    status = job_queue.status(job_id)
+    if status is None or status["status"] != "done":
+        return jsonify({"error": "No finished analysis for this job."}), 404
+    try:
+        path = _job_explorer(job_id)
+    except LookupError:
+        return jsonify({"error": "No row explorer for this job."}), 404
+    args = request.args
+    try:
+        page = open_explorer(path).page(
+            columns=[c for c in args.get("columns", "").split(",") if c],
+            offset=args.get("offset", 0, type=int),
+            limit=args.get("limit", 100, type=int),
+            sort=args.get("sort") or None,
+            descending=args.get("order") == "desc",
+            anomalies=args.get("anomalies") == "1",
+            segment=args.get("segment", type=int),
+        )
+    except FileNotFoundError:
+        return jsonify({"error": "Rows are no longer available. Please analyze the file again."}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = app.response_class((chunk.encode("utf-8") for chunk in iter_json(page)), mimetype="application/json")
+    response.headers["Cache-Control"] = "private, max-age=3600"
+    return response
+
+
+@app.route("/models")
+def list_models():
+    return jsonify({"models": [model_registry.describe(k) for k in model_registry.keys()]})
+
+
+@app.route("/models/<key>")
+def model_detail(key):
+    if key not in model_registry.keys():
+        return jsonify({"error": "Model not found."}), 404
+    return jsonify(model_registry.describe(key))
+
+
+@app.route("/models/<key>/refit", methods=["POST"])
+def refit_model(key):
+    """Fit a new version for this schema on the next analysis (queued now for the session's upload)."""
+    if key not in model_registry.keys():
+        return jsonify({"error": "Model not found."}), 404
+    model_registry.request_refit(key)
+    payload = {"schema_key": key, "refit_requested": True}
+    uploaded_basename, full_path = _session_upload_path()
+    if full_path:
+        job_id = submit_analysis(uploaded_basename, full_path)
+        payload.update(job_id=job_id, status_url=url_for("job_status", job_id=job_id))
+    return jsonify(payload), 202
+
+
+@app.route("/models/<key>/activate", methods=["POST"])
+def activate_model(key):
+    data = request.get_json(silent=True) or request.form
+    try:
+        model_registry.activate(key, int(data.get("version", "")))
+    except (TypeError, ValueError):
+        return jsonify({"error": "A numeric 'version' is required."}), 400
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    return jsonify(model_registry.describe(key))
+
+
+def _queue_batch(dataset_id):
+    """Save the request's CSV part and queue it as the dataset's next batch (202 JSON)."""
+    try:
+        file = request.files.get("file")
+        if file is None or file.filename == "" or not allowed_file(file.filename):
+            return jsonify({"error": "A CSV file part named 'file' is required."}), 400
+        path, _ = save_upload(file)
+    except UploadRejected as e:
+        return jsonify({"error": e.description}), e.code
+    track_upload(path)
+    created = not dataset_store.exists(dataset_id)
+    if created:
+        dataset_id = dataset_store.create(request.form.get("name") or os.path.splitext(stored_name(file.filename))[0])
+    basename = os.path.basename(path)
+    try:
+        job_id = job_queue.submit(basename, append_batch, dataset_id, path, basename,
+                                  cost=estimate_job_memory(path), owner=session_owner())
+    except QueueFull:
+        # The client resends the batch after Retry-After
+        for leftover in (path, meta_path(path)):
+            try:
+                os.remove(leftover)
+            except FileNotFoundError:
+                pass
+        if created:
+            # Otherwise every retry of a first batch would leave another empty dataset
+            dataset_store.delete(dataset_id)
+        raise
+    return jsonify({"dataset_id": dataset_id,
+                    "job_id": job_id,
+                    "status_url": url_for("job_status", job_id=job_id),
+                    "results_url": url_for("job_results", job_id=job_id)}), 202
+
+
+@app.route("/datasets", methods=["POST"])
+def create_dataset():
+    return _queue_batch(None)
+
+
+@app.route("/datasets/<dataset_id>")
+def dataset_detail(dataset_id):
+    if not dataset_store.exists(dataset_id):
+        return jsonify({"error": "Dataset not found."}), 404
+    return jsonify(dict(dataset_store.load(dataset_id).describe(), dataset_id=dataset_id,
+                        results_url=url_for("dataset_page", dataset_id=dataset_id)))
+
+
+@app.route("/datasets/<dataset_id>/batches", methods=["POST"])
+def append_dataset_batch(dataset_id):
+    if not dataset_store.exists(dataset_id):
+        return jsonify({"error": "Dataset not found."}), 404
+    return _queue_batch(dataset_id)
+
+
+@app.route("/datasets/<dataset_id>/results")
+def dataset_page(dataset_id):
+    """
+    Render the dataset's current state (charts are rebuilt from the stored aggregates). The
+    latest page job is reused while it is active or done and no batch has landed since.
+    """
+    if not dataset_store.exists(dataset_id):
+        flash("Dataset not found.")
+        return redirect(url_for("upload_file"))
+    job = job_store.latest(dataset_id)
+    if job and job["status"] != "failed" and job["created"] >= dataset_store.modified(dataset_id):
+        job_id = job["id"]
+    else:
+        job_id = job_queue.submit(dataset_id, dataset_results, dataset_id, cost=estimate_job_memory(),
+                                  owner=session_owner())
+    return redirect(url_for("job_results", job_id=job_id))
+
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    uploaded_basename, full_path = _session_upload_path()
+    if not full_path:
+        return jsonify({"error": "No uploaded file available for analysis."}), 400
+    job_id = submit_analysis(uploaded_basename, full_path)
+    return jsonify({"job_id": job_id,
+                    "status_url": url_for("job_status", job_id=job_id),
+                    "results_url": url_for("job_results", job_id=job_id)}), 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found."}), 404
+    if status["status"] == "done":
+        status["results_url"] = url_for("job_results", job_id=job_id)
+    return jsonify(status)
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage and request histograms from every process."""
+    return Response(metrics_store.render(), mimetype="text/plain; version=0.0.4")
+
+
+def start_background_work():
+    """
+    Start the preloading analysis pool (WARM_WORKERS) and the artifact sweeper. Call it once
+    per web process before it serves requests: gunicorn's post_fork hook (gunicorn.conf.py),
+    the ASGI lifespan startup or ``python app.py``. Forking from a request thread could copy
+    a lock (e.g. an SQLite transaction) another request thread holds into the workers.
+    """
+    if WARM_WORKERS:
+        # Likewise fork before the sweeper thread exists
+        job_queue.ensure_started()
+    artifact_sweeper.ensure_started()
+
+
+# Set once this process has reported its app import time and first request latency
+_startup_reported = threading.Event()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    # Web processes only (pool workers import the app but never serve a request); a no-op once
+    # start_background_work ran. Without it the pool forks on the first job instead.
+    artifact_sweeper.ensure_started()
+
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None and request.endpoint not in (None, "static"):
+        elapsed = time.perf_counter() - started
+        labels = {"endpoint": request.endpoint, "method": request.method, "status": str(response.status_code)}
+        observations = [("http_request_duration_seconds", labels, elapsed)]
+        if not _startup_reported.is_set():
+            _startup_reported.set()
+            observations += [("startup_import_seconds", {"module": "app", "process": "web"}, APP_IMPORT_SECONDS),
+                             ("startup_first_request_seconds", {"endpoint": request.endpoint}, elapsed)]
+        # Deferred imports this web process paid for (e.g. the dataset store's pandas)
+        observations += [("startup_import_seconds", {"module": name, "process": "web"}, seconds)
+                         for name, seconds in drain_import_times()]
+        try:
+            metrics_store.observe_many(observations)
+        except Exception:
+            app.logger.exception("Failed to record request metrics")
+    return response
+
+
+@app.errorhandler(QueueFull)
+def queue_full(e):
+    """503 when the server's analysis budget is used up, 429 for a session at its job limit."""
+    status = 429 if e.reason == "owner" else 503
+    headers = {"Retry-After": str(e.retry_after)}
+    if e.reason == "owner":
+        message = "You already have analyses running. Please wait for them to finish."
+    else:
+        message = "The server is busy with other analyses."
+    # Page routes are GETs; the POST routes are the JSON API
+    if request.method == "GET":
+        return render_template("busy.html", message=message, retry_after=e.retry_after), status, headers
+    return jsonify({"error": message, "retry_after": e.retry_after}), status, headers
 
 
 # Friendly error message for oversized payloads
@@ -583,5 +1452,8 @@ def too_large(e):
     return "File is too large! Please upload a file smaller than 500 MB.", 413
 
 
+APP_IMPORT_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
+    start_background_work()
     app.run(debug=False, threaded=True)  # debug=False for faster performance
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""Indexed store of per-upload files (CSV, sidecars, Parquet copy, plots) and their expiry.
+
+Every file the app writes for an upload is recorded in ``artifacts.db`` with
+the upload it belongs to, the session that owns it, its size and an expiry
+time. Expiry is handled by ``ArtifactSweeper``, a background thread that
+takes due rows from the ``expires`` index in time order, so its cost follows
+the number of expired files rather than the size of ``uploads/`` or
+``static/plots/``. Rows are claimed and deleted inside one write transaction
+before their files are unlinked, so concurrent web workers never race on
+the same file.
+
+Plots that the result cache still references are not deleted: the sweeper
+hands them over to the cache, which removes them when the entry is evicted.
+
+Each session's uploads share a storage quota; registering a new upload over
+the quota expires that session's oldest uploads (with all their derived
+files) first.
+"""
+import os
+import time
+import logging
+import threading
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 1800
+SWEEP_INTERVAL = 60
+SWEEP_BATCH = 500
+
+
+class ArtifactStore:
+    """SQLite index of artifact files keyed by absolute path."""
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with connect(self.db_path) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                    path TEXT PRIMARY KEY,
+                    upload TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    owner TEXT,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    expires REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_expires ON artifacts (expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_upload ON artifacts (upload)")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_owner ON artifacts (owner, created)")
+
+    def register(self, path, upload, kind, owner=None, ttl=None):
+        """
+        Record ``path`` as part of ``upload``. Without an ``owner`` the file is charged to the
+        upload's owner (plots written by a pool worker). Registering a path again refreshes
+        its size (and sets a missing owner) but keeps its expiry.
+        """
+        path = os.path.abspath(path)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        now = time.time()
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO artifacts (path, upload, kind, owner, size, created, expires) "
+                "VALUES (?, ?, ?, COALESCE(?, (SELECT owner FROM artifacts WHERE upload = ? LIMIT 1)), ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, owner = COALESCE(owner, excluded.owner)",
+                (path, upload, kind, owner, upload, size, now, now + (self.ttl if ttl is None else ttl)),
+            )
+
+    def register_many(self, paths, upload, kind, owner=None, ttl=None):
+        for path in paths:
+            self.register(path, upload, kind, owner=owner, ttl=ttl)
+
+    def touch(self, upload, ttl=None):
+        """Push back the expiry of every file of ``upload`` (it is in use again)."""
+        with connect(self.db_path) as conn:
+            conn.execute("UPDATE artifacts SET expires = MAX(expires, ?) WHERE upload = ?",
+                         (time.time() + (self.ttl if ttl is None else ttl), upload))
+
+    def enforce_quota(self, owner, max_bytes, keep=None):
+        """Expire ``owner``'s oldest uploads (never ``keep``) until its files fit in ``max_bytes``."""
+        if owner is None or max_bytes is None:
+            return []
+        with connect(self.db_path) as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE owner = ?",
+                                 (owner,)).fetchone()[0]
+            if total <= max_bytes:
+                return []
+            groups = conn.execute(
+                "SELECT upload, SUM(size), MIN(created) AS first FROM artifacts WHERE owner = ? AND upload != ? "
+                "GROUP BY upload ORDER BY first", (owner, keep or "")).fetchall()
+            expired = []
+            for upload, size, _ in groups:
+                if total <= max_bytes:
+                    break
+                expired.append(upload)
+                total -= size
+            # Due now: the sweeper (or the next sweep call) deletes them in expiry order
+            conn.executemany("UPDATE artifacts SET expires = 0 WHERE upload = ?", [(u,) for u in expired])
+        if expired:
+            logger.info("Session storage quota: expiring %d upload(s) of %s", len(expired), owner[:8])
+        return expired
+
+    def known(self, paths):
+        """The subset of ``paths`` (absolute) already in the index."""
+        paths = list(paths)
+        found = set()
+        with connect(self.db_path) as conn:
+            for start in range(0, len(paths), 500):
+                batch = paths[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(row[0] for row in conn.execute(f"SELECT path FROM artifacts WHERE path IN ({marks})",
+                                                            batch))
+        return found
+
+    def _claim(self, now, limit):
+        """Remove and return up to ``limit`` expired rows, oldest expiry first."""
+        with connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT path, kind FROM artifacts WHERE expires <= ? ORDER BY expires LIMIT ?",
+                                (now, limit)).fetchall()
+            conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path, _ in rows])
+        return rows
+
+    def sweep(self, is_pinned=None, now=None, limit=SWEEP_BATCH):
+        """
+        Delete expired files; ``is_pinned(paths)`` returns those still needed elsewhere, which
+        leave the index but stay on disk. Returns the number of files removed.
+        """
+        removed = 0
+        now = time.time() if now is None else now
+        while True:
+            rows = self._claim(now, limit)
+            if not rows:
+                return removed
+            pinned = is_pinned([path for path, _ in rows]) if is_pinned else set()
+            for path, kind in rows:
+                if path in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning("Error deleting expired %s %s: %s", kind, path, e)
+            if len(rows) < limit:
+                return removed
+
+    def adopt(self, folder, kind="untracked", ttl=None):
+        """
+        Index files in ``folder`` that are not tracked yet (left by an older version or a
+        crashed process), so they expire like everything else. One directory listing; run
+        once at startup, not per request.
+        """
+        if not os.path.isdir(folder):
+            return 0
+        modified = {os.path.abspath(entry.path): entry.stat().st_mtime for entry in os.scandir(folder)
+                    if entry.is_file() and not entry.name.startswith(".")}
+        untracked = set(modified) - self.known(modified)
+        now = time.time()
+        for path in untracked:
+            # Expire relative to the file's age, like the directory scan this replaces
+            life = (self.ttl if ttl is None else ttl) - (now - modified[path])
+            self.register(path, os.path.basename(path), kind, ttl=life)
+        return len(untracked)
+
+
+class ArtifactSweeper:
+    """
+    Daemon thread running ``store.sweep`` every ``interval`` seconds, then each of
+    ``extra_sweeps`` (other expiry callables, e.g. finished jobs); started on first use.
+    """
+
+    def __init__(self, store, interval=SWEEP_INTERVAL, is_pinned=None, adopt_folders=(), extra_sweeps=()):
+        self.store = store
+        self.interval = interval
+        self.is_pinned = is_pinned
+        self.adopt_folders = adopt_folders
+        self.extra_sweeps = extra_sweeps
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="artifact-sweeper", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        for folder in self.adopt_folders:
+            try:
+                adopted = self.store.adopt(folder)
+                if adopted:
+                    logger.info("Indexed %d untracked file(s) in %s", adopted, folder)
+            except Exception:
+                logger.exception("Failed to index untracked files in %s", folder)
+        while not self._stop.is_set():
+            try:
+                removed = self.store.sweep(self.is_pinned)
+                if removed:
+                    logger.info("Swept %d expired artifact(s)", removed)
+            except Exception:
+                logger.exception("Artifact sweep failed")
+            for sweep in self.extra_sweeps:
+                try:
+                    sweep()
+                except Exception:
+                    logger.exception("Sweep %r failed", sweep)
+            self._stop.wait(self.interval)
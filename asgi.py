@@ -0,0 +1,58 @@
+"""ASGI entry point: ``uvicorn asgi:application --host 0.0.0.0 --port $PORT``.
+
+The event loop accepts connections and buffers slow clients; the Flask app
+runs in two bounded thread pools so a burst of large uploads (which hold a
+thread while their body streams to disk) cannot starve page, status and
+metrics requests. The CPU-heavy pipeline never runs in either pool: routes
+only admit a job into the JobQueue process pool (see jobs.py) and return.
+"""
+import os
+import logging
+
+from a2wsgi import WSGIMiddleware
+
+from app import app, artifact_sweeper, job_queue, start_background_work
+
+logger = logging.getLogger(__name__)
+
+# Threads streaming request bodies: POST / and the dataset batch routes
+UPLOAD_THREADS = int(os.environ.get("ASGI_UPLOAD_THREADS", "4"))
+# Threads for everything else (pages, job status polling, charts, /metrics)
+PAGE_THREADS = int(os.environ.get("ASGI_PAGE_THREADS", "16"))
+
+
+def is_upload(scope):
+    return scope["method"] == "POST" and (scope["path"] == "/" or scope["path"].startswith("/datasets"))
+
+
+class RoutedPools:
+    """Dispatch HTTP requests to the upload or the page thread pool; handles lifespan itself."""
+
+    def __init__(self, wsgi_app, upload_threads=UPLOAD_THREADS, page_threads=PAGE_THREADS):
+        self.uploads = WSGIMiddleware(wsgi_app, workers=upload_threads)
+        self.pages = WSGIMiddleware(wsgi_app, workers=page_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http" and is_upload(scope):
+            await self.uploads(scope, receive, send)
+        else:
+            await self.pages(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Before any request thread exists: preload the analysis workers and start the sweeper
+                start_background_work()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                # Running analyses finish; their results stay in the job store
+                job_queue.shutdown(wait=False)
+                artifact_sweeper.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+application = RoutedPools(app)
@@ -0,0 +1,400 @@
+"""Reproducible benchmark of the analysis pipeline on synthetic fintech CSVs.
+
+Each scenario writes a seeded CSV (transaction ids, amounts, balances, fees,
+merchant / channel / country categories and timestamp columns, padded with extra
+numeric and categorical columns) with a chosen number of rows and columns, null
+ratio, category cardinality and datetime columns. The files are kept in
+``--data-dir`` and reused while the parameters are unchanged.
+
+For every scenario the stages run in-process on the app's own functions:
+
+* ``read``: the app's read path (typed Parquet copy when pyarrow is installed) with
+  the load-time dtype optimizer
+* ``convert_datetime``: ``convert_datetime_columns``
+* ``clean``: ``clean_frame`` (duplicates and nulls per ``CLEANING_POLICY``)
+* ``summary``: ``dataset_summary``
+* ``ml``: ``perform_fintech_analysis`` (always a fresh fit, with the engine ``auto`` picks)
+* ``plots``: ``generate_plots`` on the plot sample
+* ``results``: upload, ``/results`` and the finished page through the Flask test
+  client, with the result cache evicted and a fresh analysis worker each time
+* ``results_cached``: the same route served from the result cache
+
+Each stage reports latency percentiles, throughput in rows per second and peak
+memory. In-process stages measure peak memory with ``tracemalloc`` in one extra
+run, which covers Python and NumPy allocations but not Arrow buffers. The ``results`` stage reports the peak RSS growth of the analysis worker
+from its stage trace. The report is printed as JSON.
+
+Runs are compared against a stored baseline. A stage regresses when its median
+latency or its peak memory grows past the tolerances. Regressions make the run
+exit with status 1.
+
+    python benchmarks/bench_pipeline.py --suite quick --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --suite quick --baseline benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --rows 2000000 --cols 40 --null-ratio 0.1 --datetime-cols 2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+STAGES = ["read", "convert_datetime", "clean", "summary", "ml", "plots", "results", "results_cached"]
+ROUTE_STAGES = {"results", "results_cached"}
+GENERATE_CHUNK_ROWS = 200000
+
+# name: (rows, cols, null_ratio, cardinality, datetime_cols)
+SCENARIOS = {
+    "small": (10000, 8, 0.02, 20, 1),
+    "nulls": (100000, 12, 0.3, 50, 1),
+    "high_cardinality": (100000, 12, 0.01, 50000, 1),
+    "datetimes": (100000, 10, 0.02, 20, 4),
+    "wide": (10000, 1000, 0.05, 30, 2),
+    "large": (1000000, 20, 0.02, 200, 2),
+    "huge": (10000000, 5, 0.01, 100, 1),
+}
+SUITES = {
+    "quick": ["small", "nulls", "datetimes"],
+    "standard": ["small", "nulls", "high_cardinality", "datetimes", "wide", "large"],
+    "full": list(SCENARIOS),
+}
+
+
+def scenario_params(rows, cols, null_ratio, cardinality, datetime_cols):
+    return {"rows": rows, "cols": cols, "null_ratio": null_ratio, "cardinality": cardinality,
+            "datetime_cols": datetime_cols}
+
+
+# --- Synthetic data ---
+
+def column_layout(cols, datetime_cols):
+    """Ordered (name, kind) pairs: the core fintech columns first, then padding columns."""
+    core = [("transaction_id", "id"), ("amount", "amount"), ("balance", "balance"),
+            ("merchant", "category"), ("channel", "channel"), ("fee", "fee"), ("country", "country")]
+    layout = [(f"txn_time_{i}" if i else "txn_time", "datetime") for i in range(datetime_cols)]
+    layout = core[:max(1, cols - len(layout))] + layout
+    for i in range(cols - len(layout)):
+        kind = ("amount", "score", "category")[i % 3]
+        layout.append((f"{'transaction' if kind == 'amount' else kind}_{i}", kind))
+    return layout
+
+
+def make_chunk(layout, start, rows, null_ratio, cardinality, seed):
+    rng = np.random.default_rng([seed, start])
+    data = {}
+    for name, kind in layout:
+        if kind == "id":
+            data[name] = np.arange(start, start + rows)
+            continue
+        if kind in ("amount", "balance", "fee"):
+            scale = {"amount": (3.5, 1.2), "balance": (8.0, 1.0), "fee": (0.5, 0.8)}[kind]
+            values = rng.lognormal(*scale, rows).round(2)
+        elif kind == "score":
+            values = rng.normal(0, 1, rows).round(4)
+        elif kind == "datetime":
+            seconds = rng.integers(1577836800, 1735689600, rows)  # 2020-01-01 .. 2025-01-01
+            values = pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+        else:
+            size = {"channel": 4, "country": 30}.get(kind, cardinality)
+            # Zipf-like skew so top-k categories are meaningful
+            codes = (rng.zipf(1.3, rows) - 1) % size
+            values = np.char.add(f"{kind[:3]}_", codes.astype(str)).astype(object)
+        if null_ratio > 0:
+            values = values.astype(object) if values.dtype.kind in "iu" else values
+            values[rng.random(rows) < null_ratio] = np.nan if values.dtype.kind == "f" else None
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def generate_csv(path, rows, cols, null_ratio, cardinality, datetime_cols, seed=0):
+    """Write the scenario CSV chunk by chunk (bounded memory for the 10M-row cases)."""
+    layout = column_layout(cols, datetime_cols)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", newline="") as fh:
+        for start in range(0, rows, GENERATE_CHUNK_ROWS):
+            chunk = make_chunk(layout, start, min(GENERATE_CHUNK_ROWS, rows - start), null_ratio, cardinality, seed)
+            chunk.to_csv(fh, index=False, header=start == 0)
+    os.replace(tmp, path)
+
+
+def dataset_path(data_dir, params, seed):
+    name = "bench_{rows}r_{cols}c_{null_ratio}n_{cardinality}k_{datetime_cols}d".format(**params)
+    path = os.path.join(data_dir, f"{name}_s{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        start = time.perf_counter()
+        generate_csv(path, seed=seed, **params)
+        logging.getLogger(__name__).info("Generated %s in %.1fs", path, time.perf_counter() - start)
+    return path
+
+
+# --- Measurement ---
+
+def measure(fn, repeat, memory=True):
+    """Run ``fn`` ``repeat`` times; returns (seconds list, tracemalloc peak bytes or None, last result)."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return timings, peak, result
+
+
+def stage_report(timings, rows, peak_bytes):
+    seconds = np.asarray(timings)
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+    return {
+        "runs": len(seconds),
+        "p50_ms": round(p50 * 1000, 2),
+        "p90_ms": round(p90 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "min_ms": round(seconds.min() * 1000, 2),
+        "rows_per_second": round(rows / p50) if p50 > 0 else None,
+        "peak_mb": round(peak_bytes / (1024 * 1024), 2) if peak_bytes is not None else None,
+    }
+
+
+def run_pipeline_stages(app_module, path, repeat, memory):
+    """Time the pipeline functions in order, each on the previous stage's output."""
+    A = app_module
+    report = {}
+
+    def read():
+        if A.HAS_PYARROW:
+            df = A.read_columnar(A.ensure_columnar(path))
+            return A.optimize_dtypes(df, strings=A.STRING_DTYPE, floats=A.FLOAT_DOWNCAST)[0]
+        return A.read_csv_compact(path, strings=A.STRING_DTYPE, floats=A.FLOAT_DOWNCAST,
+                                  **A.pandas_read_kwargs(path))[0]
+
+    if A.HAS_PYARROW:
+        A.ensure_columnar(path)  # the one-off conversion happens at upload time in the app
+    timings, peak, raw = measure(read, repeat, memory)
+    report["read"] = stage_report(timings, len(raw), peak)
+
+    timings, peak, df = measure(lambda: A.convert_datetime_columns(raw)[0], repeat, memory)
+    report["convert_datetime"] = stage_report(timings, len(raw), peak)
+    del raw
+
+    timings, peak, clean = measure(lambda: A.clean_frame(df, A.CLEANING_POLICY)[0], repeat, memory)
+    report["clean"] = stage_report(timings, len(df), peak)
+    del df
+
+    timings, peak, _ = measure(lambda: A.dataset_summary(clean), repeat, memory)
+    report["summary"] = stage_report(timings, len(clean), peak)
+
+    sample_rows = A.ANALYSIS_PARAMS["sample_rows"]
+    sample = clean.sample(n=sample_rows, random_state=42) if len(clean) > sample_rows else clean
+    engine = A.ML_ENGINE
+    if engine == "auto":
+        engine = "scalable" if len(clean) > A.ML_FULL_MAX_ROWS else "full"
+    ml_frame = clean if engine == "scalable" else sample
+    timings, peak, ml_results = measure(lambda: A.perform_fintech_analysis(ml_frame, engine=engine),
+                                        repeat, memory)
+    report["ml"] = dict(stage_report(timings, len(ml_frame), peak), engine=engine)
+
+    timings, peak, _ = measure(lambda: A.generate_plots(sample, "bench", ml_results, output=A.PLOT_OUTPUT),
+                               repeat, memory)
+    report["plots"] = stage_report(timings, len(sample), peak)
+    return report
+
+
+def _request_analysis(A, client, path, poll_interval=0.05, timeout=3600):
+    """Upload ``path``, follow /results until the job finishes; returns (seconds, job context)."""
+    start = time.perf_counter()
+    with open(path, "rb") as fh:
+        response = client.post("/", data={"action": "upload", "file": (fh, os.path.basename(path))},
+                               content_type="multipart/form-data")
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload failed with HTTP {response.status_code}")
+    response = client.get("/results")
+    location = response.headers["Location"]
+    job_id = location.rstrip("/").rsplit("/", 1)[1]
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/jobs/{job_id}").get_json()
+        if status["status"] in ("done", "failed"):
+            break
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Analysis job {job_id} did not finish in {timeout}s")
+        time.sleep(poll_interval)
+    if status["status"] == "failed":
+        raise RuntimeError(f"Analysis job failed: {status['error']}")
+    page = client.get(location)
+    if page.status_code != 200:
+        raise RuntimeError(f"/results page returned HTTP {page.status_code}")
+    return time.perf_counter() - start, A.job_store.load_result(job_id)
+
+
+def run_route_stages(app_module, path, rows, repeat):
+    """Time the full upload -> /results -> page round trip, cold and from the result cache."""
+    A = app_module
+    if os.path.getsize(path) > A.app.config["MAX_CONTENT_LENGTH"]:
+        skipped = {"skipped": "file is larger than MAX_CONTENT_LENGTH"}
+        return {"results": skipped, "results_cached": skipped}
+
+    client = A.app.test_client()
+    # Warm-up: fits and registers the models, so the measured runs take the usual score path
+    _request_analysis(A, client, path)
+
+    timings, peaks = [], []
+    for _ in range(repeat):
+        A.result_cache.evict(A.analysis_cache_key(path))
+        # A fresh worker makes the peak RSS growth in the trace cover this analysis alone
+        A.job_queue.shutdown()
+        seconds, context = _request_analysis(A, client, path)
+        timings.append(seconds)
+        spans = [s for s in context.get("trace", []) if s["stage"] == "analysis"]
+        peaks.append(max((s["rss_delta_mb"] for s in spans), default=0.0))
+    cold = stage_report(timings, rows, None)
+    cold["peak_mb"] = max(peaks) if peaks else None
+
+    cached = [_request_analysis(A, client, path)[0] for _ in range(repeat)]
+    return {"results": cold, "results_cached": stage_report(cached, rows, None)}
+
+
+# --- Baseline comparison ---
+
+def compare(report, baseline, tolerance, memory_tolerance, min_delta_ms):
+    """List stages whose median latency or peak memory regressed past the tolerances."""
+    regressions = []
+    for name, scenario in report["scenarios"].items():
+        base_scenario = baseline.get("scenarios", {}).get(name)
+        if not base_scenario:
+            continue
+        if base_scenario["params"] != scenario["params"]:
+            logging.getLogger(__name__).warning("Scenario %s changed parameters; not compared", name)
+            continue
+        for stage_name, result in scenario["stages"].items():
+            base = base_scenario["stages"].get(stage_name)
+            if not base or "p50_ms" not in base or "p50_ms" not in result:
+                continue
+            # Small absolute differences on fast stages are noise, not regressions
+            delta = result["p50_ms"] - base["p50_ms"]
+            if delta > min_delta_ms and result["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+                regressions.append({"scenario": name, "stage": stage_name, "metric": "p50_ms",
+                                    "baseline": base["p50_ms"], "current": result["p50_ms"],
+                                    "change": round(result["p50_ms"] / base["p50_ms"] - 1, 3)})
+            if base.get("peak_mb") and result.get("peak_mb") is not None \
+                    and result["peak_mb"] - base["peak_mb"] > 1 \
+                    and result["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance):
+                regressions.append({"scenario": name, "stage": stage_name, "metric": "peak_mb",
+                                    "baseline": base["peak_mb"], "current": result["peak_mb"],
+                                    "change": round(result["peak_mb"] / base["peak_mb"] - 1, 3)})
+    return regressions
+
+
+def environment():
+    import sklearn
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "scikit-learn": sklearn.__version__}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Run only these scenarios (repeatable); overrides --suite")
+    parser.add_argument("--rows", type=int, help="Run one custom scenario with this many rows")
+    parser.add_argument("--cols", type=int, default=12)
+    parser.add_argument("--null-ratio", type=float, default=0.02)
+    parser.add_argument("--cardinality", type=int, default=50)
+    parser.add_argument("--datetime-cols", type=int, default=1)
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="Comma-separated subset of: " + ", ".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc peak-memory run")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "fintech-bench-data"))
+    parser.add_argument("--baseline", help="Compare against this baseline JSON and fail on regressions")
+    parser.add_argument("--save-baseline", help="Write this run's report to this path")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed median latency growth")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed peak memory growth")
+    parser.add_argument("--min-delta-ms", type=float, default=25.0,
+                        help="Latency increases below this are never regressions")
+    parser.add_argument("--output", help="Also write the JSON report to this path")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        sys.exit(f"Unknown stages: {', '.join(sorted(unknown))}")
+    if args.rows:
+        scenarios = {"custom": scenario_params(args.rows, args.cols, args.null_ratio, args.cardinality,
+                                               args.datetime_cols)}
+    else:
+        names = args.scenario or SUITES[args.suite]
+        scenarios = {name: scenario_params(*SCENARIOS[name]) for name in names}
+    data_dir = os.path.abspath(args.data_dir)
+    outputs = [os.path.abspath(p) for p in (args.output, args.save_baseline) if p]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+
+    # The app keeps uploads, jobs, cache, models and plots relative to the working
+    # directory; a scratch directory keeps the checkout clean and runs independent
+    cwd, workdir = os.getcwd(), tempfile.mkdtemp(prefix="fintech-bench-")
+    os.chdir(workdir)
+    import app as app_module
+    app_module.app.logger.setLevel(logging.WARNING)
+    # Time the pipeline, not the first import of the deferred analytical stack
+    app_module.warm()
+    concurrent.futures.wait(app_module.job_queue.ensure_started())
+
+    report = {"environment": environment(), "repeat": args.repeat, "scenarios": {}}
+    try:
+        for name, params in scenarios.items():
+            path = dataset_path(data_dir, params, args.seed)
+            scenario = {"params": params, "csv_mb": round(os.path.getsize(path) / (1024 * 1024), 2), "stages": {}}
+            if set(stages) - ROUTE_STAGES:
+                results = run_pipeline_stages(app_module, path, args.repeat, not args.no_memory)
+                scenario["stages"].update({k: v for k, v in results.items() if k in stages})
+            if set(stages) & ROUTE_STAGES:
+                results = run_route_stages(app_module, path, params["rows"], args.repeat)
+                scenario["stages"].update({k: v for k, v in results.items() if k in stages})
+            report["scenarios"][name] = scenario
+            print(f"{name}: " + ", ".join(f"{k} {v.get('p50_ms', '-')} ms" for k, v in scenario["stages"].items()),
+                  file=sys.stderr)
+    finally:
+        app_module.job_queue.shutdown(wait=False)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if baseline is not None:
+        report["baseline"] = os.path.abspath(args.baseline)
+        report["regressions"] = compare(report, baseline, args.tolerance, args.memory_tolerance, args.min_delta_ms)
+    text = json.dumps(report, indent=2)
+    print(text)
+    for path in outputs:
+        with open(path, "w") as fh:
+            fh.write(text + "\n")
+    if report.get("regressions"):
+        print(f"{len(report['regressions'])} regression(s) against {args.baseline}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark the fused column profiler against the old per-column summary loop.
+
+Builds a wide synthetic frame (float columns with gaps, ints, low-cardinality
+strings, categoricals, booleans), times the previous ``dataset_summary`` loop plus
+the separate explanation scans against ``profile_frame``, checks that both
+produce the same table and prints the timings as JSON.
+
+    python benchmarks/bench_summary.py --rows 20000 --cols 600
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from profiler import profile_frame  # noqa: E402
+
+
+def make_wide_frame(rows, cols, null_ratio=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 5
+        if kind in (0, 1):
+            values = rng.normal(1000, 250, rows).round(2)
+            values[rng.random(rows) < null_ratio] = np.nan
+            data[f"amount_{i}"] = values
+        elif kind == 2:
+            data[f"count_{i}"] = rng.integers(0, 500, rows)
+        elif kind == 3:
+            labels = np.array([f"merchant_{j}" for j in range(40)], dtype=object)
+            values = labels[rng.integers(0, len(labels), rows)]
+            values[rng.random(rows) < null_ratio] = None
+            data[f"merchant_{i}"] = values
+        else:
+            data[f"flag_{i}"] = rng.random(rows) < 0.1
+    df = pd.DataFrame(data)
+    df["channel"] = pd.Categorical(rng.choice(["web", "pos", "atm"], rows))
+    return df
+
+
+def legacy_summary(df):
+    """The per-column loop ``dataset_summary`` used before the fused profiler."""
+    rows = []
+    for col in df.columns:
+        dtype = str(df[col].dtype)
+        non_null = int(df[col].notna().sum())
+        unique = int(df[col].nunique(dropna=True))
+        sample = str(df[col].dropna().iloc[0]) if non_null > 0 else ""
+        info = {"column": col, "dtype": dtype, "non_null_count": non_null, "unique_values": unique, "sample_value": sample}
+        if pd.api.types.is_numeric_dtype(df[col]):
+            info["mean"] = float(df[col].mean(skipna=True)) if non_null else None
+            info["std"] = float(df[col].std(skipna=True)) if non_null else None
+        else:
+            info["mean"] = None
+            info["std"] = None
+        rows.append(info)
+    summary = pd.DataFrame(rows)
+    # The explanation then scanned the frame twice more
+    non_null_cells = df.notna().sum().sum()
+    memory_bytes = df.memory_usage(deep=True).sum()
+    return summary, non_null_cells, memory_bytes
+
+
+def fused_summary(df):
+    profile = profile_frame(df)
+    return profile.summary_frame(), profile.non_null_cells, profile.memory_bytes
+
+
+def best_of(fn, df, repeat):
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--cols", type=int, default=600)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_wide_frame(args.rows, args.cols)
+    legacy_s, (legacy, legacy_cells, legacy_mem) = best_of(legacy_summary, df, args.repeat)
+    fused_s, (fused, fused_cells, fused_mem) = best_of(fused_summary, df, args.repeat)
+
+    pd.testing.assert_frame_equal(legacy, fused, check_dtype=False, rtol=1e-9)
+    assert legacy_cells == fused_cells and legacy_mem == fused_mem
+
+    print(json.dumps({
+        "rows": args.rows,
+        "cols": df.shape[1],
+        "legacy_seconds": round(legacy_s, 4),
+        "fused_seconds": round(fused_s, 4),
+        "speedup": round(legacy_s / fused_s, 2) if fused_s else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
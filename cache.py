@@ -0,0 +1,164 @@
+"""Content-addressed cache of finished analyses.
+
+Entries are keyed by a streaming SHA-256 of the uploaded bytes plus the
+analysis parameters, so re-uploading the same export is a cache hit no matter
+what name ``unique_path()`` gave it. Each entry stores the pickled template
+context (summary table, ``ml_results``, explanation dict, plot paths) and pins
+the plot files it references so the artifact sweeper leaves them alone.
+The total size of all entries is bounded; least recently used entries are
+evicted first. Bulk files (row explorer Arrow files, which grow with the
+upload) are pinned the same way but count against their own limit, so one
+large upload cannot flush every other result; the entry just stored is never
+evicted for bulk bytes alone.
+"""
+import os
+import json
+import time
+import pickle
+import hashlib
+import logging
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, chunk_size=HASH_CHUNK_SIZE):
+    """SHA-256 of a file, read in fixed-size chunks so memory stays flat."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(content_hash, params):
+    """Combine a content hash with the analysis parameters into one cache key."""
+    blob = json.dumps(params, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(content_hash.encode("ascii") + b"\0" + blob).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of analysis results with an SQLite index."""
+
+    def __init__(self, folder, max_bytes=512 * 1024 * 1024, max_bulk_bytes=4096 * 1024 * 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_bulk_bytes = max_bulk_bytes
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = os.path.join(folder, "index.db")
+        with connect(self.db_path) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    bulk_size INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            # Indexes created before bulk files lack their size column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if "bulk_size" not in columns:
+                conn.execute("ALTER TABLE entries ADD COLUMN bulk_size INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    key TEXT NOT NULL,
+                    path TEXT NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS files_key ON files (key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_path ON files (path)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+
+    def _entry_path(self, key):
+        return os.path.join(self.folder, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached result for ``key`` (refreshing its LRU position) or None."""
+        try:
+            with open(self._entry_path(key), "rb") as fh:
+                result = pickle.load(fh)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.exception("Discarding unreadable cache entry %s", key)
+            self.evict(key)
+            return None
+
+        with connect(self.db_path) as conn:
+            paths = [row[0] for row in conn.execute("SELECT path FROM files WHERE key = ?", (key,))]
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        if not all(os.path.exists(p) for p in paths):
+            # A referenced plot vanished (e.g. deleted by hand); treat as a miss
+            self.evict(key)
+            return None
+        return result
+
+    def put(self, key, result, files=(), bulk_files=()):
+        """
+        Store ``result`` under ``key`` and pin ``files`` and ``bulk_files`` until the entry is
+        evicted; only ``bulk_files`` count against ``max_bulk_bytes`` instead of ``max_bytes``.
+        """
+        files = [os.path.abspath(p) for p in files if os.path.exists(p)]
+        bulk_files = [os.path.abspath(p) for p in bulk_files if os.path.exists(p)]
+        tmp = f"{self._entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._entry_path(key))
+
+        size = os.path.getsize(self._entry_path(key)) + sum(os.path.getsize(p) for p in files)
+        bulk_size = sum(os.path.getsize(p) for p in bulk_files)
+        now = time.time()
+        with connect(self.db_path) as conn:
+            conn.execute("DELETE FROM files WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, size, created, last_used, bulk_size) VALUES (?, ?, ?, ?, ?)",
+                (key, size, now, now, bulk_size),
+            )
+            conn.executemany("INSERT INTO files (key, path) VALUES (?, ?)", [(key, p) for p in files + bulk_files])
+        self._enforce_limit(keep=key)
+
+    def evict(self, key):
+        with connect(self.db_path) as conn:
+            paths = [row[0] for row in conn.execute("SELECT path FROM files WHERE key = ?", (key,))]
+            conn.execute("DELETE FROM files WHERE key = ?", (key,))
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        for path in paths + [self._entry_path(key)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Error deleting cached file %s: %s", path, e)
+
+    def _enforce_limit(self, keep=None):
+        with connect(self.db_path) as conn:
+            total, bulk = conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(bulk_size), 0) FROM entries").fetchone()
+            if total <= self.max_bytes and bulk <= self.max_bulk_bytes:
+                return
+            lru = conn.execute("SELECT key, size, bulk_size FROM entries ORDER BY last_used").fetchall()
+        for key, size, bulk_size in lru:
+            if total <= self.max_bytes and bulk <= self.max_bulk_bytes:
+                break
+            if total <= self.max_bytes and (key == keep or not bulk_size):
+                # Only the bulk files are over their limit
+                continue
+            self.evict(key)
+            total -= size
+            bulk -= bulk_size
+            logger.info("Evicted cache entry %s (%d bytes, %d bulk)", key, size, bulk_size)
+
+    def pinned(self, paths):
+        """The subset of ``paths`` (absolute) still referenced by a cache entry."""
+        paths = list(paths)
+        found = set()
+        with connect(self.db_path) as conn:
+            for start in range(0, len(paths), 500):
+                batch = paths[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(row[0] for row in conn.execute(f"SELECT path FROM files WHERE path IN ({marks})", batch))
+        return found
@@ -0,0 +1,284 @@
+"""Cleaning stage: hash-based duplicate removal, null-row counting and null policies.
+
+Rows are reduced to 64-bit hashes computed column block by column block:
+numeric blocks are mixed as 2-D arrays in NumPy, everything else goes through
+pandas' value hashing (categoricals hash their category values, so chunks with
+different categories still agree). Duplicates are then found with pandas'
+C hash table over the uint64 hashes, instead of hashing whole rows as Python
+tuples, and every hash match is checked against the real values so the counts
+are exact.
+
+``clean_frame`` applies a null policy in the same pass:
+
+* ``"drop"``: drop rows with any null (the previous behaviour)
+* ``"impute"``: fill numeric columns with the median and others with the most
+  frequent value
+* a dict mapping columns to ``"drop"``, ``"median"``, ``"mean"``, ``"mode"``,
+  ``"zero"`` or ``"keep"`` (unlisted columns are kept as they are)
+
+Removing duplicates and null rows is one boolean mask and one row selection.
+
+For files that only stream through memory, ``DuplicateCounter`` counts
+duplicate and null rows chunk by chunk. Its hashes stay in memory up to
+``max_memory_rows`` and are then spilled into hash-partitioned files. Each
+partition is counted separately, so memory stays bounded by one partition.
+"""
+import os
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from profiler import FRAME_BLOCK_BYTES
+
+logger = logging.getLogger(__name__)
+
+SPILL_PARTITIONS = 64
+MAX_MEMORY_ROWS = 20_000_000  # 160 MB of hashes
+NULL_POLICIES = ("drop", "impute")
+COLUMN_STRATEGIES = ("drop", "median", "mean", "mode", "zero", "keep")
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SEED = np.uint64(0x2545F4914F6CDD1D)
+
+
+def _splitmix64(x):
+    """Avalanche a uint64 array (splitmix64 finalizer); wraps around on overflow."""
+    x = x + _MIX
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _numeric_bits(block):
+    """uint64 views of a 2-D numeric block; ints and floats of equal value hash alike."""
+    values = np.asarray(block, dtype=np.float64) + 0.0  # -0.0 -> 0.0
+    values[np.isnan(values)] = np.nan  # one NaN bit pattern
+    return values.view(np.uint64)
+
+
+def row_hashes(df):
+    """One uint64 hash per row of ``df`` from its values (not the index)."""
+    with np.errstate(over="ignore"):
+        hashes = np.full(len(df), _SEED, dtype=np.uint64)
+        dtypes = list(df.dtypes)
+        numeric = [i for i, dtype in enumerate(dtypes)
+                   if isinstance(dtype, np.dtype) and dtype.kind in "iufb"]
+        per_block = max(1, FRAME_BLOCK_BYTES // max(8 * len(df), 1))
+        for start in range(0, len(numeric), per_block):
+            positions = numeric[start:start + per_block]
+            mixed = _splitmix64(_numeric_bits(df.iloc[:, positions].to_numpy(dtype=np.float64, na_value=np.nan)))
+            # Chaining makes the hash depend on column order
+            for j in range(mixed.shape[1]):
+                hashes = _splitmix64(hashes ^ mixed[:, j])
+        numeric_set = set(numeric)
+        for i, dtype in enumerate(dtypes):
+            if i in numeric_set:
+                continue
+            column = df.iloc[:, i]
+            hashes = _splitmix64(hashes ^ pd.util.hash_array(column.array, categorize=True))
+    return hashes
+
+
+def null_row_mask(df):
+    """Rows with at least one null, reduced over column blocks."""
+    mask = np.zeros(len(df), dtype=bool)
+    per_block = max(1, FRAME_BLOCK_BYTES // max(8 * len(df), 1))
+    for start in range(0, df.shape[1], per_block):
+        mask |= df.iloc[:, start:start + per_block].isna().to_numpy().any(axis=1)
+    return mask
+
+
+def _comparable(column):
+    """A NumPy array whose elements are equal exactly where the column's values are (nulls alike)."""
+    dtype = column.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iub":
+        return column.to_numpy()
+    if isinstance(dtype, np.dtype) and dtype.kind == "f":
+        return _numeric_bits(column.to_numpy())
+    if isinstance(dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return pd.factorize(column, use_na_sentinel=True)[0]
+
+
+def _same_rows(df, left, right):
+    """Row equality (nulls equal each other) between row positions ``left`` and ``right``."""
+    same = np.ones(len(left), dtype=bool)
+    for i in range(df.shape[1]):
+        values = _comparable(df.iloc[:, i])
+        same &= values[left] == values[right]
+    return same
+
+
+def duplicate_mask(df, hashes=None):
+    """
+    True for every row that repeats an earlier row (``DataFrame.duplicated()``), found
+    through the row hashes and confirmed against the values.
+    """
+    hashes = row_hashes(df) if hashes is None else hashes
+    codes, uniques = pd.factorize(hashes)
+    first = np.empty(len(uniques), dtype=np.int64)
+    positions = np.arange(len(codes), dtype=np.int64)
+    # Written back to front, so each slot ends up holding the first position
+    first[codes[::-1]] = positions[::-1]
+    candidates = np.flatnonzero(first[codes] != positions)
+    mask = np.zeros(len(df), dtype=bool)
+    if len(candidates):
+        confirmed = _same_rows(df, candidates, first[codes[candidates]])
+        mask[candidates[confirmed]] = True
+        if not confirmed.all():
+            # Hash collision: settle the affected hash groups row by row
+            collided = np.isin(codes, np.unique(codes[candidates[~confirmed]]))
+            rows = np.flatnonzero(collided)
+            mask[rows] = df.iloc[rows].duplicated().to_numpy()
+            logger.info("Resolved %d row hash collision(s) by value", int((~confirmed).sum()))
+    return mask
+
+
+def _fill_value(series, strategy):
+    if strategy == "zero":
+        return 0
+    if strategy in ("median", "mean") and pd.api.types.is_numeric_dtype(series.dtype) \
+            and not pd.api.types.is_bool_dtype(series.dtype):
+        value = series.median() if strategy == "median" else series.mean()
+        if pd.api.types.is_integer_dtype(series.dtype) and pd.notna(value):
+            # Nullable integer columns (Int64...) only take whole numbers
+            value = int(round(value))
+        return value
+    mode = series.mode(dropna=True)
+    return mode.iloc[0] if len(mode) else None
+
+
+def _strategies(df, policy):
+    if isinstance(policy, dict):
+        unknown = set(policy.values()) - set(COLUMN_STRATEGIES)
+        if unknown:
+            raise ValueError(f"Unknown cleaning strategy: {', '.join(sorted(map(str, unknown)))}")
+        return {col: policy.get(col, "keep") for col in df.columns}
+    if policy == "drop":
+        return {col: "drop" for col in df.columns}
+    if policy == "impute":
+        return {col: "median" if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+                else "mode" for col, dtype in df.dtypes.items()}
+    raise ValueError(f"Unknown cleaning policy: {policy!r} (expected one of {', '.join(NULL_POLICIES)} or a dict)")
+
+
+def clean_frame(df, policy="drop"):
+    """
+    Remove exact duplicate rows and handle nulls per ``policy`` (see the module docstring).
+    Returns (frame, report) with ``rows_in``, ``duplicate_rows`` (exact), ``null_rows`` (rows
+    with any null, before cleaning), ``dropped_null_rows``, ``imputed`` ({column: cells}) and
+    ``rows_out``. The input is returned as is when nothing changes.
+    """
+    strategies = _strategies(df, policy)
+    duplicates = duplicate_mask(df)
+    null_rows = null_row_mask(df)
+    drop_columns = [col for col, strategy in strategies.items() if strategy == "drop"]
+    if len(drop_columns) == df.shape[1]:
+        drop_nulls = null_rows
+    elif drop_columns:
+        drop_nulls = null_row_mask(df[drop_columns])
+    else:
+        drop_nulls = np.zeros(len(df), dtype=bool)
+
+    keep = ~(duplicates | drop_nulls)
+    out = df if keep.all() else df[keep]
+    imputed = {}
+    fills = {}
+    for col, strategy in strategies.items():
+        if strategy in ("drop", "keep"):
+            continue
+        missing = int(out[col].isna().sum())
+        if not missing:
+            continue
+        value = _fill_value(out[col], strategy)
+        if value is None:
+            continue
+        fills[col] = value
+        imputed[col] = missing
+    if fills:
+        out = out.fillna(fills)
+
+    report = {
+        "policy": policy if isinstance(policy, str) else "per-column",
+        "rows_in": len(df),
+        "duplicate_rows": int(duplicates.sum()),
+        "null_rows": int(null_rows.sum()),
+        "dropped_null_rows": int((drop_nulls & ~duplicates).sum()),
+        "imputed": imputed,
+        "rows_out": len(out),
+    }
+    return out, report
+
+
+class DuplicateCounter:
+    """
+    Exact-per-hash duplicate and null-row counts over a stream of chunks, with the
+    row hashes spilled to hash-partitioned files beyond ``max_memory_rows``.
+    """
+
+    def __init__(self, spill_dir=None, partitions=SPILL_PARTITIONS, max_memory_rows=MAX_MEMORY_ROWS):
+        self.spill_dir = spill_dir
+        self.partitions = partitions
+        self.max_memory_rows = max_memory_rows
+        self.rows = 0
+        self.null_rows = 0
+        self._hashes = []
+        self._buffered = 0
+        self._folder = None
+
+    def update(self, chunk):
+        hashes = row_hashes(chunk)
+        self.rows += len(chunk)
+        self.null_rows += int(null_row_mask(chunk).sum())
+        if self._folder is None and self._buffered + len(hashes) <= self.max_memory_rows:
+            self._hashes.append(hashes)
+            self._buffered += len(hashes)
+            return
+        if self._folder is None:
+            self._folder = tempfile.mkdtemp(prefix="dedupe-", dir=self.spill_dir)
+            logger.info("Spilling row hashes to %s after %d rows", self._folder, self._buffered)
+            for buffered in self._hashes:
+                self._spill(buffered)
+            self._hashes, self._buffered = [], 0
+        self._spill(hashes)
+
+    def _spill(self, hashes):
+        # Top bits pick the partition, so equal hashes always land in the same file
+        shift = np.uint64(64 - max(1, int(np.log2(self.partitions))))
+        partition = (hashes >> shift).astype(np.int64)
+        order = np.argsort(partition, kind="stable")
+        bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+        for p in range(self.partitions):
+            part = hashes[order[bounds[p]:bounds[p + 1]]]
+            if len(part):
+                with open(os.path.join(self._folder, f"{p}.u64"), "ab") as fh:
+                    part.tofile(fh)
+
+    def observe(self, chunks):
+        """Pass ``chunks`` through unchanged while counting them."""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def result(self):
+        """{"rows", "duplicate_rows", "null_rows"}; removes any spill files."""
+        try:
+            if self._folder is None:
+                hashes = np.concatenate(self._hashes) if self._hashes else np.empty(0, dtype=np.uint64)
+                distinct = len(pd.unique(hashes))
+            else:
+                distinct = 0
+                for name in os.listdir(self._folder):
+                    distinct += len(pd.unique(np.fromfile(os.path.join(self._folder, name), dtype=np.uint64)))
+        finally:
+            self.close()
+        return {"rows": self.rows, "duplicate_rows": self.rows - distinct, "null_rows": self.null_rows}
+
+    def close(self):
+        self._hashes = []
+        if self._folder is not None:
+            shutil.rmtree(self._folder, ignore_errors=True)
+            self._folder = None
@@ -0,0 +1,201 @@
+"""Correlation engine for wide numeric data.
+
+``correlate`` standardizes the numeric columns to float32 and gets the whole
+correlation matrix from matrix products (one ``Z.T @ Z`` BLAS call when the
+columns have no nulls), instead of ``DataFrame.corr()``'s pairwise loop:
+
+* Pearson on the values, or Spearman as Pearson on per-column average ranks
+  (``DataFrame.rank``, vectorized)
+* nulls use pairwise-complete statistics, like ``DataFrame.corr()``, from a
+  few extra products with the null masks
+* rows are accumulated in chunks and, beyond ``BLOCK_COLUMNS`` columns, the
+  matrix is built block by block, so memory stays bounded by one block pair
+  and the full p x p matrix is never kept
+
+The result is small and picklable, so the analysis context stores it once
+for both the summary page and the chart: the ``top_k`` strongest pairs, and a
+heatmap of at most ``HEATMAP_COLUMNS`` columns (those in the strongest pairs,
+then the most correlated ones), ordered by hierarchical clustering so related
+columns sit together. ``correlations_from_matrix`` gives the same result for
+a matrix that already exists (the streaming profiles' pairwise sums).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.spatial.distance import squareform
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("pearson", "spearman")
+TOP_PAIRS = 20
+HEATMAP_COLUMNS = 20
+BLOCK_COLUMNS = 1024
+CHUNK_ROWS = 65536
+
+
+def numeric_columns(df):
+    return [col for col, dtype in df.dtypes.items()
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+
+
+class _Standardized:
+    """Column-wise standardized float32 views of a frame, produced chunk by chunk."""
+
+    def __init__(self, df, columns, method):
+        if method == "spearman":
+            # float32 ranks are exact (to the half for ties) up to 8M rows
+            values = pd.DataFrame({col: df[col].rank(method="average").astype(np.float32) for col in columns},
+                                  index=df.index, columns=columns)
+        else:
+            values = df[columns]
+        self.values = values
+        self.means = values.mean().to_numpy(dtype=np.float64)
+        self.scales = values.std(ddof=0).to_numpy(dtype=np.float64)
+        self.has_nulls = values.isna().any().to_numpy()
+
+    def chunk(self, positions, start, stop):
+        """(Z, mask) for rows [start, stop) of the columns at ``positions``; Z is 0 where missing."""
+        block = self.values.iloc[start:stop, positions].to_numpy(dtype=np.float64, na_value=np.nan)
+        z = (block - self.means[positions]) / self.scales[positions]
+        mask = ~np.isnan(z)
+        return np.where(mask, z, 0.0).astype(np.float32), mask.astype(np.float32)
+
+
+def _block_correlation(data, left, right, n_rows, chunk_rows):
+    """Correlations between the columns at positions ``left`` and ``right`` (float64 array)."""
+    nulls = data.has_nulls[left].any() or data.has_nulls[right].any()
+    shape = (len(left), len(right))
+    sxy = np.zeros(shape)
+    if nulls:
+        n, sx, sy, sxx, syy = (np.zeros(shape) for _ in range(5))
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        zl, ml = data.chunk(left, start, stop)
+        zr, mr = (zl, ml) if right is left else data.chunk(right, start, stop)
+        sxy += zl.T @ zr
+        if nulls:
+            n += ml.T @ mr
+            sx += zl.T @ mr
+            sy += ml.T @ zr
+            sxx += (zl * zl).T @ mr
+            syy += ml.T @ (zr * zr)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if not nulls:
+            # Unit variance and zero mean over the same rows: the product is the correlation
+            return np.clip(sxy / n_rows, -1.0, 1.0)
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx ** 2) * (n * syy - sy ** 2)
+        corr = np.where((n > 1) & (var > 0), cov / np.sqrt(var), np.nan)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _top_pairs(candidates, columns, top_k):
+    values = np.array([c[2] for c in candidates]) if candidates else np.empty(0)
+    order = np.argsort(-np.abs(values), kind="stable")[:top_k]
+    return [{"a": columns[candidates[i][0]], "b": columns[candidates[i][1]], "r": float(values[i])}
+            for i in order]
+
+
+def _block_candidates(block, rows_at, cols_at, top_k, upper_only):
+    """Up to ``top_k`` strongest (i, j, r) entries of a block (above the diagonal), as column positions."""
+    strength = np.nan_to_num(np.abs(block), nan=-1.0)
+    if upper_only:
+        strength[np.tril_indices(block.shape[0], m=block.shape[1])] = -1.0
+    flat = strength.ravel()
+    k = min(top_k, flat.size)
+    if k == 0:
+        return []
+    best = np.argpartition(-flat, k - 1)[:k]
+    best = best[flat[best] >= 0]
+    rows, cols = np.unravel_index(best, block.shape)
+    return [(rows_at[i], cols_at[j], block[i, j]) for i, j in zip(rows, cols)]
+
+
+def _cluster_order(matrix):
+    """Leaf order of an average-linkage clustering on 1 - |r|."""
+    if len(matrix) < 3:
+        return np.arange(len(matrix))
+    distance = 1.0 - np.nan_to_num(np.abs(matrix), nan=0.0)
+    np.fill_diagonal(distance, 0.0)
+    distance = np.clip((distance + distance.T) / 2, 0.0, 1.0)
+    return leaves_list(linkage(squareform(distance, checks=False), method="average"))
+
+
+def _heatmap_columns(pairs, relevance, columns, limit):
+    chosen = []
+    for pair in pairs:
+        for col in (pair["a"], pair["b"]):
+            if col not in chosen and len(chosen) < limit:
+                chosen.append(col)
+    strength = np.nan_to_num(relevance, nan=-1.0)
+    for i in np.argsort(-strength, kind="stable"):
+        # Unusable (constant / all-null) columns come last
+        if len(chosen) >= limit or strength[i] < 0:
+            break
+        if columns[i] not in chosen:
+            chosen.append(columns[i])
+    return chosen
+
+
+def _result(method, columns, pairs, heatmap):
+    order = _cluster_order(heatmap.to_numpy())
+    heatmap = heatmap.iloc[order, order]
+    return {"method": method, "columns": len(columns), "pairs": pairs, "heatmap": heatmap,
+            "reduced": len(heatmap) < len(columns)}
+
+
+def correlations_from_matrix(matrix, method="pearson", top_k=TOP_PAIRS, heatmap_columns=HEATMAP_COLUMNS):
+    """``correlate``'s result for an existing correlation matrix (a square DataFrame)."""
+    columns = list(matrix.columns)
+    values = matrix.to_numpy(dtype=np.float64)
+    everything = np.arange(len(columns))
+    pairs = _top_pairs(_block_candidates(values, everything, everything, top_k, True), columns, top_k)
+    off_diagonal = np.where(np.eye(len(columns), dtype=bool), np.nan, np.abs(values))
+    with np.errstate(all="ignore"):
+        relevance = np.nanmax(off_diagonal, axis=1, initial=-1.0) if len(columns) else np.empty(0)
+    chosen = _heatmap_columns(pairs, relevance, columns, heatmap_columns)
+    return _result(method, columns, pairs, matrix.loc[chosen, chosen])
+
+
+def correlate(df, method="pearson", top_k=TOP_PAIRS, heatmap_columns=HEATMAP_COLUMNS, block_columns=BLOCK_COLUMNS,
+              chunk_rows=CHUNK_ROWS):
+    """
+    Correlations between the numeric columns of ``df`` (see the module docstring).
+    Returns {"method", "columns" (count), "pairs" ([{"a", "b", "r"}], strongest first),
+    "heatmap" (clustered DataFrame), "reduced" (heatmap has fewer columns than the data)},
+    or None with fewer than two usable (non-constant) columns.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown correlation method: {method!r} (expected one of {', '.join(METHODS)})")
+    columns = numeric_columns(df)
+    data = _Standardized(df, columns, method)
+    # Constant and all-null columns have no correlation with anything
+    usable = np.flatnonzero(np.isfinite(data.scales) & (data.scales > 0))
+    if len(usable) < 2:
+        return None
+
+    n_rows = len(df)
+    blocks = [usable[start:start + block_columns] for start in range(0, len(usable), block_columns)]
+    candidates = []
+    relevance = np.full(len(columns), np.nan)
+    for bi, left in enumerate(blocks):
+        for right in blocks[bi:]:
+            block = _block_correlation(data, left, right, n_rows, chunk_rows)
+            same = right is left
+            candidates += _block_candidates(block, left, right, top_k, upper_only=same)
+            strength = np.nan_to_num(np.abs(block), nan=-1.0)
+            if same:
+                np.fill_diagonal(strength, -1.0)
+            relevance[left] = np.fmax(relevance[left], strength.max(axis=1))
+            relevance[right] = np.fmax(relevance[right], strength.max(axis=0))
+        candidates = sorted(candidates, key=lambda c: -abs(c[2]))[:top_k]
+
+    pairs = _top_pairs(candidates, columns, top_k)
+    chosen = _heatmap_columns(pairs, relevance, columns, heatmap_columns)
+    positions = np.array([columns.index(col) for col in chosen])
+    heatmap = _block_correlation(data, positions, positions, n_rows, chunk_rows)
+    np.fill_diagonal(heatmap, 1.0)
+    logger.debug("Correlated %d columns (%s) in %d block(s)", len(usable), method, len(blocks) * (len(blocks) + 1) // 2)
+    return _result(method, [columns[i] for i in usable], pairs, pd.DataFrame(heatmap, index=chosen, columns=chosen))
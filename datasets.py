@@ -0,0 +1,199 @@
+"""Growing datasets: append CSV batches and update the analysis incrementally.
+
+A dataset keeps only mergeable partial aggregates, never the rows themselves:
+
+* a ``DatasetProfile`` (counts, moments, histograms, quantile / distinct / top-k
+  sketches and pairwise correlation sums) updated chunk by chunk
+* per-segment row counts and feature sums plus the running fraud count, from
+  scoring each new chunk with the dataset's registered models
+* a reservoir sample of scored rows (with their PCA coordinates) for the charts
+
+Appending a batch therefore costs time proportional to the batch, not to the
+history. State lives in ``<datasets folder>/<id>/state.pkl``; appends to one
+dataset are serialized with a file lock so concurrent jobs cannot lose updates.
+"""
+import os
+import re
+import time
+import uuid
+import fcntl
+import pickle
+import shutil
+import logging
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from profiler import DatasetProfile, Reservoir
+
+logger = logging.getLogger(__name__)
+
+DATASET_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+PCA_COLUMNS = ["PCA_1", "PCA_2"]
+
+
+def valid_dataset_id(dataset_id):
+    return bool(dataset_id) and DATASET_ID_RE.match(dataset_id) is not None
+
+
+class DatasetState:
+    """Mergeable aggregates of every batch appended to one dataset."""
+
+    def __init__(self, name, sample_size=100000, seed=42):
+        self.name = name
+        self.created = time.time()
+        self.profile = DatasetProfile(sample_size=0, seed=seed, track_correlation=True)
+        self.sample = Reservoir(sample_size, seed=seed)
+        self.columns = None
+        self.numeric = None
+        self.date_formats = None
+        self.batches = []
+        self.features = None
+        self.segment_counts = pd.Series(dtype=np.int64)
+        self.segment_sums = None
+        self.segment_non_null = None
+        self.fraud_count = 0
+        self.scored_rows = 0
+        self.model = None
+
+    @property
+    def rows(self):
+        return self.profile.rows
+
+    def align(self, chunk, date_formats=None):
+        """
+        Fix the column layout and the text date formats (``{column: format}`` from
+        ``convert_datetime_columns``) on the first chunk; later chunks must have the same columns.
+        """
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.date_formats = dict(date_formats or {})
+            self.numeric = [c for c, dtype in chunk.dtypes.items()
+                            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+        missing = [c for c in self.columns if c not in chunk.columns]
+        extra = [c for c in chunk.columns if c not in self.columns]
+        if missing or extra:
+            raise ValueError(f"Batch columns do not match the dataset (missing: {missing or 'none'}, "
+                             f"unexpected: {extra or 'none'})")
+        chunk = chunk[self.columns].copy()
+        # One numeric dtype for every batch keeps the model schema key stable
+        for col in self.numeric:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype(np.float64)
+        return chunk
+
+    def add_scores(self, chunk, ml_results, features):
+        """Fold one scored chunk into the segment / fraud aggregates and the chart sample."""
+        self.features = features
+        if ml_results.get("model"):
+            self.model = ml_results["model"]
+        if ml_results.get("pca_data") is not None:
+            chunk[PCA_COLUMNS] = np.asarray(ml_results["pca_data"])[:, :2]
+        if "Segment" in chunk:
+            grouped = chunk.groupby("Segment")[features]
+            self.segment_counts = self.segment_counts.add(chunk["Segment"].value_counts(), fill_value=0)
+            sums, non_null = grouped.sum(), grouped.count()
+            if self.segment_sums is None:
+                self.segment_sums, self.segment_non_null = sums, non_null
+            else:
+                self.segment_sums = self.segment_sums.add(sums, fill_value=0)
+                self.segment_non_null = self.segment_non_null.add(non_null, fill_value=0)
+        if "Is_Anomaly" in chunk:
+            self.fraud_count += int(chunk["Is_Anomaly"].sum())
+        self.scored_rows += len(chunk)
+        self.sample.update(chunk)
+
+    def ml_results(self):
+        """``perform_fintech_analysis``-shaped results: aggregates over all rows, labels for the sample."""
+        sample = self.sample.rows
+        results = {"segments": None, "anomalies": None, "pca_data": None, "segment_profiles": None,
+                   "fraud_count": self.fraud_count, "model": self.model}
+        if sample is None:
+            return results
+        if "Segment" in sample:
+            results["segments"] = sample["Segment"].to_numpy()
+            profiles = (self.segment_sums / self.segment_non_null).reset_index()
+            results["segment_profiles"] = profiles.to_dict(orient="records")
+        if "Is_Anomaly" in sample:
+            results["anomalies"] = sample["Is_Anomaly"].to_numpy(dtype=bool)
+        if all(c in sample for c in PCA_COLUMNS):
+            results["pca_data"] = sample[PCA_COLUMNS].to_numpy()
+        return results
+
+    def chart_frame(self):
+        """The scored sample without helper columns, for tables and charts."""
+        if self.sample.rows is None:
+            return pd.DataFrame(columns=self.columns or [])
+        return self.sample.rows.drop(columns=[c for c in PCA_COLUMNS if c in self.sample.rows])
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "created": self.created,
+            "rows": self.rows,
+            "columns": self.columns,
+            "batches": self.batches,
+            "fraud_count": self.fraud_count,
+            "model": self.model,
+        }
+
+
+class DatasetStore:
+    """Datasets on disk, one folder each with a pickled DatasetState."""
+
+    def __init__(self, folder, sample_size=100000):
+        self.folder = folder
+        self.sample_size = sample_size
+        os.makedirs(folder, exist_ok=True)
+
+    def _dir(self, dataset_id):
+        if not valid_dataset_id(dataset_id):
+            raise KeyError(f"Unknown dataset: {dataset_id!r}")
+        return os.path.join(self.folder, dataset_id)
+
+    def _state_path(self, dataset_id):
+        return os.path.join(self._dir(dataset_id), "state.pkl")
+
+    def create(self, name):
+        dataset_id = uuid.uuid4().hex
+        os.makedirs(self._dir(dataset_id))
+        self._save(dataset_id, DatasetState(name, sample_size=self.sample_size))
+        return dataset_id
+
+    def delete(self, dataset_id):
+        shutil.rmtree(self._dir(dataset_id), ignore_errors=True)
+
+    def exists(self, dataset_id):
+        return valid_dataset_id(dataset_id) and os.path.exists(self._state_path(dataset_id))
+
+    def modified(self, dataset_id):
+        """When the dataset last changed (its state is replaced on every save)."""
+        return os.path.getmtime(self._state_path(dataset_id))
+
+    def load(self, dataset_id):
+        try:
+            with open(self._state_path(dataset_id), "rb") as fh:
+                return pickle.load(fh)
+        except FileNotFoundError:
+            raise KeyError(f"Unknown dataset: {dataset_id!r}") from None
+
+    def _save(self, dataset_id, state):
+        path = self._state_path(dataset_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @contextmanager
+    def updating(self, dataset_id):
+        """Load the state under an exclusive lock and save it if the block succeeds."""
+        if not self.exists(dataset_id):
+            raise KeyError(f"Unknown dataset: {dataset_id!r}")
+        with open(os.path.join(self._dir(dataset_id), "lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = self.load(dataset_id)
+                yield state
+                self._save(dataset_id, state)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,180 @@
+"""Datetime detection and calendar feature expansion.
+
+Columns that are already datetime64 (the typed Parquet path) are used as they
+are. Text columns (object / string, or categorical with text categories) are
+checked on a small sample spread over the column:
+
+1. values must look like dates (length, digits, not plain numbers), then
+2. each format in ``DATE_FORMATS`` is tried on the sample and the best match
+   above ``MATCH_RATIO`` is used to parse the whole column in one vectorized
+   ``pd.to_datetime(format=...)`` call.
+
+A column that fails the full parse is left untouched, so IDs and free text
+are never turned into dates. Only the distinct values of a text column are
+parsed (dates repeat heavily), and features are gathered back by row code.
+
+Each datetime column is replaced by compact calendar columns (int16 year,
+int8 month / day / weekday / hour; float32 when some values are missing). The
+new columns are added in a single concat rather than column by column.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 200
+MATCH_RATIO = 0.95
+DEFAULT_PARTS = ("year", "month", "day")
+PART_DTYPES = {"year": np.int16, "month": np.int8, "day": np.int8, "weekday": np.int8, "hour": np.int8}
+
+# Tried in order; on equal sample match the earlier format wins
+DATE_FORMATS = (
+    "ISO8601",
+    "%m/%d/%Y", "%d/%m/%Y",
+    "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%y", "%d/%m/%y",
+    "%d.%m.%Y", "%d.%m.%Y %H:%M", "%d-%m-%Y",
+    "%Y/%m/%d", "%Y/%m/%d %H:%M:%S",
+    "%d %b %Y", "%d-%b-%Y", "%b %d, %Y", "%d %B %Y", "%B %d, %Y",
+)
+
+
+def _is_text(dtype):
+    return pd.api.types.is_string_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype)
+
+
+def _sample(series, size):
+    """Up to ``size`` non-null values taken evenly across the column (or its categories), as strings."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if not _is_text(series.dtype.categories.dtype):
+            return None
+        values = pd.Series(series.dtype.categories)
+    elif _is_text(series.dtype):
+        values = series
+    else:
+        return None
+    n = len(values)
+    if n == 0:
+        return None
+    positions = np.unique(np.linspace(0, n - 1, min(n, size * 4)).astype(np.int64))
+    sample = values.iloc[positions].dropna()
+    sample = sample.iloc[:size].astype(str)
+    return sample if len(sample) else None
+
+
+def _distinct(series):
+    """(distinct values, codes): dates repeat a lot, so only the distinct values get parsed."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return pd.Series(series.dtype.categories), series.cat.codes.to_numpy()
+    codes, uniques = pd.factorize(series)
+    return pd.Series(uniques), codes
+
+
+def _looks_like_dates(sample):
+    text = sample.str.strip()
+    plausible = (text.str.len().between(6, 35)
+                 & text.str.contains(r"\d", regex=True)
+                 & ~text.str.fullmatch(r"[+-]?\d+(?:[.,]\d+)?(?:[eE][+-]?\d+)?"))
+    return plausible.mean() >= MATCH_RATIO
+
+
+def _parse(values, fmt):
+    try:
+        return pd.to_datetime(values, format=fmt, errors="coerce")
+    except ValueError:
+        # Mixed UTC offsets cannot share one timezone-aware dtype
+        return pd.to_datetime(values, format=fmt, errors="coerce", utc=True)
+
+
+def _match_ratio(parsed, values, codes=None):
+    """Share of the non-null values that parsed (per row when ``codes`` maps rows to values)."""
+    ok = parsed.notna().to_numpy()
+    if codes is not None:
+        present = codes[codes >= 0]
+        return ok[present].mean() if len(present) else 0.0
+    present = int(values.notna().sum())
+    return ok.sum() / present if present else 0.0
+
+
+def parse_datetime_column(series, sample_size=SAMPLE_SIZE, formats=DATE_FORMATS):
+    """
+    Parse a text column whose values are dates in one consistent format.
+    Returns (parsed, format, codes) or None: ``parsed`` holds the datetimes of the column's
+    distinct values (or categories) and ``codes`` maps each row to one of them (-1 for null).
+    """
+    sample = _sample(series, sample_size)
+    if sample is None or not _looks_like_dates(sample):
+        return None
+
+    ranked = []
+    for order, fmt in enumerate(formats):
+        ratio = _match_ratio(_parse(sample, fmt), sample)
+        if ratio >= MATCH_RATIO:
+            ranked.append((-ratio, order, fmt))
+    if not ranked:
+        return None
+    values, codes = _distinct(series)
+    for _, _, fmt in sorted(ranked):
+        parsed = _parse(values, fmt)
+        if _match_ratio(parsed, values, codes) >= MATCH_RATIO:
+            return parsed, fmt, codes
+    return None
+
+
+def _calendar_parts(parsed, parts, codes=None):
+    """Compact calendar columns of datetime values, gathered through ``codes`` for categoricals."""
+    index = pd.DatetimeIndex(parsed)
+    columns = {}
+    for part in parts:
+        values = getattr(index, "dayofweek" if part == "weekday" else part)
+        values = np.asarray(values, dtype=np.float64)
+        if codes is not None:
+            values = np.append(values, np.nan)[codes]  # code -1 (missing) picks the NaN
+        missing = np.isnan(values)
+        columns[part] = values.astype(np.float32) if missing.any() else values.astype(PART_DTYPES[part])
+    return columns
+
+
+def expand_datetime_features(df, parts=DEFAULT_PARTS, sample_size=SAMPLE_SIZE, formats=None):
+    """
+    Replace every datetime column (native or detected text) by ``<col>_<part>`` calendar
+    columns. Returns (frame, {column: format}); format is None for native datetime columns.
+    The input frame is returned unchanged when nothing is converted.
+
+    ``formats`` is the mapping returned for an earlier part of the same data: only those
+    columns are converted, each with its recorded format, so a later chunk whose days are
+    all <= 12 cannot flip to the other day order. A recorded column that no longer parses
+    raises instead of being left as text.
+    """
+    features, converted = {}, {}
+    for col, dtype in df.dtypes.items():
+        if formats is not None and col not in formats:
+            continue
+        try:
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                parsed, fmt, codes = df[col], None, None
+            else:
+                recorded = formats.get(col) if formats is not None else None
+                match = parse_datetime_column(df[col], sample_size=sample_size,
+                                              formats=(recorded,) if recorded else DATE_FORMATS)
+                if match is None:
+                    if formats is not None:
+                        raise ValueError(f"Column '{col}' no longer parses as dates ({recorded or 'any known format'})")
+                    continue
+                parsed, fmt, codes = match
+            columns = _calendar_parts(parsed, parts, codes)
+        except Exception as e:
+            if formats is not None:
+                raise
+            logger.warning("Failed to convert datetime column '%s': %s", col, e)
+            continue
+        features.update((f"{col}_{part}", values) for part, values in columns.items())
+        converted[col] = fmt
+    if not converted:
+        return df, converted
+    # One concat for all new columns instead of an insert and a drop per column
+    expanded = pd.concat([df.drop(columns=list(converted)), pd.DataFrame(features, index=df.index)], axis=1)
+    return expanded, converted
@@ -0,0 +1,26 @@
+"""Connections to the SQLite indexes (jobs, result cache, artifacts, metrics).
+
+Web workers, their request threads and the analysis pool processes all open
+the same database files, so every access goes through ``connect``: WAL mode
+(readers never block the writer), a generous busy timeout, and a connection
+that is always closed. A connection left open across a fork gives the pool
+process a copy of SQLite's lock state and it sees "database is locked".
+"""
+import sqlite3
+from contextlib import contextmanager
+
+BUSY_TIMEOUT = 30
+
+
+@contextmanager
+def connect(path, row_factory=None):
+    """A connection to ``path`` inside one transaction (committed on success), closed afterwards."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
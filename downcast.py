@@ -0,0 +1,185 @@
+"""Load-time dtype optimizer.
+
+``optimize_dtypes`` shrinks a freshly loaded frame column by column:
+
+* text columns with at most ``CATEGORY_MAX_RATIO`` distinct values become
+  ``category`` (built from one factorize, no second hashing pass); the rest
+  can optionally become Arrow-backed strings
+* integers are narrowed to the smallest signed width that holds them
+* floats become float32 when every value survives the round trip unchanged
+  (or always, with ``floats="float32"``)
+
+Kinds never change (float stays float, int stays int), so model registry
+schema keys are stable across files of the same layout.
+
+``read_csv_compact`` applies the same rules chunk by chunk while reading a CSV,
+so peak memory is the optimized frame plus one raw chunk instead of the whole
+file at default dtypes. ``default_dtype_bytes`` estimates that default-dtype
+size for frames that never existed at default dtypes (the Parquet path).
+"""
+import sys
+import logging
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+# Strings with at most this share of distinct values become categoricals (as in ingest.py)
+CATEGORY_MAX_RATIO = 0.5
+READ_CHUNK_ROWS = 250000
+
+_INT_TYPES = (np.int8, np.int16, np.int32)
+
+
+def _is_text(dtype):
+    return pd.api.types.is_string_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype)
+
+
+def _narrow_int(values):
+    if not len(values):
+        return values
+    low, high = values.min(), values.max()
+    for candidate in _INT_TYPES:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return values.astype(candidate)
+    return values
+
+
+def _narrow_float(values, floats):
+    if values.dtype == np.float32 or not len(values):
+        return values
+    with np.errstate(over="ignore", invalid="ignore"):
+        narrow = values.astype(np.float32)
+    if floats == "float32":
+        # Only refuse values float32 cannot hold at all
+        return narrow if np.array_equal(np.isfinite(narrow), np.isfinite(values)) else values
+    same = (narrow == values) | np.isnan(values)
+    return narrow if same.all() else values
+
+
+def optimize_column(series, category_max_ratio=CATEGORY_MAX_RATIO, strings=None, floats="lossless"):
+    """Return ``series`` in its most compact safe dtype (the same object when nothing applies)."""
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "iu" and dtype.itemsize > 1:
+        narrowed = _narrow_int(series.to_numpy())
+    elif isinstance(dtype, np.dtype) and dtype.kind == "f":
+        narrowed = _narrow_float(series.to_numpy(), floats)
+    elif _is_text(dtype):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        if len(series) and len(uniques) <= category_max_ratio * len(series):
+            return pd.Series(pd.Categorical.from_codes(codes, uniques), index=series.index, name=series.name)
+        if strings == "pyarrow" and not (isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow"):
+            try:
+                return series.astype(pd.StringDtype("pyarrow"))
+            except (ImportError, TypeError, ValueError) as e:
+                logger.debug("Kept %s as %s: %s", series.name, dtype, e)
+        return series
+    else:
+        return series
+    if narrowed.dtype == dtype:
+        return series
+    return pd.Series(narrowed, index=series.index, name=series.name)
+
+
+def optimize_dtypes(df, category_max_ratio=CATEGORY_MAX_RATIO, strings=None, floats="lossless"):
+    """
+    Shrink every column of ``df`` (see the module docstring).
+    Returns (frame, {"before_bytes", "after_bytes", "columns"}), ``columns`` being the number
+    of columns whose dtype changed. Columns are swapped one at a time into a shallow copy,
+    so the extra memory needed is one column, not a second frame.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    out, changed = df, 0
+    for col in df.columns:
+        series = df[col]
+        optimized = optimize_column(series, category_max_ratio, strings, floats)
+        if optimized is series:
+            continue
+        if out is df:
+            out = df.copy(deep=False)
+        out[col] = optimized
+        changed += 1
+    after = int(out.memory_usage(deep=True).sum()) if changed else before
+    return out, {"before_bytes": before, "after_bytes": after, "columns": changed}
+
+
+def _text_value_bytes(values):
+    """Per-value bytes of text held the way ``pd.read_csv`` stores it by default."""
+    if pd.Series([""]).dtype == object:
+        # Pointer plus the Python str object
+        return np.fromiter((sys.getsizeof(v) for v in values), dtype=np.int64, count=len(values)) + 8
+    # Arrow-backed default string dtype: UTF-8 bytes plus the offset
+    return pd.Series(values, dtype=object).map(lambda v: len(str(v).encode("utf-8"))).to_numpy(np.int64) + 4
+
+
+def default_dtype_bytes(df):
+    """
+    Estimated memory of ``df`` at ``pd.read_csv``'s default dtypes: 64-bit numbers and one
+    text value per row. Categoricals are costed from their category sizes and counts.
+    """
+    total = 0
+    for col, dtype in df.dtypes.items():
+        series = df[col]
+        if isinstance(dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            counts = np.bincount(codes[codes >= 0], minlength=len(dtype.categories))
+            total += int(counts @ _text_value_bytes(dtype.categories)) + 8 * int((codes < 0).sum())
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iuf":
+            total += 8 * len(series)
+        else:
+            total += int(series.memory_usage(deep=True, index=False))
+    return total
+
+
+def _merge_categoricals(parts, category_max_ratio, rows):
+    """One categorical from per-chunk ones, or None when there would be too many categories."""
+    try:
+        merged = union_categoricals([p.array for p in parts])
+    except TypeError:
+        # Chunks inferred different category types (e.g. an all-null chunk)
+        return None
+    return merged if len(merged.categories) <= category_max_ratio * rows else None
+
+
+def _combine(chunks, category_max_ratio, strings, floats):
+    """Concatenate optimized chunks, unifying per-chunk categories and integer / float widths."""
+    rows = sum(len(c) for c in chunks)
+    columns = {}
+    for col in chunks[0].columns:
+        parts = [c[col] for c in chunks]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            merged = _merge_categoricals(parts, category_max_ratio, rows)
+            if merged is not None:
+                columns[col] = merged
+                continue
+        parts = [p.astype(object) if isinstance(p.dtype, pd.CategoricalDtype) else p for p in parts]
+        merged = pd.concat(parts, ignore_index=True)
+        columns[col] = optimize_column(merged, category_max_ratio, strings, floats).array
+    return pd.DataFrame(columns, columns=chunks[0].columns)
+
+
+def read_csv_compact(path, chunksize=READ_CHUNK_ROWS, category_max_ratio=CATEGORY_MAX_RATIO, strings=None,
+                     floats="lossless", **read_kwargs):
+    """
+    ``pd.read_csv`` that optimizes each chunk as it arrives; returns (frame, report) like
+    ``optimize_dtypes``, where ``before_bytes`` is the size at pandas' default dtypes
+    (summed over the raw chunks).
+    """
+    chunks, before, defaults = [], 0, None
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False, **read_kwargs):
+        defaults = defaults if defaults is not None else chunk.dtypes
+        # A chunk already above the cardinality limit cannot be below it for the whole file
+        chunk, report = optimize_dtypes(chunk, category_max_ratio=category_max_ratio, floats=floats)
+        before += report["before_bytes"]
+        chunks.append(chunk)
+    if not chunks:
+        df = pd.read_csv(path, **read_kwargs)
+        return df, {"before_bytes": 0, "after_bytes": 0, "columns": 0}
+    df = _combine(chunks, category_max_ratio, strings, floats)
+    del chunks
+    after = int(df.memory_usage(deep=True).sum())
+    changed = sum(str(dtype) != str(defaults.get(col)) for col, dtype in df.dtypes.items())
+    return df, {"before_bytes": before, "after_bytes": after, "columns": changed}
@@ -0,0 +1,247 @@
+"""Paginated, server-side row explorer over an analyzed upload.
+
+``build_explorer`` writes the cleaned rows, with the ML ``Segment`` and
+``Is_Anomaly`` labels, to one uncompressed Arrow IPC file. Opening it is a
+memory map with no parsing or copying, and a page of rows only touches the
+parts of the file it reads. Ascending sort indexes (row positions, nulls last)
+for the ML features and labels are precomputed at build time and stored in the
+same file as extra columns. Other columns are indexed on first use and kept in
+memory.
+
+A request selects a view (one sort + filter combination) and a page of it.
+Views come from the sort index and the filter's row positions:
+
+* a small filtered subset (anomalies) sorts only its own rows
+* a large one keeps the sort index entries that pass the filter
+
+Views are kept in a small LRU, so paging through one costs only the ``take``
+of the requested rows. ``iter_json`` streams a page as compact JSON, with rows
+as arrays and NaN / inf as null.
+
+pyarrow is optional: without it ``HAS_PYARROW`` is False and the app keeps
+showing the static preview.
+"""
+import os
+import json
+import math
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - depends on the deployment
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+META_KEY = b"explorer"
+INDEX_PREFIX = "__sort_"
+DEFAULT_PAGE_ROWS = 100
+MAX_PAGE_ROWS = 1000
+# Rows per json.dumps call while streaming a page
+JSON_BATCH_ROWS = 200
+# Views (and lazily built sort indexes) kept per open explorer
+VIEW_CACHE = 16
+OPEN_EXPLORERS = 8
+# A filtered subset smaller than 1/SUBSET_SORT_RATIO of the rows is sorted on its own
+SUBSET_SORT_RATIO = 16
+
+
+def _sort_index(column):
+    """Ascending row positions of ``column``, nulls last, as a NumPy int array."""
+    if pa.types.is_dictionary(column.type):
+        # Categoricals sort by the rank of their value: integer keys, no string decoding
+        codes = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+        order = pc.array_sort_indices(codes.dictionary).to_numpy()
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        column = pc.take(pa.array(rank), codes.indices)
+    index = pc.array_sort_indices(column, order="ascending", null_placement="at_end")
+    dtype = np.int32 if len(column) < 2 ** 31 else np.int64
+    return index.to_numpy().astype(dtype, copy=False)
+
+
+def _mapped(column):
+    # A single chunk converts without a copy: the array stays backed by the memory map
+    return column.chunk(0).to_numpy() if column.num_chunks == 1 else column.to_numpy()
+
+
+def _ordered(index, nulls, descending):
+    if not descending:
+        return index
+    # Reverse the valid positions only: nulls stay last either way
+    valid = len(index) - nulls
+    return np.concatenate([index[:valid][::-1], index[valid:]])
+
+
+def build_explorer(df, path, index_columns=(), sample=False):
+    """
+    Write ``df`` as an explorer file at ``path`` with sort indexes for ``index_columns``.
+    ``sample`` marks a frame that is a sample of the upload (streaming fallback).
+    Returns {"path", "rows", "columns", "indexed", "sample", "bytes"}.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    columns = table.column_names
+    indexes = {}
+    for col in index_columns:
+        if col in columns and col not in indexes:
+            indexes[col] = f"{INDEX_PREFIX}{len(indexes)}"
+            table = table.append_column(indexes[col], pa.array(_sort_index(table.column(col))))
+    meta = {"columns": columns, "indexes": indexes, "sample": bool(sample)}
+    table = table.replace_schema_metadata({META_KEY: json.dumps(meta)})
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    size = os.path.getsize(path)
+    logger.info("Wrote explorer %s (%d rows, %d sort indexes, %.1f MB)", path, table.num_rows, len(indexes),
+                size / (1024 * 1024))
+    return {"path": path, "rows": table.num_rows, "columns": columns, "indexed": list(indexes),
+            "sample": bool(sample), "bytes": size}
+
+
+class Page:
+    """One page of a view: ``rows`` (an Arrow table) starting at ``offset`` of ``total`` matching rows."""
+
+    def __init__(self, rows, total, offset, limit, sample):
+        self.rows = rows
+        self.total = total
+        self.offset = offset
+        self.limit = limit
+        self.sample = sample
+
+
+def _json_values(column):
+    values = column.to_pylist()
+    if pa.types.is_floating(column.type):
+        return [v if v is None or math.isfinite(v) else None for v in values]
+    return values
+
+
+def iter_json(page):
+    """Stream ``page`` as {"total", "offset", "limit", "sample", "columns", "rows": [[...], ...]}."""
+    head = {"total": page.total, "offset": page.offset, "limit": page.limit, "sample": page.sample,
+            "columns": page.rows.column_names}
+    yield json.dumps(head, separators=(",", ":"))[:-1] + ',"rows":['
+    for start in range(0, page.rows.num_rows, JSON_BATCH_ROWS):
+        batch = page.rows.slice(start, JSON_BATCH_ROWS)
+        rows = zip(*(_json_values(col) for col in batch.columns))
+        body = ",".join(json.dumps(row, separators=(",", ":"), default=str) for row in rows)
+        yield ("," if start else "") + body
+    yield "]}"
+
+
+class Explorer:
+    """A memory-mapped explorer file; safe to share between request threads."""
+
+    def __init__(self, path):
+        self.path = path
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        meta = json.loads(table.schema.metadata[META_KEY])
+        self.columns = meta["columns"]
+        self.sample = meta["sample"]
+        self.rows = table.num_rows
+        self.table = table.select(self.columns)
+        self._stored = {col: _mapped(table.column(field)) for col, field in meta["indexes"].items()}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key, build):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = build()
+        with self._lock:
+            self._cache[key] = value
+            while len(self._cache) > VIEW_CACHE:
+                self._cache.popitem(last=False)
+        return value
+
+    def _column(self, name):
+        if name not in self.columns:
+            raise ValueError(f"Unknown column: {name!r}")
+        return self.table.column(name)
+
+    def sort_index(self, name):
+        """Ascending positions for column ``name``: precomputed, or built once on first use."""
+        column = self._column(name)
+        if name in self._stored:
+            return self._stored[name]
+        return self._cached(("index", name), lambda: _sort_index(column))
+
+    def _filter(self, anomalies, segment):
+        """Sorted row positions passing the filters, or None for every row."""
+        mask = None
+        if anomalies:
+            if "Is_Anomaly" not in self.columns:
+                raise ValueError("This analysis has no anomaly labels")
+            mask = pc.fill_null(self.table.column("Is_Anomaly"), False)
+        if segment is not None:
+            if "Segment" not in self.columns:
+                raise ValueError("This analysis has no segments")
+            match = pc.fill_null(pc.equal(self.table.column("Segment"), segment), False)
+            mask = match if mask is None else pc.and_(mask, match)
+        if mask is None:
+            return None
+        return np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+
+    def view(self, sort=None, descending=False, anomalies=False, segment=None):
+        """Row positions of a view in display order, or None for every row in file order."""
+        if sort is not None:
+            self._column(sort)
+        return self._cached(("view", sort, bool(descending), bool(anomalies), segment),
+                            lambda: self._build_view(sort, descending, anomalies, segment))
+
+    def _build_view(self, sort, descending, anomalies, segment):
+        subset = self._filter(anomalies, segment)
+        if sort is None:
+            return subset
+        column = self.table.column(sort)
+        if subset is None:
+            return _ordered(self.sort_index(sort), column.null_count, descending)
+        if len(subset) * SUBSET_SORT_RATIO < self.rows and sort not in self._stored:
+            # Few rows pass: sorting them beats building a full index
+            values = column.take(subset)
+            return subset[_ordered(_sort_index(values), values.null_count, descending)]
+        index = _ordered(self.sort_index(sort), column.null_count, descending)
+        keep = np.zeros(self.rows, dtype=bool)
+        keep[subset] = True
+        return index[keep[index]]
+
+    def page(self, columns=None, offset=0, limit=DEFAULT_PAGE_ROWS, sort=None, descending=False, anomalies=False,
+             segment=None):
+        """
+        One page of the view. ``columns`` projects (default: all); raises ValueError for unknown
+        columns or filters this analysis has no labels for.
+        """
+        columns = list(columns) if columns else self.columns
+        for name in columns:
+            self._column(name)
+        limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+        offset = max(0, int(offset))
+        order = self.view(sort, descending, anomalies, segment)
+        data = self.table.select(columns)
+        if order is None:
+            total, rows = self.rows, data.slice(offset, limit)
+        else:
+            total, rows = len(order), data.take(order[offset:offset + limit])
+        return Page(rows, total, offset, limit, self.sample)
+
+
+@lru_cache(maxsize=OPEN_EXPLORERS)
+def _open(path, mtime_ns):
+    return Explorer(path)
+
+
+def open_explorer(path):
+    """The (shared, cached) Explorer for ``path``; raises FileNotFoundError when it is gone."""
+    return _open(path, os.stat(path).st_mtime_ns)
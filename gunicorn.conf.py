@@ -0,0 +1,7 @@
+"""gunicorn settings, read from the working directory (see the Procfile)."""
+
+
+def post_fork(server, worker):
+    # Start the analysis pool and the sweeper while the web worker has no request threads yet
+    from app import start_background_work
+    start_background_work()
@@ -0,0 +1,285 @@
+"""Columnar ingestion: convert an uploaded CSV to Parquet once and reuse it.
+
+The CSV is streamed block by block through Arrow's multithreaded reader into a
+Parquet writer, so ingest memory follows the block size rather than the file.
+While it streams, per-column statistics are kept. Low cardinality strings are
+then dictionary-encoded (pandas ``category``) and null-free integers narrowed
+to the smallest width that holds them, in a second, compressing pass over the
+uncompressed first Parquet file. The result is written next to the upload as
+``<name>.parquet``. Later reads are memory-mapped and can project just the
+columns they need.
+
+Arrow infers types from the first block. A later value that does not fit
+(text in a numeric column) widens that column (null -> int64 -> double ->
+string) and the file is read again. Non-text column types are cached per CSV
+header, so a later upload with the same layout skips inference for them.
+Text and all-null types are never cached: they would force every later file
+with that header to read the column as text.
+
+pyarrow is optional: without it ``HAS_PYARROW`` is False and callers keep
+reading the CSV with pandas.
+"""
+import os
+import re
+import json
+import fcntl
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from upload import columnar_lock_path, columnar_path, csv_format
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover - depends on the deployment
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_DIR = ".schemas"
+# Strings with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+# ... and at most this many: distinct values are tracked while streaming, so this bounds that set
+CATEGORY_MAX_DISTINCT = 65536
+# Bytes of CSV parsed per block, and of Arrow data per Parquet row group (the units of ingest memory)
+BLOCK_SIZE = 4 * 1024 * 1024
+ROW_GROUP_BYTES = 64 * 1024 * 1024
+
+_INT_TYPES = [np.int8, np.int16, np.int32]
+_FAILED_COLUMN = re.compile(r"In CSV column #(\d+)")
+
+
+def _header_signature(csv_path):
+    with open(csv_path, "rb") as fh:
+        header = fh.readline().strip()
+    return hashlib.sha256(header).hexdigest()[:32]
+
+
+def _schema_cache_path(csv_path):
+    folder = os.path.join(os.path.dirname(csv_path), SCHEMA_DIR)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, _header_signature(csv_path) + ".json")
+
+
+def _load_cached_types(csv_path):
+    try:
+        with open(_schema_cache_path(csv_path)) as fh:
+            return {name: pa.type_for_alias(t) for name, t in json.load(fh).items()}
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _cacheable(t):
+    # A forced text or null type always "parses", hiding numbers in later files; the rest fail loudly
+    return not (pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_null(t))
+
+
+def _store_cached_types(csv_path, schema):
+    # Only plain types are cached; narrowing is re-derived from each file's values
+    types = {f.name: str(f.type) for f in schema if _cacheable(f.type)}
+    tmp = f"{_schema_cache_path(csv_path)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(types, fh)
+    os.replace(tmp, _schema_cache_path(csv_path))
+
+
+def _widened(t):
+    """The next type to try for a column whose values did not fit ``t``."""
+    if pa.types.is_null(t):
+        return pa.int64()
+    if pa.types.is_integer(t):
+        return pa.float64()
+    return pa.string()
+
+
+class _ColumnStats:
+    """What narrowing needs to know about one column, merged batch by batch."""
+
+    def __init__(self, type_):
+        self.integer = pa.types.is_integer(type_)
+        text = pa.types.is_string(type_) or pa.types.is_large_string(type_)
+        self.distinct = set() if text else None
+        self.nulls = 0
+        self.min = self.max = None
+
+    def update(self, column):
+        self.nulls += column.null_count
+        if self.distinct is not None:
+            self.distinct.update(v for v in pc.unique(column).to_pylist() if v is not None)
+            if len(self.distinct) > CATEGORY_MAX_DISTINCT:
+                self.distinct = None
+        elif self.integer and len(column) > column.null_count:
+            bounds = pc.min_max(column).as_py()
+            self.min = bounds["min"] if self.min is None else min(self.min, bounds["min"])
+            self.max = bounds["max"] if self.max is None else max(self.max, bounds["max"])
+
+    def narrowed(self, rows):
+        """How to store the column: "dictionary", a narrower integer type, or None (as read)."""
+        if not rows:
+            return None
+        if self.distinct is not None and len(self.distinct) <= CATEGORY_MAX_RATIO * rows:
+            return "dictionary"
+        if self.integer and self.nulls == 0:
+            for candidate in _INT_TYPES:
+                info = np.iinfo(candidate)
+                if info.min <= self.min and self.max <= info.max:
+                    return pa.from_numpy_dtype(candidate)
+        return None
+
+
+def _csv_options(csv_path):
+    """Arrow read / parse options for the delimiter and header sniffed at upload time."""
+    meta = csv_format(csv_path) or {}
+    read = pa_csv.ReadOptions(column_names=None if meta.get("header", True) else meta["columns"],
+                              block_size=BLOCK_SIZE)
+    return read, pa_csv.ParseOptions(delimiter=meta.get("delimiter", ","))
+
+
+def _open_csv(csv_path, column_types):
+    read_options, parse_options = _csv_options(csv_path)
+    return pa_csv.open_csv(csv_path, read_options=read_options, parse_options=parse_options,
+                           convert_options=pa_csv.ConvertOptions(column_types=column_types))
+
+
+def _stream_csv(reader, out):
+    """Write the batches of CSV ``reader`` to a Parquet file at ``out``; returns (rows, {column: _ColumnStats})."""
+    stats = {f.name: _ColumnStats(f.type) for f in reader.schema}
+    rows = 0
+    # Uncompressed: this file is only read back once, by _narrow
+    with pq.ParquetWriter(out, reader.schema, compression="none") as writer:
+        for batch in reader:
+            for name, column in zip(batch.schema.names, batch.columns):
+                stats[name].update(column)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows, stats
+
+
+def _row_group(tables, schema):
+    # One dictionary per column: each source row group read back carries its own
+    return pa.concat_tables(tables).unify_dictionaries().combine_chunks().cast(schema)
+
+
+def _narrow(src, out, plan):
+    """
+    Rewrite Parquet ``src`` to ``out`` in ROW_GROUP_BYTES row groups, compressed and with
+    ``plan`` {column: "dictionary" or narrower type} applied.
+    """
+    dictionary = [name for name, how in plan.items() if how == "dictionary"]
+    source = pq.ParquetFile(src, read_dictionary=dictionary)
+    fields = [pa.field(f.name, plan[f.name]) if isinstance(plan.get(f.name), pa.DataType) else f
+              for f in source.schema_arrow]
+    schema = pa.schema(fields)
+    with pq.ParquetWriter(out, schema) as writer:
+        pending, size = [], 0
+        # The source row groups are one CSV block each: regroup them, or compression suffers
+        for i in range(source.num_row_groups):
+            # One at a time: iter_batches reads ahead across row groups
+            group = source.read_row_group(i)
+            pending.append(group)
+            size += group.nbytes
+            if size >= ROW_GROUP_BYTES:
+                writer.write_table(_row_group(pending, schema))
+                pending, size = [], 0
+        if pending:
+            writer.write_table(_row_group(pending, schema))
+
+
+def convert_to_columnar(csv_path):
+    """Parse ``csv_path`` once and write a typed Parquet file next to it; return its path."""
+    out = columnar_path(csv_path)
+    raw = f"{out}.{os.getpid()}.raw.tmp"
+    cached = _load_cached_types(csv_path)
+    column_types = dict(cached or {})
+    try:
+        while True:
+            try:
+                reader = _open_csv(csv_path, column_types)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                if not column_types:
+                    raise
+                # A cached type does not fit this file's first block: infer it from scratch
+                logger.info("Cached schema did not fit %s (%s); re-inferring types", csv_path, e)
+                column_types = {}
+                continue
+            try:
+                rows, stats = _stream_csv(reader, raw)
+                break
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                failed = _FAILED_COLUMN.search(str(e))
+                if failed is None:
+                    raise
+                # Types come from the first block; a later value that does not fit widens the column
+                field = reader.schema.field(int(failed.group(1)))
+                if pa.types.is_string(field.type):
+                    raise
+                column_types[field.name] = _widened(field.type)
+                logger.info("Column %s of %s does not fit %s; reading it as %s", field.name, csv_path, field.type,
+                            column_types[field.name])
+        schema = reader.schema
+        if {f.name: f.type for f in schema if _cacheable(f.type)} != cached:
+            _store_cached_types(csv_path, schema)
+
+        plan = {}
+        for name, column_stats in stats.items():
+            how = column_stats.narrowed(rows)
+            if how is not None:
+                plan[name] = how
+        tmp = f"{out}.{os.getpid()}.tmp"
+        _narrow(raw, tmp, plan)
+        os.replace(tmp, out)
+    finally:
+        if os.path.exists(raw):
+            os.remove(raw)
+    logger.info("Converted %s to %s (%d rows, %d columns, %d narrowed)", csv_path, out, rows, len(schema),
+                len(plan))
+    return out
+
+
+def _is_current(out, csv_path):
+    return os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(csv_path)
+
+
+def ensure_columnar(csv_path):
+    """
+    Return the Parquet path for ``csv_path``, converting it first if needed. Conversions of
+    one upload hold a file lock, so an analysis that starts while the upload's background
+    ingest is running waits for that Parquet file instead of converting the CSV again.
+    """
+    out = columnar_path(csv_path)
+    if _is_current(out, csv_path):
+        return out
+    with open(columnar_lock_path(csv_path), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if _is_current(out, csv_path):
+                return out
+            return convert_to_columnar(csv_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_columnar(path, columns=None):
+    """Read a Parquet file (memory-mapped), optionally only the given ``columns``."""
+    return pd.read_parquet(path, columns=columns, engine="pyarrow", memory_map=True)
+
+
+def iter_columnar(path, batch_size=100000):
+    """Yield DataFrames of ``batch_size`` rows from a Parquet file without loading it whole."""
+    for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def ingest_upload(csv_path, progress=None):
+    """Background post-upload stage: build the columnar copy of a fresh upload."""
+    if progress:
+        progress("read")
+    if not HAS_PYARROW:
+        return None
+    return ensure_columnar(csv_path)
@@ -0,0 +1,308 @@
+"""Background analysis jobs backed by a local SQLite index and a process pool.
+
+Jobs are recorded in ``<jobs folder>/jobs.db`` so every web worker (and every
+pool process) sees the same status. Finished results are pickled next to the
+index as ``<job_id>.pkl``. No external broker is needed. ``JobStore.expire``
+deletes finished jobs and their results once they are old enough.
+
+Admission control: each job carries an estimated memory ``cost``. With a
+``memory_budget`` the queue only admits a job while the queued and running
+jobs plus the new one fit in the budget (a job alone on an idle queue is
+always admitted), and ``max_per_owner`` caps the active jobs of one client.
+The check and the insert share one write transaction, so concurrent web
+workers cannot both take the last slot. Rejected submissions raise
+``QueueFull`` with a Retry-After estimate from recent job durations.
+"""
+import os
+import re
+import time
+import uuid
+import pickle
+import sqlite3
+import logging
+import statistics
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages reported through the status endpoint, in execution order.
+STAGES = ["read", "clean", "summarize", "ml", "plots"]
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Queued / running jobs not updated for this long (e.g. their worker died with the web
+# process) no longer hold part of the memory budget
+ACTIVE_JOB_TTL = 3600
+DEFAULT_RETRY_AFTER = 10
+# Bounds of the Retry-After estimate (quick ingest jobs would otherwise invite polling storms)
+MIN_RETRY_AFTER = 5
+MAX_RETRY_AFTER = 300
+# Jobs deleted per expiry transaction
+EXPIRE_BATCH = 500
+
+
+class QueueFull(Exception):
+    """A job was not admitted; ``reason`` is "budget" (server busy) or "owner" (client limit)."""
+
+    def __init__(self, retry_after, reason="budget"):
+        super().__init__(f"Job not admitted ({reason}); retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def valid_job_id(job_id):
+    return bool(job_id) and JOB_ID_RE.match(job_id) is not None
+
+
+class JobStore:
+    """SQLite-backed job index shared by web workers and pool processes."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = os.path.join(folder, "jobs.db")
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    upload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    cost INTEGER NOT NULL DEFAULT 0,
+                    owner TEXT
+                )"""
+            )
+            # Indexes created before admission control lack the cost / owner columns
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, decl in (("cost", "INTEGER NOT NULL DEFAULT 0"), ("owner", "TEXT")):
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_upload ON jobs (upload, created)")
+
+    def create(self, upload, cost=0, owner=None, budget=None, max_per_owner=None):
+        """
+        Insert a queued job and return its id. With a ``budget`` (bytes) or ``max_per_owner``
+        the job is only inserted if it fits next to the active jobs; raises QueueFull otherwise.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            if budget is not None or max_per_owner is not None:
+                # Take the write lock before reading, so the check and the insert are atomic
+                conn.execute("BEGIN IMMEDIATE")
+                self._admit(conn, now, cost, owner, budget, max_per_owner)
+            conn.execute(
+                "INSERT INTO jobs (id, upload, status, created, updated, cost, owner) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, upload, now, now, int(cost), owner),
+            )
+        return job_id
+
+    def _admit(self, conn, now, cost, owner, budget, max_per_owner):
+        active = "status IN ('queued', 'running') AND updated > ?"
+        since = now - ACTIVE_JOB_TTL
+        if max_per_owner is not None and owner is not None:
+            (owned,) = conn.execute(f"SELECT COUNT(*) FROM jobs WHERE {active} AND owner = ?",
+                                    (since, owner)).fetchone()
+            if owned >= max_per_owner:
+                raise QueueFull(self._retry_after(conn), reason="owner")
+        if budget is not None:
+            count, reserved = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM jobs WHERE {active}",
+                                           (since,)).fetchone()
+            if count and reserved + cost > budget:
+                raise QueueFull(self._retry_after(conn), reason="budget")
+
+    def _retry_after(self, conn):
+        """Seconds until a slot is likely to free up: the median duration of recent jobs."""
+        rows = conn.execute("SELECT updated - created FROM jobs WHERE status = 'done' "
+                            "ORDER BY updated DESC LIMIT 20").fetchall()
+        if not rows:
+            return DEFAULT_RETRY_AFTER
+        return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, round(statistics.median(r[0] for r in rows)))))
+
+    def update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        if not valid_job_id(job_id):
+            return None
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest(self, upload):
+        """The most recently created job for ``upload`` (as from ``get``), or None."""
+        with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE upload = ? ORDER BY created DESC LIMIT 1",
+                               (upload,)).fetchone()
+        return dict(row) if row else None
+
+    def result_path(self, job_id):
+        return os.path.join(self.folder, f"{job_id}.pkl")
+
+    def save_result(self, job_id, result):
+        tmp = self.result_path(job_id) + ".tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.result_path(job_id))
+
+    def load_result(self, job_id):
+        if not valid_job_id(job_id):
+            return None
+        try:
+            with open(self.result_path(job_id), "rb") as fh:
+                return pickle.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def expire(self, ttl, now=None, limit=EXPIRE_BATCH):
+        """
+        Delete jobs finished or failed more than ``ttl`` seconds ago, and abandoned ones (no
+        update for ACTIVE_JOB_TTL + ``ttl``), with their results. Returns the number removed.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        while True:
+            with connect(self.db_path, row_factory=sqlite3.Row) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                ids = [row["id"] for row in conn.execute(
+                    "SELECT id FROM jobs WHERE updated <= ? AND (status IN ('done', 'failed') OR updated <= ?) "
+                    "LIMIT ?", (now - ttl, now - ACTIVE_JOB_TTL - ttl, limit))]
+                conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in ids])
+            # Rows go first: a results request either finds both or reports the job as gone
+            for job_id in ids:
+                try:
+                    os.remove(self.result_path(job_id))
+                except FileNotFoundError:
+                    pass
+            removed += len(ids)
+            if len(ids) < limit:
+                return removed
+
+    def stage_callback(self, job_id):
+        """Return a ``progress(stage)`` callable that records stage-level progress."""
+        def progress(stage):
+            done = STAGES.index(stage) if stage in STAGES else 0
+            self.update(job_id, stage=stage, progress=round(done / len(STAGES) * 100, 1))
+        return progress
+
+
+def _execute(folder, job_id, target, args):
+    """Pool entry point: run ``target(*args, progress=...)`` and persist its output."""
+    store = JobStore(folder)
+    store.update(job_id, status="running")
+    try:
+        result = target(*args, progress=store.stage_callback(job_id))
+        store.save_result(job_id, result)
+        store.update(job_id, status="done", stage=None, progress=100.0)
+    except Exception as e:
+        logger.error("Job %s failed: %s", job_id, traceback.format_exc())
+        store.update(job_id, status="failed", error=str(e) or e.__class__.__name__)
+
+
+class JobQueue:
+    """
+    Submit analysis callables to a bounded process pool, admitting them against
+    ``memory_budget`` (bytes) and ``max_per_owner`` when set. The pool starts on the first
+    submit, or ahead of it with ``ensure_started()``; each worker runs ``initializer``
+    once as it starts (e.g. to import the analytical stack before any job arrives).
+    """
+
+    def __init__(self, store, max_workers=2, memory_budget=None, max_per_owner=None, initializer=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.memory_budget = memory_budget
+        self.max_per_owner = max_per_owner
+        self.initializer = initializer
+        self._pool = None
+        # Request threads (threaded / ASGI servers) submit concurrently
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=self.initializer)
+            return self._pool
+
+    def ensure_started(self):
+        """
+        Prefork the worker processes now rather than on the first submit. Returns futures
+        that finish once the workers are initialized (none if the pool was already up).
+        """
+        if self._pool is not None:
+            return []
+        pool = self.pool
+        # Workers start as tasks arrive: one no-op each brings the whole pool up
+        return [pool.submit(os.getpid) for _ in range(self.max_workers)]
+
+    def submit(self, upload, target, *args, cost=0, owner=None):
+        """
+        Queue ``target(*args)`` and return the new job id immediately. ``cost`` is the job's
+        estimated peak memory in bytes; raises QueueFull when the job is not admitted.
+        """
+        job_id = self.store.create(upload, cost=cost, owner=owner, budget=self.memory_budget,
+                                   max_per_owner=self.max_per_owner)
+        pool = self.pool
+        try:
+            future = pool.submit(_execute, self.store.folder, job_id, target, args)
+        except Exception as e:
+            # A broken pool (e.g. a worker was OOM-killed) is replaced on next submit.
+            self._discard(pool)
+            self.store.update(job_id, status="failed", error=f"Could not start analysis: {e}")
+            return job_id
+        future.add_done_callback(lambda f, job_id=job_id, pool=pool: self._on_done(job_id, pool, f))
+        return job_id
+
+    def _on_done(self, job_id, pool, future):
+        # _execute records its own failures; this only catches a crashed worker process.
+        exc = future.exception()
+        if exc is not None:
+            if isinstance(exc, BrokenProcessPool):
+                self._discard(pool)
+            self.store.update(job_id, status="failed", error=f"Analysis worker crashed: {exc}")
+
+    def _discard(self, pool):
+        """Shut down ``pool`` and let the next submit start a fresh one (unless that happened already)."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            # Without waiting: this can run on the pool's own management thread
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes; the next submit starts a fresh pool."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        return {
+            "job_id": job["id"],
+            "upload": job["upload"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "stages": STAGES,
+            "progress": job["progress"],
+            "error": job["error"],
+            "created": job["created"],
+            "updated": job["updated"],
+        }
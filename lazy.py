@@ -0,0 +1,106 @@
+"""Deferred imports of the analytical stack.
+
+``lazy_import("sklearn.cluster", "KMeans")`` returns a stand-in that imports
+``sklearn.cluster`` the first time it is called or an attribute is read, then
+forwards to ``KMeans``. ``lazy_module("pandas")`` does the same for a whole
+module, and ``deferred(factory)`` for an object built from them (a store whose
+module imports pandas). Code using these names reads as if the imports were
+eager.
+
+Importing the web app therefore costs Flask and the SQLite stores only: the
+upload, status and static routes never load pandas, scikit-learn or
+matplotlib. Analysis workers call ``warm()`` as they start, which resolves
+every stand-in, so the first job does not pay for the imports either.
+
+Every deferred import is timed, and ``drain_import_times()`` hands the timings
+to the startup metrics.
+"""
+import sys
+import time
+import importlib
+import importlib.util
+import threading
+
+_UNSET = object()
+_registry = []
+_timings = []
+_timings_lock = threading.Lock()
+
+
+def module_available(name):
+    """Whether top-level module ``name`` is installed, without importing it."""
+    return importlib.util.find_spec(name) is not None
+
+
+def import_module(name):
+    """``importlib.import_module``, timing the import if it is the first one in this process."""
+    if name in sys.modules:
+        return importlib.import_module(name)
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with _timings_lock:
+        _timings.append((name, time.perf_counter() - started))
+    return module
+
+
+def drain_import_times():
+    """(module, seconds) of the deferred imports since the last call."""
+    global _timings
+    with _timings_lock:
+        timings, _timings = _timings, []
+    return timings
+
+
+class Deferred:
+    """Stand-in for an object created on first use; forwards attribute access and calls to it."""
+
+    __slots__ = ("_factory", "_name", "_target", "_lock")
+
+    def __init__(self, factory, name):
+        self._factory = factory
+        self._name = name
+        self._target = _UNSET
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _resolve(self):
+        target = self._target
+        if target is _UNSET:
+            with self._lock:
+                if self._target is _UNSET:
+                    self._target = self._factory()
+                target = self._target
+        return target
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "unresolved" if self._target is _UNSET else "resolved"
+        return f"<deferred {self._name} ({state})>"
+
+
+def lazy_module(name):
+    return Deferred(lambda: import_module(name), name)
+
+
+def lazy_import(module, *names):
+    """Stand-ins for ``from module import name, ...`` (one object for a single name)."""
+    stand_ins = tuple(Deferred(lambda attr=attr: getattr(import_module(module), attr), f"{module}.{attr}")
+                      for attr in names)
+    return stand_ins[0] if len(stand_ins) == 1 else stand_ins
+
+
+def deferred(factory, name):
+    return Deferred(factory, name)
+
+
+def warm():
+    """Resolve every stand-in created so far (importing the whole deferred stack); returns seconds taken."""
+    started = time.perf_counter()
+    for stand_in in list(_registry):
+        stand_in._resolve()
+    return time.perf_counter() - started
@@ -0,0 +1,224 @@
+"""Stage instrumentation and Prometheus metrics.
+
+Wrap a pipeline stage in ``stage()`` to record its wall time, CPU time, growth of
+the process's peak RSS and the rows it handled::
+
+    with stage("clean") as span:
+        df = df.dropna().drop_duplicates()
+        span.rows = len(df)
+
+Spans are collected by the ``Trace`` made active with ``tracing()`` (a context
+variable, so it follows the code into ``copy_context()``-wrapped threads). Stages
+run outside of a trace cost only the timer calls and are dropped.
+
+Finished traces and HTTP request timings are folded into histograms kept in a
+small SQLite database, so the web workers and the analysis / plot pool processes
+all feed the same series. ``MetricsStore.render()`` returns them in the
+Prometheus text exposition format for ``/metrics``.
+
+CPU time is process-wide (``time.process_time``), so stages that run
+concurrently in threads (the scalable ML models) include each other's CPU.
+"""
+import sys
+import json
+import time
+import logging
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2 ** p * 1024 * 1024 for p in range(0, 14, 2))  # 1 MB .. 4 GB
+ROWS_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+METRICS = {
+    # name: (help, buckets)
+    "analysis_stage_wall_seconds": ("Wall-clock time per analysis stage.", DURATION_BUCKETS),
+    "analysis_stage_cpu_seconds": ("Process CPU time per analysis stage.", DURATION_BUCKETS),
+    "analysis_stage_peak_rss_delta_bytes": ("Growth of the process peak RSS during a stage.", BYTES_BUCKETS),
+    "analysis_stage_rows": ("Rows handled per analysis stage.", ROWS_BUCKETS),
+    "http_request_duration_seconds": ("HTTP request latency.", DURATION_BUCKETS),
+    "startup_import_seconds": ("First import of the app or of a deferred module, per process kind.",
+                               DURATION_BUCKETS),
+    "startup_worker_warm_seconds": ("Time an analysis worker spends loading the analytical stack.", DURATION_BUCKETS),
+    "startup_first_request_seconds": ("Latency of the first request each web process serves.", DURATION_BUCKETS),
+}
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Span:
+    """Measurements of one stage run."""
+
+    __slots__ = ("name", "labels", "rows", "start", "wall", "cpu", "rss_delta")
+
+    def __init__(self, name, labels=None, rows=None):
+        self.name = name
+        self.labels = labels or {}
+        self.rows = rows
+        self.start = time.time()
+        self.wall = self.cpu = 0.0
+        self.rss_delta = 0
+
+    def as_dict(self):
+        return {"stage": self.name, "labels": self.labels, "rows": self.rows, "start": self.start,
+                "wall_ms": round(self.wall * 1000, 2), "cpu_ms": round(self.cpu * 1000, 2),
+                "rss_delta_mb": round(self.rss_delta / (1024 * 1024), 2)}
+
+
+class Trace:
+    """Spans recorded while handling one analysis (thread-safe)."""
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def extend(self, spans):
+        with self._lock:
+            self.spans.extend(spans)
+
+    def as_list(self):
+        """Spans as dicts in start order, with start offsets relative to the trace."""
+        rows = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            row = span.as_dict()
+            row["offset_ms"] = round((row.pop("start") - self.started) * 1000, 1)
+            rows.append(row)
+        return rows
+
+
+@contextmanager
+def tracing(trace=None):
+    """Make ``trace`` (a new Trace by default) collect the spans of this context."""
+    trace = trace or Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def stage(name, rows=None, **labels):
+    """Measure the enclosed block as stage ``name``; set ``span.rows`` inside if known later."""
+    span = Span(name, labels, rows)
+    trace = _current.get()
+    wall, cpu, peak = time.perf_counter(), time.process_time(), _peak_rss_bytes()
+    try:
+        yield span
+    finally:
+        span.wall = time.perf_counter() - wall
+        span.cpu = time.process_time() - cpu
+        span.rss_delta = max(0, _peak_rss_bytes() - peak)
+        if trace is not None:
+            trace.add(span)
+
+
+def _label_text(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+
+
+class MetricsStore:
+    """Cumulative histograms in SQLite, shared by every process of the app."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with connect(self.db_path) as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    metric TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (metric, labels, bucket)
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS totals (
+                    metric TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    sum REAL NOT NULL,
+                    PRIMARY KEY (metric, labels)
+                )"""
+            )
+
+    def observe_many(self, observations):
+        """Record ``(metric, labels, value)`` triples in one transaction."""
+        rows = []
+        for metric, labels, value in observations:
+            if value is None:
+                continue
+            buckets = METRICS[metric][1]
+            index = next((i for i, le in enumerate(buckets) if value <= le), len(buckets))
+            rows.append((metric, json.dumps(labels, sort_keys=True), index, float(value)))
+        if not rows:
+            return
+        with connect(self.db_path) as conn:
+            conn.executemany(
+                """INSERT INTO buckets (metric, labels, bucket, count) VALUES (?, ?, ?, 1)
+                   ON CONFLICT (metric, labels, bucket) DO UPDATE SET count = count + 1""",
+                [r[:3] for r in rows])
+            conn.executemany(
+                """INSERT INTO totals (metric, labels, count, sum) VALUES (?, ?, 1, ?)
+                   ON CONFLICT (metric, labels) DO UPDATE SET count = count + 1, sum = sum + excluded.sum""",
+                [(r[0], r[1], r[3]) for r in rows])
+
+    def observe_trace(self, trace):
+        observations = []
+        for span in trace.spans:
+            labels = dict(span.labels, stage=span.name)
+            observations += [
+                ("analysis_stage_wall_seconds", labels, span.wall),
+                ("analysis_stage_cpu_seconds", labels, span.cpu),
+                ("analysis_stage_peak_rss_delta_bytes", labels, span.rss_delta),
+                ("analysis_stage_rows", labels, span.rows),
+            ]
+        self.observe_many(observations)
+
+    def render(self):
+        """All histograms in the Prometheus text exposition format."""
+        with connect(self.db_path) as conn:
+            counts = {}
+            for metric, labels, bucket, count in conn.execute("SELECT metric, labels, bucket, count FROM buckets"):
+                counts.setdefault((metric, labels), {})[bucket] = count
+            totals = {(m, l): (c, s) for m, l, c, s in conn.execute("SELECT metric, labels, count, sum FROM totals")}
+
+        lines = []
+        for metric, (help_text, buckets) in METRICS.items():
+            series = sorted(key for key in totals if key[0] == metric)
+            if not series:
+                continue
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for key in series:
+                labels = json.loads(key[1])
+                cumulative = 0
+                for i, le in enumerate(list(buckets) + ["+Inf"]):
+                    cumulative += counts.get(key, {}).get(i, 0)
+                    lines.append(f"{metric}_bucket{{{_label_text(dict(labels, le=le))}}} {cumulative}")
+                count, total = totals[key]
+                lines.append(f"{metric}_sum{{{_label_text(labels)}}} {total:.6g}")
+                lines.append(f"{metric}_count{{{_label_text(labels)}}} {count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,135 @@
+"""Scalable segmentation / anomaly detection for datasets beyond the plot sample.
+
+``fit_scalable`` works on one float32 standardized matrix and runs the three
+models in parallel threads (the heavy NumPy / scikit-learn kernels release the
+GIL):
+
+* MiniBatchKMeans fitted by ``partial_fit`` over streaming chunks
+* IsolationForest trained on a random subsample, then scoring every row in batches
+* randomized PCA fitted on a subsample, then projecting every row in batches
+
+Cost grows linearly with rows; all labels cover the full dataset.
+"""
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.ensemble import IsolationForest
+
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 50000
+SUBSAMPLE_ROWS = 100000
+KMEANS_EPOCHS = 2
+
+
+def standardize_float32(X, means=None, scales=None, chunk_rows=CHUNK_ROWS):
+    """
+    Mean-impute and standardize ``X`` (2-D array, may contain NaN) into a new float32
+    matrix, chunk by chunk, so no full float64 copy is ever made. Pass the ``means`` and
+    ``scales`` of a previously fitted pipeline to apply it unchanged.
+    Returns (X_scaled, means, scales).
+    """
+    if means is None:
+        means = np.nanmean(X, axis=0, dtype=np.float64)
+        means = np.where(np.isfinite(means), means, 0.0)
+    if scales is None:
+        scales = np.nanstd(X, axis=0, dtype=np.float64)
+        scales = np.where(np.isfinite(scales) & (scales > 0), scales, 1.0)
+    out = np.empty(X.shape, dtype=np.float32)
+    for start in range(0, len(X), chunk_rows):
+        block = np.asarray(X[start:start + chunk_rows], dtype=np.float64)
+        block = (block - means) / scales
+        # Imputing with the mean is exactly 0 after standardization
+        block[~np.isfinite(block)] = 0.0
+        out[start:start + chunk_rows] = block
+    return out, means, scales
+
+
+def _subsample(n, size, seed=42):
+    if n <= size:
+        return slice(None)
+    return np.sort(np.random.default_rng(seed).choice(n, size, replace=False))
+
+
+def _batched(fn, X, chunk_rows=CHUNK_ROWS):
+    return np.concatenate([fn(X[start:start + chunk_rows]) for start in range(0, len(X), chunk_rows)])
+
+
+def fit_kmeans(X, n_clusters=3, chunk_rows=CHUNK_ROWS, epochs=KMEANS_EPOCHS, seed=42):
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, batch_size=min(chunk_rows, 4096), n_init=3)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation((len(X) + chunk_rows - 1) // chunk_rows)
+        for i in order:
+            chunk = X[i * chunk_rows:(i + 1) * chunk_rows]
+            if len(chunk) >= n_clusters:
+                model.partial_fit(chunk)
+    return model, _batched(model.predict, X, chunk_rows)
+
+
+def fit_isolation_forest(X, contamination=0.01, subsample=SUBSAMPLE_ROWS, chunk_rows=CHUNK_ROWS, seed=42):
+    model = IsolationForest(contamination=contamination, random_state=seed, n_jobs=-1)
+    model.fit(X[_subsample(len(X), subsample, seed)])
+    # Same rule as predict(): negative decision function means anomaly
+    return model, _batched(model.decision_function, X, chunk_rows) < 0
+
+
+def fit_pca(X, subsample=SUBSAMPLE_ROWS, chunk_rows=CHUNK_ROWS, seed=42):
+    if X.shape[1] < 2:
+        return None, None
+    model = PCA(n_components=2, svd_solver="randomized", random_state=seed)
+    model.fit(X[_subsample(len(X), subsample, seed)])
+    return model, _batched(model.transform, X, chunk_rows)
+
+
+def score_bundle(bundle, X_scaled, chunk_rows=CHUNK_ROWS):
+    """Score-only path for a registry bundle: (segments, is_anomaly, pca_coords) in batches."""
+    kmeans = bundle["kmeans"]
+    # KMeans predicts in the dtype it was fitted with (float64 for the full engine)
+    dtype = kmeans.cluster_centers_.dtype
+    with stage("ml.kmeans", rows=len(X_scaled), mode="score"):
+        segments = _batched(lambda block: kmeans.predict(block.astype(dtype, copy=False)), X_scaled, chunk_rows)
+    with stage("ml.isolation_forest", rows=len(X_scaled), mode="score"):
+        anomalies = _batched(bundle["iso"].decision_function, X_scaled, chunk_rows) < 0
+    coords = None
+    if bundle.get("pca") is not None:
+        with stage("ml.pca", rows=len(X_scaled), mode="score"):
+            coords = _batched(bundle["pca"].transform, X_scaled, chunk_rows)
+    return segments, anomalies, coords
+
+
+def _timed(name, fn, X, **kwargs):
+    with stage(name, rows=len(X), mode="fit"):
+        return fn(X, **kwargs)
+
+
+def fit_scalable(X_scaled, n_clusters=3, contamination=0.01):
+    """
+    Fit all three models concurrently on one float32 matrix.
+    Returns {"kmeans": (model, labels), "iso": (model, is_anomaly), "pca": (model, coords)};
+    a model that failed maps to None.
+    """
+    # Stage names match the full engine's and score_bundle's, so one metric covers each model
+    jobs = {
+        "kmeans": ("ml.kmeans", fit_kmeans, {"n_clusters": n_clusters}),
+        "iso": ("ml.isolation_forest", fit_isolation_forest, {"contamination": contamination}),
+        "pca": ("ml.pca", fit_pca, {}),
+    }
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        # Each thread gets its own copy of the context so its stage lands in the caller's trace
+        futures = {name: pool.submit(contextvars.copy_context().run, _timed, stage_name, fn, X_scaled, **kwargs)
+                   for name, (stage_name, fn, kwargs) in jobs.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception:
+                logger.exception("Scalable %s fit failed", name)
+                results[name] = None
+    return results
@@ -0,0 +1,385 @@
+"""Independent plot render tasks run across a bounded process pool.
+
+Each task draws on its own ``matplotlib.figure.Figure`` (object-oriented API,
+no shared ``pyplot`` state) from just the data it needs, so tasks can run in
+parallel processes. ``generate_plots`` in app.py builds the task list and
+calls ``render_plots``. Inside an analysis pool process the plot pool only gets
+that worker's share of ``PLOT_WORKERS`` (``PLOT_WORKERS // ANALYSIS_WORKERS``,
+serial when that is 1), so concurrent analyses together stay within
+``PLOT_WORKERS`` plot processes instead of multiplying it.
+"""
+import io
+import os
+import logging
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.colors import LogNorm, Normalize
+import seaborn as sns
+
+from metrics import current_trace, stage, tracing
+
+logger = logging.getLogger(__name__)
+
+PLOT_WORKERS = int(os.environ.get("PLOT_WORKERS", str(min(os.cpu_count() or 1, 8))))
+# Size of the analysis pool (as in app.py) that PLOT_WORKERS is shared between
+ANALYSIS_WORKERS = max(1, int(os.environ.get("ANALYSIS_WORKERS", "2")))
+PLOT_DPI = 80  # Reduced DPI for speed
+# Scatter plots above this many points are downsampled / drawn as a density grid
+PLOT_MAX_POINTS = int(os.environ.get("PLOT_MAX_POINTS", "5000"))
+HIST_BINS = 30
+KDE_GRID = 512
+DENSITY_BINS = 80
+MAX_FLIERS = 200
+
+sns.set(style="whitegrid")
+
+_pool = None
+
+
+# --- Pre-aggregation: reduce raw rows to small arrays before anything is drawn ---
+
+def histogram_aggregate(values, bins=HIST_BINS, kde=True):
+    """Bin counts plus a binned (FFT-convolved) Gaussian KDE scaled to the counts."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    result = {"counts": counts, "edges": edges}
+    if kde and len(values) > 1:
+        result["kde"] = _binned_kde(values, edges[1] - edges[0])
+    return result
+
+
+def _binned_kde(values, bin_width, grid_size=KDE_GRID):
+    """
+    Gaussian KDE on a regular grid: bin the data finely, then convolve the grid counts
+    with the kernel via FFT. Cost is O(n + grid log grid) instead of O(n * grid).
+    """
+    n = len(values)
+    std = values.std(ddof=1)
+    if not np.isfinite(std) or std == 0:
+        return None
+    bw = std * n ** (-1 / 5)  # Scott's rule, as used by seaborn's default KDE
+    lo, hi = values.min() - 3 * bw, values.max() + 3 * bw
+    grid_counts, grid_edges = np.histogram(values, bins=grid_size, range=(lo, hi))
+    dx = grid_edges[1] - grid_edges[0]
+    half = min(int(np.ceil(4 * bw / dx)), grid_size)
+    offsets = np.arange(-half, half + 1) * dx
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    size = grid_size + len(kernel) - 1
+    fft_size = 1 << (size - 1).bit_length()
+    conv = np.fft.irfft(np.fft.rfft(grid_counts, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+    density = conv[half:half + grid_size] / n
+    x = (grid_edges[:-1] + grid_edges[1:]) / 2
+    # Scale the density to histogram counts so both share the y axis
+    return x, np.clip(density, 0, None) * n * bin_width
+
+
+def box_aggregate(values, label=None, max_fliers=MAX_FLIERS):
+    """Quartiles, 1.5 IQR whiskers and a capped set of outliers in ``Axes.bxp`` form."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lo_fence, hi_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = values[(values >= lo_fence) & (values <= hi_fence)]
+    fliers = values[(values < lo_fence) | (values > hi_fence)]
+    if len(fliers) > max_fliers:
+        # Keep the extremes so the axis still spans the full range
+        picked = np.random.default_rng(0).choice(fliers, max_fliers - 2, replace=False)
+        fliers = np.concatenate([[fliers.min(), fliers.max()], picked])
+    return {
+        "label": label,
+        "q1": q1,
+        "med": med,
+        "q3": q3,
+        "whislo": inside.min() if len(inside) else q1,
+        "whishi": inside.max() if len(inside) else q3,
+        "fliers": fliers,
+    }
+
+
+def downsample_index(n, max_points=PLOT_MAX_POINTS, seed=42):
+    """Sorted random row positions to keep when ``n`` exceeds ``max_points`` (None = keep all)."""
+    if n <= max_points:
+        return None
+    return np.sort(np.random.default_rng(seed).choice(n, max_points, replace=False))
+
+
+def density_aggregate(points, bins=DENSITY_BINS):
+    """2-D histogram of PCA points for density mode."""
+    counts, xedges, yedges = np.histogram2d(points[:, 0], points[:, 1], bins=bins)
+    return {"density": counts.T, "xedges": xedges, "yedges": yedges}
+
+
+def segment_density_aggregate(points, segments, bins=DENSITY_BINS):
+    """
+    Per-segment 2-D histograms of PCA points on shared edges, reduced to what is drawn: each
+    cell's total count and its most frequent segment (-1 where empty).
+    """
+    segments = np.asarray(segments)
+    labels = np.unique(segments)
+    _, xedges, yedges = np.histogram2d(points[:, 0], points[:, 1], bins=bins)
+    per_segment = np.stack([np.histogram2d(points[segments == label, 0], points[segments == label, 1],
+                                           bins=(xedges, yedges))[0] for label in labels])
+    counts = per_segment.sum(axis=0)
+    dominant = np.where(counts > 0, labels[per_segment.argmax(axis=0)], -1)
+    return {"counts": counts.T, "dominant": dominant.T, "segments": labels, "xedges": xedges, "yedges": yedges}
+
+
+def segmentation_aggregate(pca, segments, max_points=PLOT_MAX_POINTS):
+    """Scatter for small inputs; above ``max_points`` a per-segment density grid."""
+    if len(pca) <= max_points:
+        return {"pca": pca, "segments": segments, "total": len(pca)}
+    return {"segment_density": segment_density_aggregate(pca, segments), "total": len(pca)}
+
+
+def fraud_aggregate(pca, anomalies, max_points=PLOT_MAX_POINTS):
+    """Scatter for small inputs; above ``max_points`` normal rows become a density grid."""
+    anomalies = np.asarray(anomalies, dtype=bool)
+    if len(pca) <= max_points:
+        return {"pca": pca, "anomalies": anomalies}
+    flagged = pca[anomalies]
+    idx = downsample_index(len(flagged), max_points)
+    return {"normal_density": density_aggregate(pca[~anomalies]),
+            "flagged": flagged if idx is None else flagged[idx]}
+
+
+class PlotTask:
+    """One chart: what to draw (``kind`` + ``data``), where to save it and how it is titled."""
+
+    def __init__(self, kind, path, title, figsize, **data):
+        self.kind = kind
+        self.path = path
+        self.title = title
+        self.figsize = figsize
+        self.data = data
+
+
+def _draw_hist(ax, counts, edges, kde=None, column=None, **_):
+    color = sns.color_palette()[0]
+    ax.stairs(counts, edges, fill=True, alpha=0.6, color=color)
+    ax.stairs(counts, edges, color=color, linewidth=0.8)
+    if kde is not None:
+        ax.plot(kde[0], kde[1], color=color)
+    ax.set_xlabel(column)
+    ax.set_ylabel("Count")
+
+
+def _draw_box(ax, stats, column=None, **_):
+    ax.bxp([stats], vert=False, showfliers=len(stats.get("fliers", ())) > 0, patch_artist=True,
+           boxprops={"facecolor": sns.color_palette()[0], "alpha": 0.8})
+    ax.set_yticks([])
+    ax.set_xlabel(column)
+
+
+def _draw_pie(ax, labels, values, **_):
+    ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
+    ax.set_ylabel("")
+
+
+def _draw_bar(ax, labels, values, **_):
+    sns.barplot(x=values, y=labels, ax=ax)
+
+
+# Cell labels stop being readable beyond this many columns
+CORR_ANNOTATE_MAX = 12
+
+
+def _draw_corr(ax, corr, **_):
+    sns.heatmap(corr, annot=len(corr) <= CORR_ANNOTATE_MAX, fmt=".2f", cmap="coolwarm", vmin=-1, vmax=1, ax=ax)
+
+
+def _draw_segmentation(ax, pca=None, segments=None, total=None, segment_density=None, **_):
+    if segment_density is not None:
+        _draw_segment_density(ax, total=total, **segment_density)
+    else:
+        sns.scatterplot(x=pca[:, 0], y=pca[:, 1], hue=segments, palette="viridis", s=60, ax=ax)
+    ax.set_xlabel("Principal Component 1")
+    ax.set_ylabel("Principal Component 2")
+
+
+def _draw_segment_density(ax, counts, dominant, segments, xedges, yedges, total=None):
+    # Hue: the cell's main segment (same colormap as the scatter); opacity: log point count
+    cmap = matplotlib.colormaps["viridis"]
+    norm = Normalize(vmin=segments.min(), vmax=max(segments.max(), segments.min() + 1))
+    image = cmap(norm(dominant))
+    image[..., 3] = np.where(counts > 0, 0.15 + 0.85 * np.log1p(counts) / np.log1p(counts.max()), 0)
+    ax.imshow(image, extent=(xedges[0], xedges[-1], yedges[0], yedges[-1]), origin="lower", aspect="auto",
+              interpolation="nearest")
+    ax.legend(handles=[Line2D([0], [0], marker="s", color="w", label=str(label), markerfacecolor=cmap(norm(label)),
+                              markersize=10) for label in segments], title="Segment")
+    if total:
+        ax.text(0.99, 0.01, f"Density of {total:,} points", transform=ax.transAxes,
+                ha="right", va="bottom", fontsize=8, color="gray")
+
+
+def _draw_fraud(ax, pca=None, anomalies=None, normal_density=None, flagged=None, **_):
+    # Color code: Blue (Normal), Red (High Risk)
+    if normal_density is not None:
+        grid = np.ma.masked_equal(normal_density["density"], 0)
+        ax.pcolormesh(normal_density["xedges"], normal_density["yedges"], grid, cmap="Blues",
+                      norm=LogNorm(vmin=0.5), shading="flat")
+        ax.scatter(flagged[:, 0], flagged[:, 1], c="red", s=60, alpha=0.6)
+    else:
+        colors = np.where(anomalies, "red", "blue")
+        ax.scatter(pca[:, 0], pca[:, 1], c=colors, s=60, alpha=0.6)
+    legend_elements = [Line2D([0], [0], marker='o', color='w', label='Normal', markerfacecolor='blue', markersize=10),
+                       Line2D([0], [0], marker='o', color='w', label='Potential Fraud', markerfacecolor='red', markersize=10)]
+    ax.legend(handles=legend_elements)
+    ax.set_xlabel("Principal Component 1")
+    ax.set_ylabel("Principal Component 2")
+
+
+RENDERERS = {
+    "hist": _draw_hist,
+    "box": _draw_box,
+    "pie": _draw_pie,
+    "bar": _draw_bar,
+    "corr": _draw_corr,
+    "segmentation": _draw_segmentation,
+    "fraud": _draw_fraud,
+}
+
+
+def render_task(task):
+    """Render one task to its PNG path; returns the path, or None if this plot failed."""
+    try:
+        fig = Figure(figsize=task.figsize)
+        ax = fig.add_subplot()
+        RENDERERS[task.kind](ax, **task.data)
+        ax.set_title(task.title)
+        fig.tight_layout()
+        fig.savefig(task.path, dpi=PLOT_DPI)
+        return task.path
+    except Exception:
+        logger.exception("Failed to create %s plot: %s", task.kind, task.title)
+        return None
+
+
+def warm_up():
+    """
+    Pay the first chart's one-time costs now: matplotlib's font cache and the font files
+    Agg rasterizes text with, so a warm analysis worker's first job does not.
+    """
+    fig = Figure(figsize=(2, 2))
+    ax = fig.add_subplot()
+    _draw_hist(ax, **histogram_aggregate(np.arange(10.0)))
+    ax.set_title("warm-up")
+    fig.tight_layout()
+    fig.savefig(io.BytesIO(), format="png", dpi=PLOT_DPI)
+
+
+# --- JSON chart specs for client-side rendering (no rasterization, no files) ---
+
+JSON_KDE_POINTS = 128
+
+
+def _num(values, digits=4):
+    """Round to a compact list of floats; non-finite values become null."""
+    arr = np.asarray(values, dtype=np.float64).ravel()
+    rounded = np.round(arr, digits)
+    return [float(v) if np.isfinite(v) else None for v in rounded]
+
+
+def chart_spec(task):
+    """Turn a PlotTask's pre-aggregated data into a small JSON-serializable chart spec."""
+    d = task.data
+    spec = {"type": task.kind, "title": task.title,
+            "name": os.path.splitext(os.path.basename(task.path))[0]}
+    if task.kind == "hist":
+        spec.update(edges=_num(d["edges"]), counts=[int(c) for c in d["counts"]], column=d.get("column"))
+        if d.get("kde") is not None:
+            step = max(1, len(d["kde"][0]) // JSON_KDE_POINTS)
+            spec["kde"] = {"x": _num(d["kde"][0][::step]), "y": _num(d["kde"][1][::step], 2)}
+    elif task.kind == "box":
+        stats = d["stats"]
+        spec.update({k: _num([stats[k]])[0] for k in ("q1", "med", "q3", "whislo", "whishi")})
+        spec.update(fliers=_num(stats.get("fliers", [])), column=d.get("column"))
+    elif task.kind in ("pie", "bar"):
+        spec.update(labels=[str(x) for x in d["labels"]], values=[int(v) for v in d["values"]])
+    elif task.kind == "corr":
+        spec.update(labels=[str(c) for c in d["corr"].columns], matrix=[_num(row, 3) for row in d["corr"].to_numpy()])
+    elif task.kind == "segmentation":
+        if d.get("segment_density") is not None:
+            grid = d["segment_density"]
+            spec.update(density=[[int(c) for c in row] for row in grid["counts"]],
+                        dominant=[[int(c) for c in row] for row in grid["dominant"]],
+                        segments=[int(s) for s in grid["segments"]],
+                        xedges=_num(grid["xedges"]), yedges=_num(grid["yedges"]), total=d.get("total"))
+        else:
+            spec.update(x=_num(d["pca"][:, 0], 3), y=_num(d["pca"][:, 1], 3),
+                        segments=[int(s) for s in d["segments"]], total=d.get("total"))
+    elif task.kind == "fraud":
+        if d.get("normal_density") is not None:
+            grid = d["normal_density"]
+            spec.update(density=[[int(c) for c in row] for row in grid["density"]],
+                        xedges=_num(grid["xedges"]), yedges=_num(grid["yedges"]),
+                        flagged_x=_num(d["flagged"][:, 0], 3), flagged_y=_num(d["flagged"][:, 1], 3))
+        else:
+            spec.update(x=_num(d["pca"][:, 0], 3), y=_num(d["pca"][:, 1], 3),
+                        flags=[bool(a) for a in d["anomalies"]])
+    return spec
+
+
+def _pool_size():
+    """PLOT_WORKERS, or this analysis worker's share of it inside a pool process."""
+    if multiprocessing.parent_process() is None:
+        return PLOT_WORKERS
+    return max(1, PLOT_WORKERS // ANALYSIS_WORKERS)
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_pool_size())
+        if multiprocessing.parent_process() is not None:
+            # A pool process exits through multiprocessing, which joins its children before
+            # atexit runs; stop the plot workers first, ahead of the queue finalizers
+            multiprocessing.util.Finalize(None, _shutdown_pool, exitpriority=100)
+    return _pool
+
+
+def _shutdown_pool(wait=True):
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _render_timed(task):
+    """Pool entry point: render one task and return (path, spans) measured in the worker."""
+    with tracing() as trace:
+        with stage("plot", kind=task.kind):
+            path = render_task(task)
+    return path, trace.spans
+
+
+def render_plots(tasks, max_workers=None):
+    """
+    Render tasks in parallel and return the saved paths in task order.
+    Failed plots are skipped, so one broken chart never takes down the others.
+    Per-plot timings are added to the caller's active trace.
+    """
+    workers = _pool_size() if max_workers is None else max_workers
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_render_timed(t) for t in tasks]
+    else:
+        try:
+            results = list(_get_pool().map(_render_timed, tasks))
+        except Exception:
+            # A crashed worker breaks the whole pool; rebuild it next time and render serially now
+            logger.exception("Plot pool failed; rendering serially")
+            _shutdown_pool(wait=False)
+            results = [_render_timed(t) for t in tasks]
+    trace = current_trace()
+    if trace is not None:
+        for _, spans in results:
+            trace.extend(spans)
+    return [path for path, _ in results if path]
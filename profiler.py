@@ -0,0 +1,623 @@
+"""Single-pass, bounded-memory profiling of CSV files larger than RAM.
+
+``profile_csv()`` reads a file in chunks and keeps only mergeable summaries:
+
+* exact row / null counts, min / max and mean / std (Welford with Chan's merge)
+* fixed-size histograms whose range widens adaptively as new values arrive
+* approximate distinct counts (HyperLogLog)
+* approximate quantiles for boxplots (KLL sketch)
+* approximate top-k categories (Misra-Gries)
+* a true uniform reservoir sample of rows for the ML and scatter stages
+* optionally, pairwise-complete co-moments for an exact correlation matrix
+
+The resulting ``DatasetProfile`` can be passed straight to ``dataset_summary``
+and ``generate_dataset_explanation`` in app.py in place of a DataFrame.
+
+``profile_frame()`` is the in-memory counterpart: a fused kernel that computes
+every per-column statistic of a loaded DataFrame in one sweep (numeric columns
+as 2-D NumPy reductions over same-dtype blocks, other columns from a single
+factorize each) and returns a ``FrameProfile`` with the same interface.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 12
+FRAME_BLOCK_BYTES = 64 * 1024 * 1024
+HIST_BINS = 30
+TOP_K = 50
+KLL_K = 200
+# Correlation co-moments grow with columns squared; only this many numeric columns are tracked
+MAX_CORRELATION_COLUMNS = 50
+
+
+class RunningMoments:
+    """Exact count / mean / variance / min / max, merged chunk by chunk."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        n_b = len(values)
+        if n_b == 0:
+            return
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        self._merge(n_b, mean_b, m2_b, float(values.min()), float(values.max()))
+
+    def merge(self, other):
+        if other.n:
+            self._merge(other.n, other.mean, other.m2, other.min, other.max)
+
+    def _merge(self, n_b, mean_b, m2_b, min_b, max_b):
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta * delta * self.n * n_b / n
+        self.n = n
+        self.min = min(self.min, min_b)
+        self.max = max(self.max, max_b)
+
+    @property
+    def std(self):
+        # Sample standard deviation, matching pandas' default ddof=1
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else float("nan")
+
+
+class StreamingHistogram:
+    """Fixed number of equal-width bins; the range doubles whenever a value falls outside it."""
+
+    def __init__(self, bins=HIST_BINS):
+        self.bins = bins
+        self.lo = None
+        self.width = None
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        vmin, vmax = float(values.min()), float(values.max())
+        if self.lo is None:
+            span = vmax - vmin
+            self.lo = vmin
+            self.width = span / self.bins if span > 0 else max(abs(vmin), 1.0) * 1e-6
+        else:
+            # The top edge counts as inside (the clip below puts it in the last bin)
+            while vmin < self.lo or vmax > self.lo + self.width * self.bins:
+                self._widen(extend_left=vmin < self.lo)
+        idx = ((values - self.lo) / self.width).astype(np.int64)
+        np.clip(idx, 0, self.bins - 1, out=idx)
+        self.counts += np.bincount(idx, minlength=self.bins)
+
+    def _widen(self, extend_left):
+        span = self.width * self.bins
+        new_lo = self.lo - span if extend_left else self.lo
+        new_width = self.width * 2
+        centers = self.lo + (np.arange(self.bins) + 0.5) * self.width
+        idx = np.clip(((centers - new_lo) / new_width).astype(np.int64), 0, self.bins - 1)
+        counts = np.zeros(self.bins, dtype=np.int64)
+        np.add.at(counts, idx, self.counts)
+        self.lo, self.width, self.counts = new_lo, new_width, counts
+
+    def histogram(self):
+        """Return (counts, edges) with empty bins trimmed from both ends."""
+        if self.lo is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(1)
+        nz = np.flatnonzero(self.counts)
+        first, last = nz[0], nz[-1] + 1
+        edges = self.lo + np.arange(self.bins + 1) * self.width
+        return self.counts[first:last], edges[first:last + 1]
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit value hashes (~1.6% error at p=12)."""
+
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        if len(hashes) == 0:
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64-p bits
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = ((64 - self.p) - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return raw
+
+
+class KLLSketch:
+    """Mergeable approximate quantile sketch (Karnin, Lang & Liberty)."""
+
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.levels = [np.zeros(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for i, items in enumerate(other.levels):
+            self.levels[i] = np.concatenate([self.levels[i], items])
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                items = np.sort(items)
+                # An odd item out stays at this level; the rest are halved and promoted
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantiles(self, qs):
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return [float("nan")] * len(qs)
+        weights = np.concatenate([np.full(len(lv), 2 ** i, dtype=np.float64) for i, lv in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cum = items[order], np.cumsum(weights[order])
+        idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side="left")
+        return items[np.clip(idx, 0, len(items) - 1)].tolist()
+
+
+class MisraGries:
+    """Approximate top-k frequent values; counts are underestimated by at most ``error``."""
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.counters = pd.Series(dtype=np.int64)
+        self.error = 0
+
+    def update_counts(self, counts):
+        combined = self.counters.add(counts, fill_value=0)
+        if len(combined) > self.k:
+            cut = combined.nlargest(self.k + 1).iloc[-1]
+            combined = combined - cut
+            combined = combined[combined > 0]
+            self.error += int(cut)
+        self.counters = combined.astype(np.int64)
+
+    def merge(self, other):
+        self.update_counts(other.counters)
+        self.error += other.error
+
+    def top(self, n=None):
+        return self.counters.sort_values(ascending=False).head(n or self.k)
+
+
+class PairwiseMoments:
+    """
+    Mergeable pairwise-complete sums behind a Pearson correlation matrix; gives the same
+    result as ``DataFrame.corr()`` on all rows seen. Values are shifted by the first
+    chunk's means to keep the raw sums well conditioned.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.shift = None
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))   # sum of x_i over rows where x_i and x_j are both present
+        self.sxx = np.zeros((k, k))  # sum of x_i ** 2 over the same rows
+        self.sxy = np.zeros((k, k))  # sum of x_i * x_j
+
+    def update(self, frame):
+        X = frame[self.columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        if self.shift is None:
+            with np.errstate(invalid="ignore"):
+                self.shift = np.nan_to_num(np.nanmean(X, axis=0)) if len(X) else np.zeros(len(self.columns))
+        X = X - self.shift
+        present = ~np.isnan(X)
+        mask = present.astype(np.float64)
+        X0 = np.where(present, X, 0.0)
+        self.n += mask.T @ mask
+        self.sx += X0.T @ mask
+        self.sxx += (X0 * X0).T @ mask
+        self.sxy += X0.T @ X0
+
+    def merge(self, other):
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        # Re-express the other sums around our shift: x - a = (x - b) + (b - a)
+        d = other.shift - self.shift
+        sx = other.sx + d[:, None] * other.n
+        self.sxx += other.sxx + 2 * d[:, None] * other.sx + (d ** 2)[:, None] * other.n
+        self.sxy += (other.sxy + other.sx * d[None, :] + other.sx.T * d[:, None]
+                     + other.n * np.outer(d, d))
+        self.sx += sx
+        self.n += other.n
+
+    def correlation(self):
+        n, sx, sxx = self.n, self.sx, self.sxx
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * self.sxy - sx * sx.T
+            var = (n * sxx - sx ** 2) * (n * sxx.T - sx.T ** 2)
+            corr = np.where((n > 1) & (var > 0), cov / np.sqrt(var), np.nan)
+        return pd.DataFrame(np.clip(corr, -1.0, 1.0), index=self.columns, columns=self.columns)
+
+
+class Reservoir:
+    """Uniform random sample of rows: keep the ``size`` rows with the smallest random keys."""
+
+    def __init__(self, size, seed=42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.zeros(0)
+        self.rows = None
+
+    def update(self, chunk):
+        if self.size == 0:
+            return
+        keys = self.rng.random(len(chunk))
+        if self.rows is None:
+            rows, all_keys = chunk, keys
+        else:
+            rows = pd.concat([self.rows, chunk], ignore_index=True)
+            all_keys = np.concatenate([self.keys, keys])
+        if len(all_keys) > self.size:
+            keep = np.argpartition(all_keys, self.size)[:self.size]
+            keep.sort()
+            rows, all_keys = rows.iloc[keep], all_keys[keep]
+        self.rows = rows.reset_index(drop=True)
+        self.keys = all_keys
+
+    @property
+    def sample(self):
+        return self.rows if self.rows is not None else pd.DataFrame()
+
+
+class ColumnProfile:
+    """All streaming statistics kept for one column."""
+
+    def __init__(self, name, bins=HIST_BINS, seed=0):
+        self.name = name
+        self.dtypes = set()
+        self.count = 0
+        self.nulls = 0
+        self.sample_value = None
+        self.is_numeric = True
+        self.moments = RunningMoments()
+        self.histogram = StreamingHistogram(bins)
+        self.quantiles = KLLSketch(seed=seed)
+        self.distinct = HyperLogLog()
+        self.top = MisraGries()
+
+    def update(self, series):
+        self.dtypes.add(str(series.dtype))
+        values = series.dropna()
+        self.count += len(series)
+        self.nulls += len(series) - len(values)
+        if self.sample_value is None and len(values):
+            self.sample_value = str(values.iloc[0])
+
+        numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+        if not numeric:
+            # A column is only numeric if every chunk parsed as numbers
+            self.is_numeric = False
+        if self.is_numeric:
+            arr = values.to_numpy(dtype=np.float64)
+            self.moments.update(arr)
+            self.histogram.update(arr)
+            self.quantiles.update(arr)
+            self.distinct.update_hashes(pd.util.hash_array(arr))
+        else:
+            as_str = values.astype(str)
+            self.distinct.update_hashes(pd.util.hash_array(as_str.to_numpy(dtype=object)))
+            self.top.update_counts(as_str.value_counts())
+
+    @property
+    def dtype(self):
+        if self.is_numeric:
+            if len(self.dtypes) == 1:
+                return next(iter(self.dtypes))
+            return "float64" if any("float" in d for d in self.dtypes) else "int64"
+        if self.dtypes == {"bool"}:
+            return "bool"
+        return "object"
+
+    @property
+    def non_null(self):
+        return self.count - self.nulls
+
+    def box_stats(self):
+        """Quartiles and 1.5 IQR whiskers in the dict form expected by ``Axes.bxp``."""
+        if not self.is_numeric or self.moments.n == 0:
+            return None
+        q1, med, q3 = self.quantiles.quantiles([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        return {
+            "label": self.name,
+            "q1": q1,
+            "med": med,
+            "q3": q3,
+            "whislo": max(self.moments.min, q1 - 1.5 * iqr),
+            "whishi": min(self.moments.max, q3 + 1.5 * iqr),
+            "fliers": [],
+        }
+
+
+class DatasetProfile:
+    """Result of a streaming pass; stands in for a DataFrame in summary / explanation code."""
+
+    def __init__(self, sample_size=100000, bins=HIST_BINS, seed=42, track_correlation=False):
+        self.rows = 0
+        self.memory_bytes = 0
+        self.columns = {}
+        self.bins = bins
+        self.seed = seed
+        self.reservoir = Reservoir(sample_size, seed=seed)
+        self.track_correlation = track_correlation
+        self.pairwise = None
+
+    def update(self, chunk):
+        for i, col in enumerate(chunk.columns):
+            if col not in self.columns:
+                self.columns[col] = ColumnProfile(col, bins=self.bins, seed=self.seed + i)
+            self.columns[col].update(chunk[col])
+        if self.track_correlation:
+            if self.pairwise is None:
+                numeric = [c for c, dtype in chunk.dtypes.items()
+                           if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+                self.pairwise = PairwiseMoments(numeric[:MAX_CORRELATION_COLUMNS])
+            self.pairwise.update(chunk)
+        self.rows += len(chunk)
+        self.memory_bytes += int(chunk.memory_usage(deep=True).sum())
+        self.reservoir.update(chunk)
+
+    def correlation(self):
+        """Correlation matrix over every row seen, or None when not tracked."""
+        if self.pairwise is None or len(self.pairwise.columns) < 2:
+            return None
+        return self.pairwise.correlation()
+
+    def category_counts(self, col):
+        """Top value counts of a non-numeric column with missing values as ``<<Missing>>``."""
+        p = self.columns[col]
+        counts = p.top.top().copy()
+        if p.nulls:
+            counts["<<Missing>>"] = p.nulls
+        return counts
+
+    @property
+    def sample(self):
+        return self.reservoir.sample
+
+    @property
+    def shape(self):
+        return self.rows, len(self.columns)
+
+    @property
+    def numeric_columns(self):
+        return [c for c, p in self.columns.items() if p.is_numeric]
+
+    @property
+    def categorical_columns(self):
+        return [c for c, p in self.columns.items() if not p.is_numeric]
+
+    @property
+    def missing_cells(self):
+        return sum(p.nulls for p in self.columns.values())
+
+    def summary_frame(self):
+        """Per-column table in the same layout as ``dataset_summary``."""
+        rows = []
+        for col, p in self.columns.items():
+            numeric = p.is_numeric and p.moments.n > 0
+            rows.append({
+                "column": col,
+                "dtype": p.dtype,
+                "non_null_count": p.non_null,
+                "unique_values": min(int(round(p.distinct.estimate())), p.non_null),
+                "sample_value": p.sample_value or "",
+                "mean": p.moments.mean if numeric else None,
+                "std": p.moments.std if numeric else None,
+            })
+        return pd.DataFrame(rows)
+
+
+def profile_chunks(chunks, sample_size=100000, bins=HIST_BINS, seed=42, track_correlation=False):
+    """
+    Profile any iterable of DataFrame chunks (CSV chunks, Parquet row batches, ...);
+    ``track_correlation`` also keeps the pairwise sums behind ``correlation()``.
+    """
+    profile = DatasetProfile(sample_size=sample_size, bins=bins, seed=seed, track_correlation=track_correlation)
+    for chunk in chunks:
+        profile.update(chunk)
+    return profile
+
+
+def profile_csv(path, chunksize=100000, sample_size=100000, bins=HIST_BINS, seed=42, track_correlation=False,
+                **read_kwargs):
+    """Profile a CSV in one chunked pass with memory bounded by ``chunksize`` + ``sample_size``."""
+    return profile_chunks(pd.read_csv(path, chunksize=chunksize, **read_kwargs),
+                          sample_size=sample_size, bins=bins, seed=seed, track_correlation=track_correlation)
+
+
+class FrameProfile:
+    """Exact per-column statistics of an in-memory DataFrame, built by ``profile_frame``."""
+
+    def __init__(self, rows, stats, memory_bytes, numeric_columns, categorical_columns):
+        self.rows = rows
+        self.stats = stats
+        self.memory_bytes = memory_bytes
+        self.numeric_columns = numeric_columns
+        self.categorical_columns = categorical_columns
+
+    @property
+    def columns(self):
+        return list(self.stats)
+
+    @property
+    def shape(self):
+        return self.rows, len(self.stats)
+
+    @property
+    def non_null_cells(self):
+        return sum(s["non_null_count"] for s in self.stats.values())
+
+    @property
+    def missing_cells(self):
+        return self.rows * len(self.stats) - self.non_null_cells
+
+    def summary_frame(self):
+        """Per-column table in the same layout as ``dataset_summary``."""
+        return pd.DataFrame([dict(column=col, **s) for col, s in self.stats.items()],
+                            columns=["column", "dtype", "non_null_count", "unique_values",
+                                     "sample_value", "mean", "std"])
+
+
+def _block_stats(values):
+    """
+    Count, distinct, first valid row, mean and std (ddof=1) of every column of a 2-D
+    array at once. NaN marks missing values in float blocks; other kinds have none.
+    """
+    n = values.shape[0]
+    if values.dtype.kind == "f":
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        first = valid.argmax(axis=0) if n else np.zeros(values.shape[1], dtype=np.intp)
+    else:
+        valid = None
+        count = np.full(values.shape[1], n)
+        first = np.zeros(values.shape[1], dtype=np.intp)
+
+    as_float = values.astype(np.float64, copy=False)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = (np.where(valid, as_float, 0.0) if valid is not None else as_float).sum(axis=0)
+        mean = total / count
+        dev = as_float - mean
+        if valid is not None:
+            dev[~valid] = 0.0
+        std = np.sqrt(np.einsum("ij,ij->j", dev, dev) / (count - 1))
+
+    # Distinct values from one column-wise sort: NaN sorts last, so only the first
+    # ``count`` rows of each column are compared
+    if n > 1:
+        ordered = np.sort(values, axis=0)
+        steps = ordered[1:] != ordered[:-1]
+        steps &= np.arange(n - 1)[:, None] < (count - 1)[None, :]
+        distinct = np.where(count > 0, steps.sum(axis=0) + 1, 0)
+    else:
+        distinct = np.minimum(count, 1)
+    return count, distinct, first, mean, std
+
+
+def _numeric_groups(df, dtypes, columns):
+    """Yield (positions, 2-D array) per same-dtype block of at most FRAME_BLOCK_BYTES."""
+    by_dtype = {}
+    for pos in columns:
+        by_dtype.setdefault(dtypes[pos], []).append(pos)
+    per_block = max(1, FRAME_BLOCK_BYTES // max(8 * len(df), 1))
+    for dtype, positions in by_dtype.items():
+        for start in range(0, len(positions), per_block):
+            block = positions[start:start + per_block]
+            frame = df.iloc[:, block]
+            if isinstance(dtype, np.dtype):
+                yield block, frame.to_numpy()
+            else:
+                # Nullable extension dtypes (Int64, Float64, boolean): missing -> NaN
+                yield block, frame.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _other_column_stats(series):
+    """Count, distinct and first valid row of a non-numeric column from a single factorize."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        distinct = int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))))
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        distinct = len(uniques)
+    present = codes >= 0
+    return int(present.sum()), distinct, int(present.argmax()) if len(present) else 0
+
+
+def profile_frame(df):
+    """
+    Profile a loaded DataFrame in one fused pass. Returns a FrameProfile that
+    ``dataset_summary`` and ``generate_dataset_explanation`` accept in place of ``df``.
+    """
+    dtypes = list(df.dtypes)
+    numeric_pos, other_pos = [], []
+    for pos, dtype in enumerate(dtypes):
+        (numeric_pos if pd.api.types.is_numeric_dtype(dtype) else other_pos).append(pos)
+
+    stats = [None] * df.shape[1]
+    for block, values in _numeric_groups(df, dtypes, numeric_pos):
+        count, distinct, first, mean, std = _block_stats(values)
+        native = isinstance(dtypes[block[0]], np.dtype)
+        for j, pos in enumerate(block):
+            non_null = int(count[j])
+            sample = (values[first[j], j] if native else df.iat[int(first[j]), pos]) if non_null else ""
+            stats[pos] = {
+                "dtype": str(dtypes[pos]),
+                "non_null_count": non_null,
+                "unique_values": int(distinct[j]),
+                "sample_value": str(sample),
+                "mean": float(mean[j]) if non_null else None,
+                "std": float(std[j]) if non_null else None,
+            }
+    for pos in other_pos:
+        non_null, distinct, first = _other_column_stats(df.iloc[:, pos])
+        stats[pos] = {
+            "dtype": str(dtypes[pos]),
+            "non_null_count": non_null,
+            "unique_values": distinct,
+            "sample_value": str(df.iat[first, pos]) if non_null else "",
+            "mean": None,
+            "std": None,
+        }
+
+    numeric_columns, categorical_columns = [], []
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+            if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_object_dtype(dtype) \
+                    or pd.api.types.is_string_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+                categorical_columns.append(col)
+        else:
+            numeric_columns.append(col)
+
+    return FrameProfile(
+        rows=len(df),
+        stats=dict(zip(df.columns, stats)),
+        memory_bytes=int(df.memory_usage(deep=True).sum()),
+        numeric_columns=numeric_columns,
+        categorical_columns=categorical_columns,
+    )
@@ -0,0 +1,143 @@
+"""On-disk registry of fitted segmentation / anomaly pipelines.
+
+Pipelines are keyed by the schema of the feature columns picked by
+``detect_financial_columns`` (names + dtype kinds), so uploads from the same
+source are scored by the same models and their segments and fraud flags stay
+comparable. Layout::
+
+    models/<schema_key>/v<N>.joblib   fitted bundle (scaling stats + models)
+    models/<schema_key>/v<N>.json     metadata (created, rows, engine, features)
+    models/<schema_key>/ACTIVE        version used for scoring
+    models/GENERATION                 bumped on refit / activate (part of cache keys)
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_KEY_RE = re.compile(r"^[0-9a-f]{16}$")
+VERSION_RE = re.compile(r"^v(\d+)\.joblib$")
+
+
+def schema_key(df, features):
+    """Stable key for a feature set: column names plus their dtype kinds."""
+    signature = [[str(col), df[col].dtype.kind] for col in features]
+    blob = json.dumps(signature, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class ModelRegistry:
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _dir(self, key):
+        if not SCHEMA_KEY_RE.match(key or ""):
+            raise ValueError(f"Invalid schema key: {key!r}")
+        return os.path.join(self.folder, key)
+
+    def _write(self, path, text):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            fh.write(text)
+        os.replace(tmp, path)
+
+    def generation(self):
+        try:
+            with open(os.path.join(self.folder, "GENERATION")) as fh:
+                return int(fh.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_generation(self):
+        self._write(os.path.join(self.folder, "GENERATION"), str(self.generation() + 1))
+
+    def versions(self, key):
+        folder = self._dir(key)
+        if not os.path.isdir(folder):
+            return []
+        found = (VERSION_RE.match(name) for name in os.listdir(folder))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def active_version(self, key):
+        try:
+            with open(os.path.join(self._dir(key), "ACTIVE")) as fh:
+                return int(fh.read().strip())
+        except (FileNotFoundError, ValueError):
+            versions = self.versions(key)
+            return versions[-1] if versions else None
+
+    def load(self, key, version=None):
+        """Return the fitted bundle for ``key`` (active version by default) or None."""
+        version = version or self.active_version(key)
+        if version is None:
+            return None
+        try:
+            return joblib.load(os.path.join(self._dir(key), f"v{version}.joblib"))
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, bundle, meta, activate=True):
+        """Store ``bundle`` as the next version of ``key`` and return its version number."""
+        folder = self._dir(key)
+        os.makedirs(folder, exist_ok=True)
+        version = (self.versions(key) or [0])[-1] + 1
+        while True:
+            # Claim the version number atomically; another worker may be saving concurrently
+            try:
+                fd = os.open(os.path.join(folder, f"v{version}.json"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                version += 1
+        meta = dict(meta, version=version, created=time.time(), schema_key=key)
+        with os.fdopen(fd, "w") as fh:
+            json.dump(meta, fh)
+        tmp = os.path.join(folder, f"v{version}.joblib.{os.getpid()}.tmp")
+        joblib.dump(bundle, tmp)
+        os.replace(tmp, os.path.join(folder, f"v{version}.joblib"))
+        if activate:
+            self._write(os.path.join(folder, "ACTIVE"), str(version))
+        logger.info("Saved model %s v%d", key, version)
+        return version
+
+    def activate(self, key, version):
+        if version not in self.versions(key):
+            raise KeyError(f"Model {key} has no version {version}")
+        self._write(os.path.join(self._dir(key), "ACTIVE"), str(version))
+        self._bump_generation()
+
+    def request_refit(self, key):
+        """Make the next analysis with this schema fit a new version instead of scoring."""
+        self._write(os.path.join(self._dir(key), "REFIT"), "1")
+        self._bump_generation()
+
+    def refit_requested(self, key):
+        return os.path.exists(os.path.join(self._dir(key), "REFIT"))
+
+    def clear_refit(self, key):
+        try:
+            os.remove(os.path.join(self._dir(key), "REFIT"))
+        except FileNotFoundError:
+            pass
+
+    def describe(self, key):
+        folder = self._dir(key)
+        versions = []
+        for v in self.versions(key):
+            try:
+                with open(os.path.join(folder, f"v{v}.json")) as fh:
+                    versions.append(json.load(fh))
+            except (FileNotFoundError, ValueError):
+                versions.append({"version": v})
+        return {"schema_key": key, "active": self.active_version(key),
+                "refit_requested": self.refit_requested(key), "versions": versions}
+
+    def keys(self):
+        return sorted(name for name in os.listdir(self.folder)
+                      if SCHEMA_KEY_RE.match(name) and os.path.isdir(os.path.join(self.folder, name)))
@@ -0,0 +1,200 @@
+"""Column role inference for the ML stage.
+
+Every numeric column gets one role from its name and a few cheap value
+statistics, computed on an evenly spaced sample of rows as 2-D NumPy
+reductions over column blocks (no per-value Python loops):
+
+* ``constant``: at most one distinct value
+* ``id``: integers that are (nearly) all distinct and either strictly
+  increasing, named like an identifier, or spread uniformly over their range
+  (random account / customer numbers)
+* ``calendar``: year / month / day / weekday / hour parts (see datetimes.py)
+* ``currency``: named like an amount (``FINANCIAL_KEYWORDS``), or non-integer
+  values that almost all have at most two decimals
+* ``numeric``: everything else
+
+``select_features`` keeps the currency columns, falling back to the plain
+numeric and then the calendar ones, so KMeans / IsolationForest never fit on
+IDs or constants. Roles depend only on the columns' names and dtype kinds
+once inferred: ``SchemaInference`` caches them per column signature (in
+memory and as JSON files), so repeat uploads from the same source skip
+inference and keep the same feature set (and model registry schema key).
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from profiler import FRAME_BLOCK_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rules change so cached roles are re-inferred
+INFERENCE_VERSION = 1
+SAMPLE_ROWS = 50000
+NEAR_UNIQUE_RATIO = 0.95
+# Largest gap between sorted values and an even spread over [min, max] still called uniform
+UNIFORM_MAX_DISTANCE = 0.1
+CENTS_RATIO = 0.99
+# Fewer sampled values than this never make an ID (every tiny column is "unique")
+MIN_ID_ROWS = 20
+ROLES = ("constant", "id", "calendar", "currency", "numeric")
+FEATURE_ROLES = ("currency", "numeric", "calendar")
+
+FINANCIAL_KEYWORDS = ("amount", "balance", "price", "cost", "revenue", "expense", "profit", "salary", "income",
+                      "transaction", "amt", "fee", "payment", "total", "value", "spend", "loan", "credit", "debit")
+ID_TOKENS = {"id", "uuid", "guid", "key", "index", "idx", "no", "num", "number", "code", "zip", "phone"}
+NAME_TOKEN_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+CALENDAR_RANGES = {"year": (1000, 9999), "month": (1, 12), "day": (1, 31), "weekday": (0, 6), "hour": (0, 23)}
+CALENDAR_RE = re.compile(r"_(year|month|day|weekday|hour)$")
+
+
+def column_signature(df):
+    """Key of a frame's layout: column names plus dtype kinds."""
+    layout = [[str(col), dtype.kind] for col, dtype in df.dtypes.items()]
+    blob = json.dumps([INFERENCE_VERSION, layout], separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:32]
+
+
+def _id_name(name):
+    """``customer_id``, ``CustomerID``, ``account no``, ``id_hash``...; but not ``paid``."""
+    tokens = [t.lower() for t in NAME_TOKEN_RE.findall(str(name))]
+    return bool(tokens) and (tokens[-1] in ID_TOKENS or tokens[0] == "id")
+
+
+def _numeric_columns(df):
+    return [col for col, dtype in df.dtypes.items()
+            if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+
+
+def _sample_positions(n, size):
+    # Evenly spaced and in row order, so increasing columns stay increasing
+    return np.unique(np.linspace(0, n - 1, min(n, size)).astype(np.int64)) if n else np.empty(0, np.int64)
+
+
+def _block_stats(block):
+    """Per-column statistics of a 2-D float64 block (NaN = missing)."""
+    valid = ~np.isnan(block)
+    n = valid.sum(axis=0)
+    filled = np.where(valid, block, 0.0)
+    with np.errstate(invalid="ignore"):
+        integer = (np.where(valid, filled == np.round(filled), True)).all(axis=0)
+        scaled = filled * 100
+        cents = np.where(valid, np.abs(scaled - np.round(scaled)) <= 1e-6 * np.maximum(1, np.abs(scaled)), False)
+        cents_share = cents.sum(axis=0) / np.maximum(n, 1)
+        steps = np.diff(block, axis=0)
+        increasing = np.where(np.isnan(steps), True, steps > 0).all(axis=0)
+    # NaN sorts last, so the first n[j] sorted values of column j are its valid ones
+    ordered = np.sort(block, axis=0)
+    rows = np.arange(len(block))[:, None]
+    inside = rows < n
+    distinct = ((np.diff(ordered, axis=0) != 0) & inside[1:]).sum(axis=0) + (n > 0)
+    low = np.where(n > 0, ordered[0], 0.0)
+    high = np.where(n > 0, ordered[np.maximum(n - 1, 0), np.arange(block.shape[1])], 0.0)
+    span = np.where(high > low, high - low, 1.0)
+    # Largest distance between the sorted values and an even spread over [low, high]
+    expected = (rows + 0.5) / np.maximum(n, 1)
+    spread = np.where(inside, np.abs((ordered - low) / span - expected), 0.0).max(axis=0, initial=0.0)
+    return {"n": n, "distinct": distinct, "integer": integer, "cents": cents_share, "increasing": increasing,
+            "low": low, "high": high, "spread": spread}
+
+
+def _role(name, stats, j):
+    n, distinct = int(stats["n"][j]), int(stats["distinct"][j])
+    lowered = str(name).lower()
+    financial = any(keyword in lowered for keyword in FINANCIAL_KEYWORDS)
+    if distinct <= 1:
+        return "constant"
+    calendar = CALENDAR_RE.search(lowered)
+    if calendar:
+        low, high = CALENDAR_RANGES[calendar.group(1)]
+        if low <= stats["low"][j] and stats["high"][j] <= high:
+            return "calendar"
+    near_unique = n >= MIN_ID_ROWS and distinct >= NEAR_UNIQUE_RATIO * n
+    if near_unique and _id_name(name):
+        # transaction_id, payment_no: the name's last word beats the financial keyword
+        return "id"
+    if near_unique and stats["integer"][j] and not financial and \
+            (stats["increasing"][j] or stats["spread"][j] <= UNIFORM_MAX_DISTANCE):
+        return "id"
+    if financial or (not stats["integer"][j] and stats["cents"][j] >= CENTS_RATIO):
+        return "currency"
+    return "numeric"
+
+
+def infer_roles(df, sample_rows=SAMPLE_ROWS):
+    """{column: role} for every numeric column of ``df`` (see the module docstring)."""
+    columns = _numeric_columns(df)
+    positions = _sample_positions(len(df), sample_rows)
+    roles = {}
+    per_block = max(1, FRAME_BLOCK_BYTES // max(8 * len(positions), 1))
+    for start in range(0, len(columns), per_block):
+        names = columns[start:start + per_block]
+        block = df[names].iloc[positions].to_numpy(dtype=np.float64, na_value=np.nan)
+        stats = _block_stats(block)
+        roles.update((name, _role(name, stats, j)) for j, name in enumerate(names))
+    return roles
+
+
+def select_features(roles):
+    """Currency columns, else plain numeric, else calendar ones; never IDs or constants."""
+    for role in FEATURE_ROLES:
+        features = [col for col, r in roles.items() if r == role]
+        if features:
+            return features
+    return []
+
+
+class SchemaInference:
+    """``infer_roles`` memoized per column signature, in memory and under ``folder``."""
+
+    def __init__(self, folder=None, sample_rows=SAMPLE_ROWS):
+        self.folder = folder
+        self.sample_rows = sample_rows
+        self._memory = {}
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def _path(self, signature):
+        return os.path.join(self.folder, f"{signature}.json")
+
+    def _load(self, signature, df):
+        if not self.folder:
+            return None
+        try:
+            with open(self._path(signature)) as fh:
+                stored = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        # Stored in column order (JSON keys would turn every column name into a string)
+        columns = _numeric_columns(df)
+        return dict(zip(columns, stored)) if len(stored) == len(columns) else None
+
+    def _store(self, signature, roles):
+        tmp = f"{self._path(signature)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(list(roles.values()), fh)
+        os.replace(tmp, self._path(signature))
+
+    def roles(self, df):
+        """{column: role} for the numeric columns of ``df``, inferred once per layout."""
+        signature = column_signature(df)
+        roles = self._memory.get(signature)
+        if roles is None:
+            roles = self._load(signature, df)
+        if roles is None:
+            roles = infer_roles(df, self.sample_rows)
+            if self.folder:
+                try:
+                    self._store(signature, roles)
+                except OSError as e:
+                    logger.warning("Could not cache column roles: %s", e)
+        self._memory[signature] = roles
+        return roles
+
+    def features(self, df):
+        return select_features(self.roles(df))
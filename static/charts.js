@@ -0,0 +1,272 @@
+/*
+ * Minimal canvas chart renderer for the JSON chart specs produced by
+ * plots.chart_spec(). Bundled with the app so no CDN or build step is needed.
+ *
+ * Usage: DataCharts.load(url, container) fetches {charts: [...]} and appends
+ * one card with a <canvas> per spec.
+ */
+(function (global) {
+  'use strict';
+
+  const PALETTE = ['#4c72b0', '#dd8452', '#55a868', '#c44e52', '#8172b3', '#937860', '#da8bc3', '#8c8c8c', '#ccb974', '#64b5cd'];
+  const VIRIDIS = ['#440154', '#3b528b', '#21918c', '#5ec962', '#fde725'];
+  const PAD = { top: 36, right: 16, bottom: 40, left: 56 };
+
+  function extent(values) {
+    let lo = Infinity, hi = -Infinity;
+    for (const v of values) {
+      if (v === null) continue;
+      if (v < lo) lo = v;
+      if (v > hi) hi = v;
+    }
+    if (lo === hi) { lo -= 1; hi += 1; }
+    return [lo, hi];
+  }
+
+  function fmt(v) {
+    const a = Math.abs(v);
+    if (a >= 1e6) return (v / 1e6).toFixed(1) + 'M';
+    if (a >= 1e3) return (v / 1e3).toFixed(1) + 'k';
+    if (a >= 10 || v === 0) return v.toFixed(0);
+    return v.toPrecision(2);
+  }
+
+  function setup(canvas, width, height) {
+    const ratio = global.devicePixelRatio || 1;
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+    canvas.style.width = '100%';
+    canvas.style.maxWidth = width + 'px';
+    const ctx = canvas.getContext('2d');
+    ctx.scale(ratio, ratio);
+    ctx.font = '12px sans-serif';
+    return ctx;
+  }
+
+  function title(ctx, spec, width) {
+    ctx.save();
+    ctx.font = '14px sans-serif';
+    ctx.fillStyle = '#0f172a';
+    ctx.textAlign = 'center';
+    ctx.fillText(spec.title, width / 2, 20);
+    ctx.restore();
+  }
+
+  // Linear axes over the plot area; returns coordinate transforms.
+  function axes(ctx, width, height, xr, yr, xlabel, ylabel) {
+    const x0 = PAD.left, x1 = width - PAD.right, y0 = height - PAD.bottom, y1 = PAD.top;
+    const sx = v => x0 + (v - xr[0]) / (xr[1] - xr[0]) * (x1 - x0);
+    const sy = v => y0 - (v - yr[0]) / (yr[1] - yr[0]) * (y0 - y1);
+    ctx.strokeStyle = '#e2e8f0';
+    ctx.fillStyle = '#64748b';
+    for (let i = 0; i <= 4; i++) {
+      const xv = xr[0] + (xr[1] - xr[0]) * i / 4, yv = yr[0] + (yr[1] - yr[0]) * i / 4;
+      ctx.beginPath(); ctx.moveTo(sx(xv), y0); ctx.lineTo(sx(xv), y1); ctx.stroke();
+      ctx.beginPath(); ctx.moveTo(x0, sy(yv)); ctx.lineTo(x1, sy(yv)); ctx.stroke();
+      ctx.textAlign = 'center'; ctx.fillText(fmt(xv), sx(xv), y0 + 14);
+      ctx.textAlign = 'right'; ctx.fillText(fmt(yv), x0 - 4, sy(yv) + 4);
+    }
+    ctx.textAlign = 'center';
+    if (xlabel) ctx.fillText(xlabel, (x0 + x1) / 2, height - 8);
+    if (ylabel) {
+      ctx.save(); ctx.translate(12, (y0 + y1) / 2); ctx.rotate(-Math.PI / 2); ctx.fillText(ylabel, 0, 0); ctx.restore();
+    }
+    return { sx, sy, x0, x1, y0, y1 };
+  }
+
+  function drawHist(ctx, spec, w, h) {
+    const maxCount = Math.max(...spec.counts, ...(spec.kde ? spec.kde.y : [0]));
+    const a = axes(ctx, w, h, [spec.edges[0], spec.edges[spec.edges.length - 1]], [0, maxCount * 1.05], spec.column, 'Count');
+    ctx.fillStyle = 'rgba(76, 114, 176, 0.6)';
+    ctx.strokeStyle = PALETTE[0];
+    spec.counts.forEach((c, i) => {
+      const x = a.sx(spec.edges[i]), xe = a.sx(spec.edges[i + 1]);
+      ctx.fillRect(x, a.sy(c), xe - x, a.y0 - a.sy(c));
+      ctx.strokeRect(x, a.sy(c), xe - x, a.y0 - a.sy(c));
+    });
+    if (spec.kde) {
+      ctx.beginPath();
+      spec.kde.x.forEach((x, i) => (i ? ctx.lineTo : ctx.moveTo).call(ctx, a.sx(x), a.sy(spec.kde.y[i])));
+      ctx.lineWidth = 1.5; ctx.stroke(); ctx.lineWidth = 1;
+    }
+  }
+
+  function drawBox(ctx, spec, w, h) {
+    const xr = extent([spec.whislo, spec.whishi, ...spec.fliers]);
+    const a = axes(ctx, w, h, xr, [0, 1], spec.column, null);
+    const ym = a.sy(0.5), half = (a.y0 - a.y1) * 0.2;
+    ctx.strokeStyle = '#334155';
+    ctx.fillStyle = 'rgba(76, 114, 176, 0.8)';
+    ctx.fillRect(a.sx(spec.q1), ym - half, a.sx(spec.q3) - a.sx(spec.q1), 2 * half);
+    ctx.strokeRect(a.sx(spec.q1), ym - half, a.sx(spec.q3) - a.sx(spec.q1), 2 * half);
+    ctx.beginPath();
+    ctx.moveTo(a.sx(spec.med), ym - half); ctx.lineTo(a.sx(spec.med), ym + half);
+    ctx.moveTo(a.sx(spec.whislo), ym); ctx.lineTo(a.sx(spec.q1), ym);
+    ctx.moveTo(a.sx(spec.q3), ym); ctx.lineTo(a.sx(spec.whishi), ym);
+    ctx.moveTo(a.sx(spec.whislo), ym - half / 2); ctx.lineTo(a.sx(spec.whislo), ym + half / 2);
+    ctx.moveTo(a.sx(spec.whishi), ym - half / 2); ctx.lineTo(a.sx(spec.whishi), ym + half / 2);
+    ctx.stroke();
+    spec.fliers.forEach(f => { ctx.beginPath(); ctx.arc(a.sx(f), ym, 3, 0, 2 * Math.PI); ctx.stroke(); });
+  }
+
+  function drawPie(ctx, spec, w, h) {
+    const total = spec.values.reduce((s, v) => s + v, 0);
+    const cx = w / 2, cy = (h + PAD.top) / 2, r = Math.min(w, h - PAD.top) / 2 - 40;
+    let angle = -Math.PI / 2;
+    spec.values.forEach((v, i) => {
+      const slice = v / total * 2 * Math.PI, mid = angle + slice / 2;
+      ctx.beginPath(); ctx.moveTo(cx, cy); ctx.arc(cx, cy, r, angle, angle + slice); ctx.closePath();
+      ctx.fillStyle = PALETTE[i % PALETTE.length]; ctx.fill();
+      ctx.fillStyle = '#fff'; ctx.textAlign = 'center';
+      ctx.fillText((v / total * 100).toFixed(1) + '%', cx + Math.cos(mid) * r * 0.6, cy + Math.sin(mid) * r * 0.6);
+      ctx.fillStyle = '#334155';
+      ctx.fillText(spec.labels[i], cx + Math.cos(mid) * (r + 20), cy + Math.sin(mid) * (r + 20));
+      angle += slice;
+    });
+  }
+
+  function drawBar(ctx, spec, w, h) {
+    const left = 120, maxV = Math.max(...spec.values);
+    const rowH = (h - PAD.top - PAD.bottom) / spec.values.length;
+    ctx.textAlign = 'right';
+    spec.values.forEach((v, i) => {
+      const y = PAD.top + i * rowH;
+      ctx.fillStyle = PALETTE[i % PALETTE.length];
+      ctx.fillRect(left, y + rowH * 0.1, (w - left - PAD.right) * v / maxV, rowH * 0.8);
+      ctx.fillStyle = '#334155';
+      ctx.fillText(spec.labels[i].slice(0, 18), left - 6, y + rowH / 2 + 4);
+    });
+    ctx.textAlign = 'center'; ctx.fillStyle = '#64748b';
+    ctx.fillText(fmt(maxV), w - PAD.right, h - PAD.bottom + 14);
+  }
+
+  function diverging(v) {
+    // coolwarm-like: blue (-1) -> white (0) -> red (+1)
+    const t = Math.max(-1, Math.min(1, v === null ? 0 : v));
+    const c = t < 0 ? [59, 76, 192] : [180, 4, 38];
+    const k = Math.abs(t);
+    return `rgb(${Math.round(255 + (c[0] - 255) * k)},${Math.round(255 + (c[1] - 255) * k)},${Math.round(255 + (c[2] - 255) * k)})`;
+  }
+
+  function drawCorr(ctx, spec, w, h) {
+    const n = spec.labels.length, left = 100, top = PAD.top;
+    const cell = Math.min((w - left - PAD.right) / n, (h - top - 80) / n);
+    spec.matrix.forEach((row, i) => row.forEach((v, j) => {
+      ctx.fillStyle = diverging(v);
+      ctx.fillRect(left + j * cell, top + i * cell, cell, cell);
+      if (n <= 12) {
+        ctx.fillStyle = Math.abs(v) > 0.6 ? '#fff' : '#0f172a'; ctx.textAlign = 'center';
+        ctx.fillText(v === null ? '' : v.toFixed(2), left + (j + 0.5) * cell, top + (i + 0.5) * cell + 4);
+      }
+    }));
+    ctx.fillStyle = '#334155';
+    spec.labels.forEach((label, i) => {
+      ctx.textAlign = 'right';
+      ctx.fillText(label.slice(0, 14), left - 4, top + (i + 0.5) * cell + 4);
+      ctx.save(); ctx.translate(left + (i + 0.5) * cell, top + n * cell + 6); ctx.rotate(-Math.PI / 4);
+      ctx.fillText(label.slice(0, 14), 0, 0); ctx.restore();
+    });
+  }
+
+  function drawPoints(ctx, a, xs, ys, colorOf, radius) {
+    xs.forEach((x, i) => {
+      ctx.fillStyle = colorOf(i);
+      ctx.beginPath(); ctx.arc(a.sx(x), a.sy(ys[i]), radius, 0, 2 * Math.PI); ctx.fill();
+    });
+  }
+
+  function drawSegmentation(ctx, spec, w, h) {
+    const k = Math.max(...spec.segments) || 1;
+    const color = s => VIRIDIS[Math.round(s / k * (VIRIDIS.length - 1))];
+    if (spec.density) {
+      // Per-segment density: each cell takes its main segment's color, opacity follows the log count
+      const a = axes(ctx, w, h, extent(spec.xedges), extent(spec.yedges), 'Principal Component 1', 'Principal Component 2');
+      const maxC = Math.log1p(Math.max(...spec.density.map(r => Math.max(...r))));
+      spec.density.forEach((row, j) => row.forEach((c, i) => {
+        if (!c) return;
+        ctx.globalAlpha = 0.15 + 0.85 * Math.log1p(c) / maxC;
+        ctx.fillStyle = color(spec.dominant[j][i]);
+        const x = a.sx(spec.xedges[i]), y = a.sy(spec.yedges[j + 1]);
+        ctx.fillRect(x, y, a.sx(spec.xedges[i + 1]) - x + 0.5, a.sy(spec.yedges[j]) - y + 0.5);
+      }));
+      ctx.globalAlpha = 1;
+      ctx.textAlign = 'left';
+      spec.segments.forEach((s, i) => {
+        ctx.fillStyle = color(s); ctx.fillRect(w - 80, PAD.top + 4 + i * 16, 10, 10);
+        ctx.fillStyle = '#334155'; ctx.fillText('Segment ' + s, w - 66, PAD.top + 13 + i * 16);
+      });
+      ctx.fillStyle = '#94a3b8'; ctx.textAlign = 'right';
+      ctx.fillText(`Density of ${spec.total.toLocaleString()} points`, a.x1, a.y0 - 6);
+      return;
+    }
+    const a = axes(ctx, w, h, extent(spec.x), extent(spec.y), 'Principal Component 1', 'Principal Component 2');
+    ctx.globalAlpha = 0.7;
+    drawPoints(ctx, a, spec.x, spec.y, i => color(spec.segments[i]), 3);
+    ctx.globalAlpha = 1;
+  }
+
+  function drawFraud(ctx, spec, w, h) {
+    if (spec.density) {
+      const xr = extent([...spec.xedges, ...spec.flagged_x]), yr = extent([...spec.yedges, ...spec.flagged_y]);
+      const a = axes(ctx, w, h, xr, yr, 'Principal Component 1', 'Principal Component 2');
+      const maxC = Math.log1p(Math.max(...spec.density.map(r => Math.max(...r))));
+      spec.density.forEach((row, j) => row.forEach((c, i) => {
+        if (!c) return;
+        ctx.fillStyle = `rgba(33, 102, 172, ${0.15 + 0.85 * Math.log1p(c) / maxC})`;
+        const x = a.sx(spec.xedges[i]), y = a.sy(spec.yedges[j + 1]);
+        ctx.fillRect(x, y, a.sx(spec.xedges[i + 1]) - x + 0.5, a.sy(spec.yedges[j]) - y + 0.5);
+      }));
+      ctx.globalAlpha = 0.6;
+      drawPoints(ctx, a, spec.flagged_x, spec.flagged_y, () => 'red', 4);
+    } else {
+      const a = axes(ctx, w, h, extent(spec.x), extent(spec.y), 'Principal Component 1', 'Principal Component 2');
+      ctx.globalAlpha = 0.6;
+      drawPoints(ctx, a, spec.x, spec.y, i => (spec.flags[i] ? 'red' : 'blue'), 4);
+    }
+    ctx.globalAlpha = 1;
+    ctx.textAlign = 'left';
+    [['blue', 'Normal'], ['red', 'Potential Fraud']].forEach(([color, label], i) => {
+      ctx.fillStyle = color; ctx.beginPath(); ctx.arc(w - 130, PAD.top + 10 + i * 16, 5, 0, 2 * Math.PI); ctx.fill();
+      ctx.fillStyle = '#334155'; ctx.fillText(label, w - 120, PAD.top + 14 + i * 16);
+    });
+  }
+
+  const RENDERERS = {
+    hist: [drawHist, 480, 320],
+    box: [drawBox, 480, 240],
+    pie: [drawPie, 400, 400],
+    bar: [drawBar, 640, 320],
+    corr: [drawCorr, 640, 480],
+    segmentation: [drawSegmentation, 640, 480],
+    fraud: [drawFraud, 640, 480],
+  };
+
+  function render(spec, container) {
+    const entry = RENDERERS[spec.type];
+    if (!entry) return;
+    const [draw, width, height] = entry;
+    const card = document.createElement('div');
+    card.className = 'plot-card';
+    const canvas = document.createElement('canvas');
+    canvas.setAttribute('role', 'img');
+    canvas.setAttribute('aria-label', spec.title);
+    card.appendChild(canvas);
+    container.appendChild(card);
+    const ctx = setup(canvas, width, height);
+    title(ctx, spec, width);
+    try {
+      draw(ctx, spec, width, height);
+    } catch (e) {
+      // Keep one bad chart from breaking the rest, like the server-side renderer does
+      console.error('Failed to draw chart', spec.name, e);
+    }
+  }
+
+  function load(url, container) {
+    return fetch(url)
+      .then(response => response.json())
+      .then(data => (data.charts || []).forEach(spec => render(spec, container)));
+  }
+
+  global.DataCharts = { load, render };
+})(window);
@@ -0,0 +1,109 @@
+/*
+ * Paginated row explorer for a finished analysis, backed by
+ * GET /results/<job_id>/rows. Sorting, filtering and paging all run on the
+ * server; the page only ever holds one page of rows.
+ *
+ * Usage: DataExplorer.mount(url, container, {segments: [0, 1, 2], anomalies: true})
+ * Click a column header to sort (again to reverse).
+ */
+(function (global) {
+  'use strict';
+
+  const PAGE_ROWS = 50;
+
+  function el(tag, attrs, text) {
+    const node = document.createElement(tag);
+    Object.entries(attrs || {}).forEach(([k, v]) => node.setAttribute(k, v));
+    if (text !== undefined) node.textContent = text;
+    return node;
+  }
+
+  function cell(value) {
+    if (value === null) return '';
+    if (typeof value === 'number' && !Number.isInteger(value)) return value.toFixed(3);
+    return String(value);
+  }
+
+  function mount(url, container, options) {
+    const opts = options || {};
+    const state = { sort: null, order: 'asc', filter: '', offset: 0 };
+
+    const controls = el('div', { class: 'explorer-controls', style: 'display: flex; gap: 1rem; align-items: center; flex-wrap: wrap;' });
+    const filter = el('select', { 'aria-label': 'Filter rows' });
+    filter.appendChild(el('option', { value: '' }, 'All rows'));
+    if (opts.anomalies) filter.appendChild(el('option', { value: 'anomalies=1' }, 'Anomalies only'));
+    (opts.segments || []).forEach(s => filter.appendChild(el('option', { value: 'segment=' + s }, 'Segment ' + s)));
+    const prev = el('button', { type: 'button', class: 'btn' }, '‹ Prev');
+    const next = el('button', { type: 'button', class: 'btn' }, 'Next ›');
+    const info = el('span', { style: 'color: var(--text-secondary);' });
+    controls.append(filter, prev, next, info);
+
+    const wrapper = el('div', { class: 'table-wrapper' });
+    const table = el('table', { class: 'table-sample' });
+    wrapper.appendChild(table);
+    container.append(controls, wrapper);
+
+    function query() {
+      const params = new URLSearchParams({ offset: state.offset, limit: PAGE_ROWS });
+      if (state.sort) {
+        params.set('sort', state.sort);
+        params.set('order', state.order);
+      }
+      if (state.filter) {
+        const [key, value] = state.filter.split('=');
+        params.set(key, value);
+      }
+      return url + '?' + params.toString();
+    }
+
+    function draw(data) {
+      table.replaceChildren();
+      const head = el('tr');
+      data.columns.forEach(col => {
+        const arrow = state.sort === col ? (state.order === 'asc' ? ' ▲' : ' ▼') : '';
+        const th = el('th', { style: 'cursor: pointer;' }, col + arrow);
+        th.addEventListener('click', () => {
+          state.order = state.sort === col && state.order === 'asc' ? 'desc' : 'asc';
+          state.sort = col;
+          state.offset = 0;
+          load();
+        });
+        head.appendChild(th);
+      });
+      const thead = el('thead');
+      thead.appendChild(head);
+      const tbody = el('tbody');
+      data.rows.forEach(row => {
+        const tr = el('tr');
+        row.forEach(v => tr.appendChild(el('td', {}, cell(v))));
+        tbody.appendChild(tr);
+      });
+      table.append(thead, tbody);
+
+      const last = Math.min(data.offset + data.rows.length, data.total);
+      info.textContent = data.total
+        ? `Rows ${(data.offset + 1).toLocaleString()}–${last.toLocaleString()} of ${data.total.toLocaleString()}` +
+          (data.sample ? ' (sample)' : '')
+        : 'No matching rows';
+      prev.disabled = data.offset === 0;
+      next.disabled = last >= data.total;
+    }
+
+    function load() {
+      return fetch(query())
+        .then(response => response.json().then(data => {
+          if (!response.ok) throw new Error(data.error || response.statusText);
+          return data;
+        }))
+        .then(draw)
+        .catch(e => { info.textContent = e.message; });
+    }
+
+    filter.addEventListener('change', () => { state.filter = filter.value; state.offset = 0; load(); });
+    prev.addEventListener('click', () => { state.offset = Math.max(0, state.offset - PAGE_ROWS); load(); });
+    next.addEventListener('click', () => { state.offset += PAGE_ROWS; load(); });
+    return load();
+  }
+
+  global.DataExplorer = { mount };
+})(window);
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from cleaning import clean_frame
+
+
+def test_impute_rounds_fractional_fill_for_nullable_integers():
+    df = pd.DataFrame({"count": pd.array([1, 2, None], dtype="Int64"),
+                       "amount": [1.0, 2.0, None]})
+    for policy in ("impute", {"count": "mean", "amount": "mean"}):
+        out, report = clean_frame(df, policy)
+        assert out["count"].dtype == "Int64"
+        assert out["count"].tolist() == [1, 2, 2]
+        assert out["amount"].tolist() == [1.0, 2.0, 1.5]
+        assert report["imputed"] == {"count": 1, "amount": 1}
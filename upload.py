@@ -0,0 +1,376 @@
+"""Streaming CSV uploads: validate, hash and store the body while it arrives.
+
+``StreamingUploadRequest`` hands Werkzeug's multipart parser a ``CsvUploadSink``
+instead of a spooled temporary file, so each chunk of the request body is
+processed as soon as it is parsed:
+
+* gzip bodies are inflated on the fly; zip archives are unpacked once complete
+  (their member index sits at the end of the archive)
+* the first block is sniffed for encoding, delimiter and header, and anything
+  that is not delimited text (binary, spreadsheets, HTML, JSON) is rejected
+  before the rest of the body is read
+* non-UTF-8 text is transcoded to UTF-8, so every reader downstream sees one encoding
+* the stored bytes are hashed (SHA-256) and their rows counted as they are written
+
+The sniffed format is kept in a ``<name>.csv.meta.json`` sidecar that the
+readers in app.py / ingest.py pick up through ``csv_format()``, and the hash lets
+``upload_digest()`` skip re-reading the file for the result cache key.
+"""
+import io
+import os
+import csv
+import json
+import uuid
+import zlib
+import codecs
+import hashlib
+import logging
+import zipfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import BadRequest
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = ",;\t|"
+COMPRESSED_EXTENSIONS = {"gz", "zip"}
+# Share of sniffed rows that must have as many fields as the header
+MIN_CONSISTENT_ROWS = 0.9
+
+_BINARY_SIGNATURES = {
+    b"%PDF": "a PDF document",
+    b"\x89PNG": "a PNG image",
+    b"\xff\xd8\xff": "a JPEG image",
+    b"\xd0\xcf\x11\xe0": "an Excel/Office document",
+    b"PK\x03\x04": "a zip archive (e.g. an .xlsx workbook)",
+}
+
+
+class UploadRejected(BadRequest):
+    """Raised while streaming when the body cannot be a CSV; ``description`` says why."""
+    code = 415
+
+
+class UploadTooLarge(UploadRejected):
+    code = 413
+
+
+def is_csv_upload(filename):
+    """``.csv``, ``.csv.gz`` / ``.gz`` and ``.zip`` uploads go through the streaming sink."""
+    name = (filename or "").lower()
+    return name.endswith(".csv") or name.rsplit(".", 1)[-1] in COMPRESSED_EXTENSIONS
+
+
+def stored_name(filename):
+    """Name of the extracted CSV for an upload name: strips .gz / .zip and ensures .csv."""
+    base = filename
+    while base.rsplit(".", 1)[-1].lower() in COMPRESSED_EXTENSIONS and "." in base:
+        base = base.rsplit(".", 1)[0]
+    if not base.lower().endswith(".csv"):
+        base = os.path.splitext(base)[0] + ".csv"
+    return base
+
+
+def meta_path(csv_path):
+    return csv_path + ".meta.json"
+
+
+def columnar_path(csv_path):
+    """Where ingest.py keeps the typed Parquet copy of an upload."""
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def columnar_lock_path(csv_path):
+    """Lock file that serializes conversions of one upload (see ingest.ensure_columnar)."""
+    return columnar_path(csv_path) + ".lock"
+
+
+def csv_format(csv_path):
+    """Sniffed upload metadata for ``csv_path`` (delimiter, header, columns, ...) or None."""
+    try:
+        with open(meta_path(csv_path)) as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def pandas_read_kwargs(csv_path):
+    """Extra ``pd.read_csv`` arguments for a sniffed upload (non-comma delimiter, no header)."""
+    meta = csv_format(csv_path)
+    if not meta:
+        return {}
+    kwargs = {}
+    if meta["delimiter"] != ",":
+        kwargs["sep"] = meta["delimiter"]
+    if not meta["header"]:
+        kwargs.update(header=None, names=meta["columns"])
+    return kwargs
+
+
+def upload_digest(csv_path):
+    """SHA-256 recorded while the upload streamed in, if the file is unchanged since."""
+    meta = csv_format(csv_path)
+    if meta and meta.get("size") == os.path.getsize(csv_path):
+        return meta["sha256"]
+    return None
+
+
+def _detect_encoding(block):
+    if block.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if block.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Not final: a multi-byte character may be cut at the end of the block
+        codecs.getincrementaldecoder("utf-8")().decode(block, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        block.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _sniff(block, final):
+    """Validate the first block of decompressed data and return its format dict."""
+    for signature, kind in _BINARY_SIGNATURES.items():
+        if block.startswith(signature):
+            raise UploadRejected(f"The file looks like {kind}, not a CSV.")
+    encoding = _detect_encoding(block)
+    if encoding != "utf-16" and b"\x00" in block:
+        raise UploadRejected("The file contains binary data, not CSV text.")
+
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(block, final=final)
+    lines = text.splitlines()
+    if not final and len(lines) > 1:
+        lines = lines[:-1]  # last line may be cut off
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        raise UploadRejected("The file is empty.")
+    head = lines[0].lstrip("\ufeff").lstrip()
+    if head.startswith(("<", "{")):
+        raise UploadRejected("The file looks like HTML/XML or JSON, not a CSV.")
+
+    sample = "\n".join(lines[:200])
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=DELIMITERS)
+        delimiter = dialect.delimiter
+    except csv.Error:
+        counts = {d: lines[0].count(d) for d in DELIMITERS}
+        delimiter = max(counts, key=counts.get) if max(counts.values()) else ","
+
+    rows = list(csv.reader(io.StringIO(sample), delimiter=delimiter))
+    width = len(rows[0])
+    if len(rows) > 1:
+        consistent = sum(len(r) == width for r in rows[1:]) / (len(rows) - 1)
+        if consistent < MIN_CONSISTENT_ROWS:
+            raise UploadRejected("Rows have inconsistent numbers of fields; the file does not look like a CSV.")
+
+    header = True
+    try:
+        # Only trust "no header" when the first row itself holds a number
+        if not csv.Sniffer().has_header(sample):
+            header = not any(_is_number(field) for field in rows[0])
+    except csv.Error:
+        pass
+    columns = [f.strip() for f in rows[0]] if header else [f"column_{i + 1}" for i in range(width)]
+    return {"encoding": encoding, "delimiter": delimiter, "header": header, "columns": columns}
+
+
+def _is_number(field):
+    try:
+        float(field)
+        return True
+    except ValueError:
+        return False
+
+
+class CsvUploadSink:
+    """
+    Writable stream given to Werkzeug for one uploaded file. Call ``finish(path)`` once the
+    request has been parsed to move the validated CSV into place; unfinished sinks delete
+    their partial file on ``close()``.
+    """
+
+    def __init__(self, folder, filename, max_bytes=None, chunk_size=UPLOAD_CHUNK_BYTES):
+        self.folder = folder
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        os.makedirs(folder, exist_ok=True)
+        # Not dot-prefixed: the artifact sweeper indexes parts left behind by a crashed process
+        self.part_path = os.path.join(folder, f"{uuid.uuid4().hex}.part")
+        self._out = open(self.part_path, "wb")
+        self._buffer = bytearray()
+        self._compression = None
+        self._inflate = None
+        self._zip_spool = None
+        self._head = bytearray()
+        self._format = None
+        self._decoder = None
+        self._sha = hashlib.sha256()
+        self.raw_bytes = 0
+        self.size = 0
+        self._newlines = 0
+        self._last_byte = b""
+        self.finished = False
+
+    # --- file-like interface used by Werkzeug ---
+    def write(self, data):
+        if self._compression is None:
+            self._detect_compression(bytes(data[:4]))
+        self.raw_bytes += len(data)
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._process(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def tell(self):
+        return self.raw_bytes
+
+    def flush(self):
+        pass
+
+    def read(self, size=-1):
+        raise io.UnsupportedOperation("CsvUploadSink is write-only; use finish()")
+
+    readline = read
+
+    def close(self):
+        if not self.finished:
+            self.discard()
+
+    # --- processing ---
+    def _detect_compression(self, magic):
+        if magic.startswith(b"\x1f\x8b"):
+            self._compression = "gzip"
+            self._inflate = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        elif magic.startswith(b"PK\x03\x04") and self.filename.lower().endswith(".zip"):
+            self._compression = "zip"
+            self._zip_spool = open(self.part_path + ".zip", "wb")
+        else:
+            self._compression = "none"
+
+    def _reject(self, error):
+        self.discard()
+        raise error
+
+    def _process(self, raw):
+        if self._compression == "zip":
+            self._zip_spool.write(raw)
+        elif self._compression == "gzip":
+            try:
+                while raw:
+                    self._decompressed(self._inflate.decompress(raw, self.chunk_size * 4))
+                    raw = self._inflate.unconsumed_tail
+                    if self._inflate.eof and self._inflate.unused_data:
+                        # Concatenated gzip members
+                        raw = self._inflate.unused_data + raw
+                        self._inflate = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            except zlib.error as e:
+                self._reject(UploadRejected(f"The gzip data is corrupt: {e}"))
+        else:
+            self._decompressed(raw)
+
+    def _decompressed(self, data, final=False):
+        if self._format is None:
+            self._head += data
+            if len(self._head) < SNIFF_BYTES and not final:
+                return
+            try:
+                self._format = _sniff(bytes(self._head[:SNIFF_BYTES]), final=final and len(self._head) <= SNIFF_BYTES)
+            except UploadRejected as e:
+                self._reject(e)
+            encoding = self._format["encoding"]
+            if encoding not in ("utf-8", "utf-8-sig"):
+                self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            data = bytes(self._head)
+            if encoding == "utf-8-sig":
+                data = data[len(codecs.BOM_UTF8):]
+            self._head = bytearray()
+        if self._decoder is not None:
+            data = self._decoder.decode(data, final=final).encode("utf-8")
+        if not data:
+            return
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self._reject(UploadTooLarge(f"The uncompressed CSV exceeds {self.max_bytes // (1024 * 1024)} MB."))
+        self._sha.update(data)
+        self._newlines += data.count(b"\n")
+        self._last_byte = data[-1:]
+        self._out.write(data)
+
+    def _unzip(self):
+        self._zip_spool.close()
+        try:
+            with zipfile.ZipFile(self.part_path + ".zip") as archive:
+                members = [m for m in archive.infolist() if not m.is_dir()]
+                csvs = [m for m in members if m.filename.lower().endswith(".csv")]
+                if len(csvs) != 1 and len(members) != 1:
+                    self._reject(UploadRejected("The zip archive must contain exactly one CSV file."))
+                with archive.open(csvs[0] if len(csvs) == 1 else members[0]) as fh:
+                    for block in iter(lambda: fh.read(self.chunk_size), b""):
+                        self._decompressed(block)
+        except zipfile.BadZipFile as e:
+            self._reject(UploadRejected(f"The zip archive is corrupt: {e}"))
+        finally:
+            if os.path.exists(self.part_path + ".zip"):
+                os.remove(self.part_path + ".zip")
+
+    def finish(self, dest_path):
+        """Flush, validate the end of the stream and move the CSV to ``dest_path``; return its metadata."""
+        if self._buffer:
+            self._process(bytes(self._buffer))
+            self._buffer.clear()
+        if self._compression == "zip":
+            self._unzip()
+        elif self._compression == "gzip" and not self._inflate.eof:
+            self._reject(UploadRejected("The gzip data is truncated."))
+        self._decompressed(b"", final=True)
+        if self._format is None:
+            self._reject(UploadRejected("The file is empty."))
+        self._out.close()
+
+        lines = self._newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        meta = dict(self._format,
+                    sha256=self._sha.hexdigest(),
+                    size=self.size,
+                    uploaded_bytes=self.raw_bytes,
+                    compression=self._compression,
+                    rows=max(lines - (1 if self._format["header"] else 0), 0))
+        os.replace(self.part_path, dest_path)
+        tmp = f"{meta_path(dest_path)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, meta_path(dest_path))
+        self.finished = True
+        logger.info("Stored upload %s: %d bytes (%s), %d rows, delimiter %r, encoding %s",
+                    dest_path, self.size, self._compression, meta["rows"], meta["delimiter"], meta["encoding"])
+        return meta
+
+    def discard(self):
+        self.finished = True
+        for fh in (self._out, self._zip_spool):
+            if fh is not None and not fh.closed:
+                fh.close()
+        for path in (self.part_path, self.part_path + ".zip"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class StreamingUploadRequest(Request):
+    """Flask request class that streams CSV file parts into a ``CsvUploadSink``."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if is_csv_upload(filename):
+            return CsvUploadSink(current_app.config["UPLOAD_FOLDER"], filename,
+                                 max_bytes=current_app.config.get("MAX_UNCOMPRESSED_LENGTH"))
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)